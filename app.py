@@ -1,38 +1,57 @@
+import asyncio
 import curses
-import time
 
 from base64 import urlsafe_b64encode
-from datetime import datetime
-from threading import Lock, Thread
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from functools import partial
+from queue import Empty, SimpleQueue
+from threading import Lock
 
 import httpx
 
 from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
 from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
-from sqlalchemy import create_engine, Engine
-from sqlalchemy.orm import Session
-
 
 from components.contacts import ContactsMenu, ContactsPrompt
 from components.logs import Log
 from components.messages import MessageEntry, MessageLog
+from components.prompts import Prompt
+from components.search import SearchPrompt, SearchResultsMenu
 from components.textboxes import Alignment, Textbox
-from database.models import Base, Contact, FernetKey, ReceivedExchangeKey
-from database.operations import (
-    get_contact_keys,
-    get_contacts_without_keys,
-    get_unmatched_keys,
+from database.cache import contact_cache, send_context_cache, SendContext
+from database.engine import create_database_engine, upgrade_schema
+from database.fetching import (
+    FetchReport,
+    FetchStream,
+    shutdown_crypto_pool,
     store_fetched_data,
-    store_posted_exchange_key,
-    store_posted_message,
 )
-from database.schemas.inputs import ContactInputSchema
-from database.schemas.outputs import (
-    BaseContactOutputSchema,
-    ContactOutputSchema,
+from database.memory import MemoryStorage
+from database.records import (
+    ContactRecord,
+    MessageSearchResult,
+    OutboxMessageRecord,
+    ReceivedKeyRecord,
 )
+from database.schemas.inputs import ContactInputSchema
+from database.storage import SqlStorage, Storage
 from parser import ClientArgumentParser
-from server.operations import fetch_data, post_exchange_key, post_message
+from server.engine import ServerEngine
+from server.operations import (
+    fetch_data,
+    long_poll_data,
+    post_exchange_key,
+    post_message,
+    stream_data,
+    stream_fetch_data,
+)
+from server.scheduler import AdaptiveInterval, Scheduler
+from server.schemas.responses import (
+    FetchResponseData,
+    FetchResponseSchema,
+    PostMessageResponseSchema,
+)
 from settings import settings
 from states import State
 from styling import Layout, LayoutMeasure, LayoutUnit, Padding
@@ -40,7 +59,7 @@ from styling import Layout, LayoutMeasure, LayoutUnit, Padding
 class App:
     def __init__(
             self,
-            engine: Engine,
+            storage: Storage,
             signature_key: Ed25519PrivateKey,
             stdscr: curses.window,
             contacts_menu: ContactsMenu,
@@ -49,7 +68,7 @@ class App:
             output_log: Log,
             textboxes: list[Textbox] | None = None,
         ) -> None:
-        self.engine = engine
+        self.storage = storage
         self.signature_key = signature_key
         self.stdscr = stdscr
         self.contacts_menu = contacts_menu
@@ -75,13 +94,64 @@ class App:
         else:
             self.selected_contact = None
         self.connected = False
-        self.database_write_lock = Lock()
+        self.push_active = False
+        self.fetch_storage_lock = Lock()
         self.message_log_write_lock = Lock()
         self.output_log_write_lock = Lock()
+        # Results of queueing messages, handled by the main loop.
+        self.queued_messages: SimpleQueue[Future[int]] = SimpleQueue()
+        self.server_engine = ServerEngine(
+            max_concurrent_requests=settings.server.max_concurrent_requests,
+            request_timeout=settings.server.request_timeout,
+            error_handler=self._handle_server_error,
+        )
+        self.fetch_interval = AdaptiveInterval(
+            minimum=settings.server.fetch_interval,
+            maximum=settings.server.max_fetch_interval,
+            factor=settings.server.fetch_backoff_factor,
+        )
+        self.scheduler = Scheduler(error_handler=self._handle_server_error)
+        self.scheduler.add(
+            name='ping',
+            operation=self._ping_handler,
+            interval=settings.server.ping_interval,
+        )
+        self.scheduler.add(
+            name='fetch',
+            operation=self._fetch_handler,
+            interval=self.fetch_interval,
+        )
+        if settings.server.delivery_mode != 'poll':
+            self.scheduler.add(
+                name='push',
+                operation=self._push_handler,
+                interval=settings.server.push_retry_interval,
+                interruptible=True,
+            )
+        self.scheduler.add(
+            name='outbox',
+            operation=self._outbox_handler,
+            interval=settings.server.outbox_retry_interval,
+        )
+        self.scheduler.add(
+            name='key_response',
+            operation=self._key_response_handler,
+            interval=settings.server.key_response_interval,
+        )
+        self.scheduler.add(
+            name='new_contact_keys',
+            operation=self._new_contact_key_handler,
+            interval=settings.server.new_contact_interval,
+        )
+        self.scheduler.add(
+            name='maintenance',
+            operation=self._maintenance_handler,
+            interval=settings.local_database.key_retention.interval,
+        )
 
-    def _ping_server(self, client: httpx.Client) -> bool:
+    async def _ping_server(self, client: httpx.AsyncClient) -> bool:
         try:
-            client.get(
+            await client.get(
                 url=settings.server.url.ping_url,
                 timeout=settings.server.ping_timeout,
             )
@@ -95,16 +165,127 @@ class App:
         except Exception:
             return False
 
-    def _fetch_handler(self, client: httpx.Client) -> None:
-        contact_keys = get_contact_keys(self.engine)
+    async def _ping_handler(self, client: httpx.AsyncClient) -> None:
+        if not self.connected:
+            self.connected = await self._ping_server(client)
+            if self.connected:
+                if settings.server.delivery_mode != 'poll':
+                    self.scheduler.trigger('push')
+                self.scheduler.trigger('fetch')
+                self.scheduler.trigger('outbox')
+                self.scheduler.trigger('key_response')
+                self.scheduler.trigger('new_contact_keys')
+
+    async def _write[T](self, future: Future[T]) -> T:
+        """Await a queued write without blocking the loop."""
+        return await asyncio.wrap_future(future)
+
+    def _store_fetched_data(
+            self,
+            response: FetchResponseSchema,
+        ) -> FetchReport:
+        # Fetch and push responses may arrive together, but must be stored
+        # one at a time so that neither stores elements the other has.
+        with self.fetch_storage_lock:
+            return store_fetched_data(self.storage, response)
+
+    async def _handle_fetch_response(
+            self,
+            response: FetchResponseSchema,
+        ) -> None:
+        # Storage is run in a worker thread to keep the loop responsive.
+        report = await asyncio.to_thread(self._store_fetched_data, response)
+        with self.message_log_write_lock:
+            self.message_log.update()
+        self._handle_fetch_report(report)
+
+    def _store_fetched_chunk(
+            self,
+            stream: FetchStream,
+            chunk: FetchResponseData,
+        ) -> FetchReport:
+        # Other responses may be stored between chunks, which is safe as
+        # each chunk reads the stored elements afresh.
+        with self.fetch_storage_lock:
+            return stream.store(chunk)
+
+    async def _stream_fetch(
+            self,
+            client: httpx.AsyncClient,
+            contact_keys: list[str],
+        ) -> FetchReport:
+        stream = FetchStream(self.storage)
+        async for chunk in stream_fetch_data(
+            client=client,
+            signature_key=self.signature_key,
+            contact_keys=contact_keys,
+            cursors=self._get_cursors(),
+        ):
+            await asyncio.to_thread(self._store_fetched_chunk, stream, chunk)
+            with self.message_log_write_lock:
+                self.message_log.update()
+        return await asyncio.to_thread(stream.finish)
+
+    async def _handle_pushed_event(
+            self,
+            stream: FetchStream,
+            response: FetchResponseSchema,
+        ) -> None:
+        report = await asyncio.to_thread(
+            self._store_fetched_chunk,
+            stream,
+            response.data,
+        )
+        with self.message_log_write_lock:
+            self.message_log.update()
+        self._handle_fetch_report(report)
+
+    def _handle_fetch_report(self, report: FetchReport) -> None:
+        # Poll less often while nothing new is arriving.
+        if not report.verified:
+            self.fetch_interval.back_off()
+            return
+        self.fetch_interval.reset()
+        # New elements may include exchange keys awaiting a response.
+        self.scheduler.trigger('key_response')
+        with self.output_log_write_lock:
+            self.output_log.add_item(
+                title='Fetch Complete',
+                timestamp=datetime.now(),
+                text=(
+                    f'Verified {report.verified} new elements and '
+                    f'skipped {report.skipped} known elements.'
+                ),
+            )
+
+    def _get_cursors(self) -> dict[str, datetime] | None:
+        if settings.server.incremental_fetch:
+            return self.storage.get_fetch_cursors()
+        return None
+
+    async def _fetch_handler(self, client: httpx.AsyncClient) -> None:
+        if not self.connected or self.push_active:
+            return
+        contact_keys = self.storage.get_contact_keys()
         if not contact_keys:
+            self.fetch_interval.back_off()
             return
         try:
-            response = fetch_data(client, self.signature_key, contact_keys)
-            with self.database_write_lock:
-                store_fetched_data(self.engine, response)
-            with self.message_log_write_lock:
-                self.message_log.update()
+            if settings.server.stream_fetch:
+                report = await self.server_engine.limit(
+                    self._stream_fetch(client, contact_keys),
+                )
+                self._handle_fetch_report(report)
+                return
+            response = await self.server_engine.limit(
+                fetch_data(
+                    client=client,
+                    signature_key=self.signature_key,
+                    contact_keys=contact_keys,
+                    cursors=self._get_cursors(),
+                ),
+            )
+            await self._handle_fetch_response(response)
         except httpx.HTTPStatusError as e:
             with self.output_log_write_lock:
                 self.output_log.add_item(
@@ -113,57 +294,152 @@ class App:
                     text=str(e),
                 )
 
-    def _key_response_handler(self, client: httpx.Client) -> None:
-        unmatched_keys = get_unmatched_keys(self.engine)
-        for key in unmatched_keys:
-            private_key = X25519PrivateKey.generate()
-            shared_secret = private_key.exchange(key.public_key)
-            encoded_shared_secret = urlsafe_b64encode(shared_secret)
+    async def _receive_pushed_data(self, client: httpx.AsyncClient) -> None:
+        # Push requests bypass the request limit, as they are held open.
+        # Either mode returns after the push timeout, so that the contact
+        # keys are refreshed and any new contacts are included.
+        contact_keys = self.storage.get_contact_keys()
+        if not contact_keys:
+            await asyncio.sleep(settings.server.push_timeout)
+        elif settings.server.delivery_mode == 'long_poll':
+            response = await long_poll_data(
+                client=client,
+                signature_key=self.signature_key,
+                contact_keys=contact_keys,
+                cursors=self._get_cursors(),
+            )
+            await self._handle_fetch_response(response)
+        else:
+            # Events are stored as one stream, so that later events never
+            # advance a cursor past elements held back by earlier ones.
+            stream = FetchStream(self.storage, advance_each_chunk=True)
             try:
-                response = post_exchange_key(
+                async with asyncio.timeout(settings.server.push_timeout):
+                    async for response in stream_data(
+                        client=client,
+                        signature_key=self.signature_key,
+                        contact_keys=contact_keys,
+                        cursors=self._get_cursors(),
+                    ):
+                        await asyncio.shield(
+                            self._handle_pushed_event(stream, response),
+                        )
+            except TimeoutError:
+                pass
+
+    async def _push_handler(self, client: httpx.AsyncClient) -> None:
+        if not self.connected:
+            return
+        self.push_active = True
+        try:
+            while self.connected:
+                await self._receive_pushed_data(client)
+        except httpx.HTTPStatusError as e:
+            # Fall back to polling if the server lacks the chosen mode.
+            if e.response.status_code not in (404, 405, 501):
+                raise
+            with self.output_log_write_lock:
+                self.output_log.add_item(
+                    title='Push Delivery Unavailable',
+                    timestamp=datetime.now(),
+                    text=(
+                        f'The server does not support the '
+                        f'{settings.server.delivery_mode} delivery mode. '
+                        f'Falling back to regular fetch requests.'
+                    ),
+                )
+        finally:
+            self.push_active = False
+            self.fetch_interval.reset()
+            self.scheduler.wake('fetch')
+
+    async def _respond_to_key(
+            self,
+            client: httpx.AsyncClient,
+            key: ReceivedKeyRecord,
+        ) -> None:
+        private_key = X25519PrivateKey.generate()
+        shared_secret = private_key.exchange(key.public_key)
+        try:
+            response = await self.server_engine.limit(
+                post_exchange_key(
                     client=client,
                     signature_key=self.signature_key,
                     recipient_public_key=key.contact.verification_key,
                     exchange_key=private_key.public_key(),
                     initial_exchange_key=key.public_key,
+                ),
+            )
+        except httpx.HTTPStatusError as e:
+            with self.output_log_write_lock:
+                self.output_log.add_item(
+                    title='Bad Response',
+                    timestamp=datetime.now(),
+                    text=str(e),
                 )
-            except httpx.HTTPStatusError as e:
-                with self.output_log_write_lock:
-                    self.output_log.add_item(
-                        title='Bad Response',
-                        timestamp=datetime.now(),
-                        text=str(e),
-                    )
-                continue
-            with self.database_write_lock:
-                with Session(self.engine) as session:
-                    matched_key = session.get_one(ReceivedExchangeKey, key.id)
-                    matched_key.matched = True
-                    session.add(
-                        FernetKey(
-                            encoded_bytes=encoded_shared_secret.decode(),
-                            contact_id=key.contact.id,
-                            timestamp=response.data.timestamp,
-                        )
-                    )
-                    session.commit()
+            return
+        await self._write(
+            self.storage.store_key_response(
+                received_key_id=key.id,
+                contact_id=key.contact.id,
+                shared_secret=shared_secret,
+                timestamp=response.data.timestamp,
+            ),
+        )
+        contact_cache.invalidate()
+        send_context_cache.invalidate([key.contact.id])
+        self._register_activity()
 
-    def _new_contact_key_handler(self, client: httpx.Client):
-        new_contacts = get_contacts_without_keys(self.engine)
-        for contact in new_contacts:
-            self._post_exchange_key(client, contact)
+    async def _key_response_handler(self, client: httpx.AsyncClient) -> None:
+        if not self.connected:
+            return
+        unmatched_keys = self.storage.get_unmatched_keys()
+        await asyncio.gather(
+            *(self._respond_to_key(client, key) for key in unmatched_keys),
+        )
 
-    def _run_server_operations(self):
-        client = httpx.Client()
-        while True:
-            if not self.connected:
-                self.connected = self._ping_server(client)
-                continue
-            try:
-                self._fetch_handler(client)
-                self._key_response_handler(client)
-                self._new_contact_key_handler(client)
-            except httpx.TimeoutException:
+    async def _new_contact_key_handler(self, client: httpx.AsyncClient):
+        if not self.connected:
+            return
+        new_contacts = self.storage.get_contacts_without_keys()
+        await asyncio.gather(
+            *(self._post_exchange_key(client, x) for x in new_contacts),
+        )
+
+    async def _maintenance_handler(self, _: httpx.AsyncClient) -> None:
+        retention = settings.local_database.key_retention
+        if retention.max_fernet_key_age is not None:
+            max_fernet_key_age = timedelta(days=retention.max_fernet_key_age)
+        else:
+            max_fernet_key_age = None
+        report = await self._write(
+            self.storage.prune_keys(
+                max_fernet_keys=retention.max_fernet_keys,
+                max_fernet_key_age=max_fernet_key_age,
+                prune_matched_keys=retention.prune_matched_keys,
+            ),
+        )
+        if report.fernet_keys:
+            contact_cache.invalidate()
+        if report.fernet_keys or report.matched_keys:
+            with self.output_log_write_lock:
+                self.output_log.add_item(
+                    title='Key Maintenance',
+                    timestamp=datetime.now(),
+                    text=(
+                        f'Removed {report.fernet_keys} expired fernet keys '
+                        f'and {report.matched_keys} matched exchange keys.'
+                    ),
+                )
+
+    def _register_activity(self) -> None:
+        # Replies are likely soon after any exchange, so fetch promptly.
+        self.fetch_interval.reset()
+        self.scheduler.wake('fetch')
+
+    def _handle_server_error(self, error: BaseException) -> None:
+        if isinstance(error, httpx.TimeoutException):
+            if self.connected:
                 with self.output_log_write_lock:
                     self.output_log.add_item(
                         title='Server Connection Error',
@@ -171,19 +447,21 @@ class App:
                         text='Request timed out. Attempting to reconnect...',
                     )
                 self.connected = False
-            except Exception as e:
-                with self.output_log_write_lock:
-                    self.output_log.add_item(
-                        title='Unhandled Server Error',
-                        timestamp=datetime.now(),
-                        text=str(e),
-                    )
-            time.sleep(settings.server.fetch_interval)
+                self.fetch_interval.reset()
+            return
+        with self.output_log_write_lock:
+            self.output_log.add_item(
+                title='Unhandled Server Error',
+                timestamp=datetime.now(),
+                text=str(error),
+            )
 
     def _standard_state_handler(self, key: int) -> State:
         match key:
             case 1:   # Ctrl-A
                 return State.ADD_CONTACT
+            case 6:   # Ctrl-F
+                return State.SEARCH_MESSAGES
             case 9:   # Tab
                 return State.NEXT_WINDOW
             case curses.KEY_BTAB:
@@ -193,37 +471,41 @@ class App:
             case 27:  # Esc
                 return State.TERMINATE
             case _:
-                return self.windows[self.focus_index].handle_key(key)
+                window = self.windows[self.focus_index]
+                # Scrolling the message log may load pages, which must not
+                # overlap with updates made from other threads.
+                if window is self.message_log:
+                    with self.message_log_write_lock:
+                        return window.handle_key(key)
+                return window.handle_key(key)
 
-    def _add_contact(self, client: httpx.Client) -> None:
-        self.stdscr.clear()
-        self.stdscr.refresh()
-        prompt = ContactsPrompt()
-        prompt.place(self.stdscr)
+    def _run_modal(self, window: Prompt | SearchResultsMenu) -> State:
+        window.place(self.stdscr)
         state = State.PROMPT_ACTIVE
         while state == State.PROMPT_ACTIVE:
-            if prompt.draw_required:
-                prompt.draw()
-                prompt.draw_required = False
+            if window.draw_required:
+                window.draw(True)
+                window.draw_required = False
             key = self.stdscr.getch()
             if key == curses.KEY_RESIZE:
-                prompt.place(self.stdscr)
+                window.place(self.stdscr)
             else:
-                state = prompt.handle_key(key)
-        if state == State.PROMPT_SUBMITTED:
+                state = window.handle_key(key)
+        return state
+
+    def _add_contact(self) -> None:
+        self.stdscr.clear()
+        self.stdscr.refresh()
+        prompt = ContactsPrompt()
+        if self._run_modal(prompt) == State.PROMPT_SUBMITTED:
             name, public_key = prompt.retrieve_contact()
             contact = ContactInputSchema.model_validate({
                 'name': name,
                 'verification_key': public_key,
             })
             try:
-                with self.database_write_lock:
-                    with Session(self.engine) as session:
-                        obj = Contact(**contact.model_dump())
-                        session.add(obj)
-                        session.flush()
-                        contact = BaseContactOutputSchema.model_validate(obj)
-                        session.commit()
+                contact = self.storage.add_contact(contact).result()
+                contact_cache.invalidate()
                 with self.output_log_write_lock:
                     self.output_log.add_item(
                         title='Add Contact Success',
@@ -232,7 +514,8 @@ class App:
                     )
                 if self.selected_contact is None:
                     self.selected_contact = contact
-                    self.message_log.set_contact(contact)
+                    with self.message_log_write_lock:
+                        self.message_log.set_contact(contact)
                     self.message_entry.set_contact(contact)
             except Exception as e:
                 with self.output_log_write_lock:
@@ -247,10 +530,39 @@ class App:
             window.draw_required = True
         self.contacts_menu.refresh()
 
-    def _post_exchange_key(
+    def _search_messages(self) -> None:
+        self.stdscr.clear()
+        self.stdscr.refresh()
+        prompt = SearchPrompt()
+        if self._run_modal(prompt) == State.PROMPT_SUBMITTED:
+            results = self.storage.search_messages(prompt.query)
+            self.stdscr.erase()
+            self.stdscr.refresh()
+            menu = SearchResultsMenu(prompt.query, results)
+            if self._run_modal(menu) == State.PROMPT_SUBMITTED:
+                self._jump_to_message(menu.current_result)
+        self.stdscr.erase()
+        self.stdscr.refresh()
+        for window in self.windows:
+            window.draw_required = True
+
+    def _jump_to_message(self, result: MessageSearchResult):
+        for index, contact in enumerate(self.contacts_menu.contacts):
+            if contact.id == result.contact_id:
+                self.contacts_menu.cursor_index = index
+                self.selected_contact = contact
+                with self.message_log_write_lock:
+                    self.message_log.set_contact(contact)
+                    self.message_log.jump_to(result.id)
+                self.message_entry.set_contact(contact)
+                # Focus the message log so that scrolling continues there.
+                self.focus_index = self.windows.index(self.message_log)
+                break
+
+    async def _post_exchange_key(
             self,
-            client: httpx.Client,
-            contact: BaseContactOutputSchema,
+            client: httpx.AsyncClient,
+            contact: ContactRecord,
         ) -> None:
         if not self.connected:
             with self.output_log_write_lock:
@@ -265,24 +577,27 @@ class App:
             return
         private_exchange_key = X25519PrivateKey.generate()
         try:
-            post_exchange_key(
-                client=client,
-                signature_key=self.signature_key,
-                recipient_public_key=contact.verification_key,
-                exchange_key=private_exchange_key.public_key(),
+            await self.server_engine.limit(
+                post_exchange_key(
+                    client=client,
+                    signature_key=self.signature_key,
+                    recipient_public_key=contact.verification_key,
+                    exchange_key=private_exchange_key.public_key(),
+                ),
             )
-            with self.database_write_lock:
-                store_posted_exchange_key(
-                    engine=self.engine,
+            await self._write(
+                self.storage.store_posted_exchange_key(
                     contact_id=contact.id,
                     private_exchange_key=private_exchange_key,
-                )
+                ),
+            )
             with self.output_log_write_lock:
                 self.output_log.add_item(
                     title='Exchange Key Post Success',
                     timestamp=datetime.now(),
                     text=f"Posted exchange key to {contact.name}.",
                 )
+            self._register_activity()
         except httpx.TimeoutException:
             with self.output_log_write_lock:
                 self.output_log.add_item(
@@ -305,74 +620,139 @@ class App:
                     text=str(e),
                 )
 
-    def _post_message(self, client: httpx.Client) -> None:
-        if self.selected_contact is None or not self.message_entry.input:
-            return
-        elif not self.connected:
+    def _submit_exchange_key(self) -> None:
+        if self.contacts_menu.contacts:
+            self.server_engine.submit(
+                partial(
+                    self._post_exchange_key,
+                    contact=self.contacts_menu.current_contact,
+                ),
+            )
+
+    async def _store_posted_message(
+            self,
+            context: SendContext,
+            queued: OutboxMessageRecord,
+            response: PostMessageResponseSchema,
+        ) -> None:
+        # The message is already on the server, so it must leave the outbox
+        # even if it cannot be stored, or it would be posted a second time.
+        try:
+            await self._write(
+                self.storage.store_posted_message(
+                    plaintext=queued.text,
+                    contact_id=context.contact_id,
+                    response=response,
+                    outbox_id=queued.id,
+                ),
+            )
+        except Exception as e:
             with self.output_log_write_lock:
                 self.output_log.add_item(
-                    title='Message Post Error - No Connection',
+                    title='Message Store Error',
                     timestamp=datetime.now(),
                     text=(
-                        'No messages can be sent until a connection to the '
-                        'server is established.'
+                        f'Message to {context.name} was sent but could not '
+                        f'be stored: {e}'
                     ),
                 )
-            return
-        with Session(self.engine) as session:
-            obj = session.get(Contact, self.selected_contact.id)
-        if obj is None:
-            return
-        selected_contact = ContactOutputSchema.model_validate(obj)
-        if selected_contact.fernet_keys:
-            fernet_key = selected_contact.fernet_keys[0].key
-            plaintext = self.message_entry.input
-            try:
-                response = post_message(
+            await self._write(self.storage.dequeue_message(queued.id))
+        else:
+            with self.output_log_write_lock:
+                self.output_log.add_item(
+                    title='Message Post Success',
+                    timestamp=datetime.now(),
+                    text=f'Message sent to {context.name}.',
+                )
+        with self.message_log_write_lock:
+            self.message_log.update()
+        self._register_activity()
+
+    async def _post_message(
+            self,
+            client: httpx.AsyncClient,
+            context: SendContext,
+            queued: OutboxMessageRecord,
+        ) -> bool:
+        encrypted_text = context.fernet_key.encrypt(queued.text.encode())
+        try:
+            response = await self.server_engine.limit(
+                post_message(
                     client=client,
                     signature_key=self.signature_key,
-                    recipient_public_key=selected_contact.verification_key,
-                    encrypted_text=fernet_key.encrypt(plaintext.encode()),
+                    recipient_public_key=context.verification_key,
+                    encrypted_text=encrypted_text,
+                ),
+            )
+        except httpx.TimeoutException:
+            title = 'Message Post Error - Request Timed Out'
+            text = f'Message to {context.name} was not sent.'
+        except httpx.HTTPStatusError as e:
+            title = 'Message Post Error - Bad Response'
+            text = str(e)
+        except Exception as e:
+            title = 'Message Post Error - Unhandled Exception'
+            text = str(e)
+        else:
+            await self._store_posted_message(context, queued, response)
+            return True
+        await self._write(self.storage.record_failed_attempt(queued.id))
+        # Only the first failure is logged, as the message is retried.
+        if queued.attempts == 0:
+            with self.output_log_write_lock:
+                self.output_log.add_item(
+                    title=title,
+                    timestamp=datetime.now(),
+                    text=f'{text} It will remain queued and be retried.',
                 )
-                with self.database_write_lock:
-                    store_posted_message(
-                        engine=self.engine,
-                        plaintext=plaintext,
-                        contact_id=selected_contact.id,
-                        response=response,
-                    )
-                self.message_entry.input = ''
-                self.message_entry.cursor_index = 0
-                self.message_entry.draw_required = True
-                with self.output_log_write_lock:
-                    self.output_log.add_item(
-                        title='Message Post Success',
-                        timestamp=datetime.now(),
-                        text=f'Message sent to {self.selected_contact.name}.',
-                    )
-                with self.message_log_write_lock:
-                    self.message_log.update()
-            except httpx.TimeoutException:
-                with self.output_log_write_lock:
-                    self.output_log.add_item(
-                        title='Message Post Error - Request Timed Out',
-                        timestamp=datetime.now(),
-                        text='Message post request timed out.',
-                    )
-            except httpx.HTTPStatusError as e:
-                with self.output_log_write_lock:
-                    self.output_log.add_item(
-                        title='Message Post Error - Bad Response',
-                        timestamp=datetime.now(),
-                        text=str(e),
-                    )
-            except Exception as e:
-                with self.output_log_write_lock:
-                    self.output_log.add_item(
-                        title='Message Post Error - Unhandled Exception',
-                        timestamp=datetime.now(),
-                        text=str(e),
-                    )
+        return False
+
+    async def _send_queued_messages(
+            self,
+            client: httpx.AsyncClient,
+            contact_id: int,
+            queued_messages: list[OutboxMessageRecord],
+        ) -> None:
+        # The send context is held in memory until a new fernet key is
+        # stored for the contact, so sending needs no reads.
+        context = send_context_cache.get(self.storage, contact_id)
+        if context is None:
+            return
+        # Messages to the same contact are posted in order, stopping at the
+        # first failure so that they never arrive out of sequence.
+        for queued in queued_messages:
+            if not await self._post_message(client, context, queued):
+                break
+
+    async def _outbox_handler(self, client: httpx.AsyncClient) -> None:
+        if not self.connected:
+            return
+        queued_messages: dict[int, list[OutboxMessageRecord]] = dict()
+        for queued in self.storage.get_queued_messages():
+            queued_messages.setdefault(queued.contact_id, []).append(queued)
+        await asyncio.gather(
+            *(
+                self._send_queued_messages(client, contact_id, messages)
+                for contact_id, messages in queued_messages.items()
+            ),
+        )
+
+    def _submit_message(self) -> None:
+        if self.selected_contact is None or not self.message_entry.input:
+            return
+        selected_contact = self.selected_contact
+        context = send_context_cache.get(self.storage, selected_contact.id)
+        if context is not None:
+            # Messages are queued without waiting for the commit, and sent
+            # by the outbox handler once it has completed.
+            future = self.storage.queue_message(
+                plaintext=self.message_entry.input,
+                contact_id=selected_contact.id,
+            )
+            future.add_done_callback(self.queued_messages.put)
+            self.message_entry.input = ''
+            self.message_entry.cursor_index = 0
+            self.message_entry.draw_required = True
         else:
             with self.output_log_write_lock:
                 self.output_log.add_item(
@@ -384,7 +764,33 @@ class App:
                     ),
                 )
 
-    def _loop_iteration(self, state: State, client: httpx.Client) -> State:
+    def _handle_queued_messages(self) -> None:
+        # Queueing completes on the storage thread, where the reads made by
+        # updating the log would hold up other writes, so its results are
+        # handled here instead.
+        updated = False
+        while True:
+            try:
+                future = self.queued_messages.get_nowait()
+            except Empty:
+                break
+            exception = future.exception()
+            if exception is not None:
+                with self.output_log_write_lock:
+                    self.output_log.add_item(
+                        title='Message Queue Error',
+                        timestamp=datetime.now(),
+                        text=str(exception),
+                    )
+            else:
+                updated = True
+        if updated:
+            self.scheduler.trigger('outbox')
+            with self.message_log_write_lock:
+                self.message_log.update()
+
+    def _loop_iteration(self, state: State) -> State:
+        self._handle_queued_messages()
         for index, window in enumerate(self.windows):
             if window.draw_required:
                 window.draw(index == self.focus_index)
@@ -413,34 +819,34 @@ class App:
             case State.RESIZE:
                 self.stdscr.clear()
                 self.stdscr.refresh()
-                for window in self.windows:
-                    window.place(self.stdscr)
+                with self.message_log_write_lock:
+                    for window in self.windows:
+                        window.place(self.stdscr)
             case State.ADD_CONTACT:
-                self._add_contact(client)
+                self._add_contact()
+            case State.SEARCH_MESSAGES:
+                self._search_messages()
             case State.SELECT_CONTACT:
                 if self.contacts_menu.contacts:
                     self.selected_contact = self.contacts_menu.current_contact
-                    self.message_log.set_contact(self.selected_contact)
+                    with self.message_log_write_lock:
+                        self.message_log.set_contact(self.selected_contact)
                     self.message_entry.set_contact(self.selected_contact)
             case State.SEND_EXCHANGE_KEY:
-                if self.contacts_menu.contacts:
-                    self._post_exchange_key(
-                        client=client,
-                        contact=self.contacts_menu.current_contact,
-                    )
+                self._submit_exchange_key()
             case State.SEND_MESSAGE:
-                self._post_message(client)
+                self._submit_message()
             case _:
                 pass
 
         return State.STANDARD
 
     def run(self):
-        # Initiate all secondary threads.
-        Thread(target=self._run_server_operations, daemon=True).start()
+        # Start the storage and server engine on their own threads.
+        self.storage.start()
+        self.server_engine.start(self.scheduler.run)
         # Set up the initial state and begin the main loop.
         state = State.STANDARD
-        client = httpx.Client(timeout=settings.server.request_timeout)
         self.stdscr.keypad(True)
         self.stdscr.nodelay(True)
         try:
@@ -449,9 +855,16 @@ class App:
             for window in self.windows:
                 window.place(self.stdscr)
             while state != State.TERMINATE:
-                state = self._loop_iteration(state, client)
+                state = self._loop_iteration(state)
         except KeyboardInterrupt:
             pass
+        finally:
+            # Operations in progress, such as posts, are left to finish and
+            # store their results before storage is stopped.
+            self.scheduler.stop()
+            self.server_engine.stop()
+            shutdown_crypto_pool()
+            self.storage.stop()
 
 
 if __name__ == '__main__':
@@ -459,15 +872,23 @@ if __name__ == '__main__':
     signature_key = parser.signature_key
     public_key = signature_key.public_key()
     public_key_b64 = urlsafe_b64encode(public_key.public_bytes_raw()).decode()
-    engine = create_engine(settings.local_database.url)
-    Base.metadata.create_all(engine)
+    if settings.local_database.storage == 'memory':
+        storage: Storage = MemoryStorage()
+    else:
+        engine = create_database_engine()
+        upgrade_schema(engine)
+        storage = SqlStorage(
+            engine=engine,
+            max_batch_size=settings.local_database.max_write_batch_size,
+            batch_delay=settings.local_database.write_batch_delay,
+        )
     def main(stdscr: curses.window):
         app = App(
-            engine,
+            storage,
             signature_key,
             stdscr,
             ContactsMenu(
-                engine=engine,
+                storage=storage,
                 layout=Layout(
                     height=LayoutMeasure(
                         (75, LayoutUnit.PERCENTAGE),
@@ -481,7 +902,7 @@ if __name__ == '__main__':
                 padding=Padding(1),
             ),
             MessageLog(
-                engine=engine,
+                storage=storage,
                 contact=None,
                 layout=Layout(
                     height=LayoutMeasure(
@@ -499,7 +920,7 @@ if __name__ == '__main__':
                 padding=Padding(1),
             ),
             MessageEntry(
-                engine=engine,
+                storage=storage,
                 contact=None,
                 layout=Layout(
                     height=LayoutMeasure(
@@ -540,6 +961,7 @@ if __name__ == '__main__':
                         'Controls:',
                         ' | '.join([
                             'Ctrl-A: Add Contact',
+                            'Ctrl-F: Search',
                             'Esc: Close',
                         ]),
                     ],
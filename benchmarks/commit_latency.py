@@ -0,0 +1,113 @@
+"""
+Compares commit latency with and without the local database profile.
+
+Run from the repository root with ```python -m benchmarks.commit_latency```.
+Each engine writes to a fresh SQLite file in a temporary directory through
+its storage, storing one sent message per write as the outbox handler does.
+Writes are first made one at a time, each waiting for its commit, and then
+submitted in a single burst to be committed in groups. In-memory storage is
+measured as well, giving the overhead of a write outside the database.
+"""
+
+import os
+import secrets
+import statistics
+import tempfile
+import time
+
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from sqlalchemy import create_engine
+
+from database.engine import create_database_engine
+from database.memory import MemoryStorage
+from database.models import Base
+from database.schemas.inputs import ContactInputSchema
+from database.storage import SqlStorage, Storage
+from server.schemas.responses import PostMessageResponseSchema
+
+def _make_response() -> PostMessageResponseSchema:
+    return PostMessageResponseSchema.model_validate({
+        'status': 'success',
+        'message': 'Message posted.',
+        'data': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'nonce': secrets.token_hex(16),
+        },
+    })
+
+
+def _sql_storage(url: str, profile: bool) -> SqlStorage:
+    if profile:
+        engine = create_database_engine(url)
+    else:
+        engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    return SqlStorage(engine)
+
+
+def _measure(storage: Storage, commits: int) -> tuple[list[float], float]:
+    storage.start()
+    contact = ContactInputSchema.model_validate({
+        'name': 'Benchmark',
+        'verification_key': Ed25519PrivateKey.generate().public_key(),
+    })
+    contact_id = storage.add_contact(contact).result().id
+    latencies: list[float] = list()
+    for index in range(commits):
+        response = _make_response()
+        start = time.perf_counter()
+        storage.store_posted_message(
+            plaintext=f'Message {index}',
+            contact_id=contact_id,
+            response=response,
+        ).result()
+        latencies.append(time.perf_counter() - start)
+    responses = [_make_response() for _ in range(commits)]
+    start = time.perf_counter()
+    futures = [
+        storage.store_posted_message(
+            plaintext=f'Grouped message {index}',
+            contact_id=contact_id,
+            response=response,
+        )
+        for index, response in enumerate(responses)
+    ]
+    for future in futures:
+        future.result()
+    grouped = (time.perf_counter() - start) / commits
+    storage.stop()
+    if isinstance(storage, SqlStorage):
+        storage.engine.dispose()
+    return latencies, grouped
+
+
+def _report(name: str, latencies: list[float], grouped: float):
+    milliseconds = sorted(x * 1000 for x in latencies)
+    p99 = milliseconds[int(len(milliseconds) * 0.99) - 1]
+    print(
+        f'{name:<10} mean {statistics.mean(milliseconds):7.3f} ms  '
+        f'median {statistics.median(milliseconds):7.3f} ms  '
+        f'p99 {p99:7.3f} ms  '
+        f'grouped {grouped * 1000:7.3f} ms per write'
+    )
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--commits', type=int, default=500)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        default_url = f'sqlite:///{os.path.join(directory, "default.db")}'
+        profile_url = f'sqlite:///{os.path.join(directory, "profile.db")}'
+        _report(
+            'default',
+            *_measure(_sql_storage(default_url, False), args.commits),
+        )
+        _report(
+            'profile',
+            *_measure(_sql_storage(profile_url, True), args.commits),
+        )
+        _report('memory', *_measure(MemoryStorage(), args.commits))
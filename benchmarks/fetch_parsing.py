@@ -0,0 +1,106 @@
+"""
+Compares ways of parsing a large fetch response body.
+
+Run from the repository root with ```python -m benchmarks.fetch_parsing```.
+A fetch response body is generated with the given number of elements, split
+evenly between exchange keys and messages from a handful of senders. It is
+then parsed by loading the JSON before validating it with the compatible
+schema, as every response once was, and by validating the raw body directly
+with the compatible and canonical schemas. Throughput is reported in
+elements per second.
+"""
+
+import json
+import secrets
+import statistics
+import time
+
+from argparse import ArgumentParser
+from base64 import urlsafe_b64encode
+from collections.abc import Callable
+from datetime import datetime, timedelta, timezone
+
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+from server.schemas.responses import (
+    CompatibleFetchResponseSchema,
+    FetchResponseSchema,
+)
+
+def _encode(raw_bytes: bytes) -> str:
+    return urlsafe_b64encode(raw_bytes).decode()
+
+
+def _make_body(elements: int, senders: int) -> bytes:
+    sender_keys = [
+        _encode(Ed25519PrivateKey.generate().public_key().public_bytes_raw())
+        for _ in range(senders)
+    ]
+    start = datetime.now(timezone.utc)
+    def _element(index: int) -> dict[str, str]:
+        return {
+            'sender_key': sender_keys[index % senders],
+            'signature': _encode(secrets.token_bytes(64)),
+            'timestamp': (start + timedelta(seconds=index)).isoformat(),
+        }
+    exchange_keys = [
+        _element(index) | {'exchange_key': _encode(secrets.token_bytes(32))}
+        for index in range(elements // 2)
+    ]
+    messages = [
+        _element(index) | {
+            'nonce': secrets.token_hex(16),
+            'encrypted_text': _encode(secrets.token_bytes(96)),
+        }
+        for index in range(elements - elements // 2)
+    ]
+    return json.dumps({
+        'status': 'success',
+        'message': 'Data fetched.',
+        'data': {'exchange_keys': exchange_keys, 'messages': messages},
+    }).encode()
+
+
+def _measure(
+        name: str,
+        body: bytes,
+        parse: Callable[[bytes], FetchResponseSchema],
+        repeats: int,
+    ) -> float:
+    durations: list[float] = list()
+    for _ in range(repeats):
+        start = time.perf_counter()
+        response = parse(body)
+        durations.append(time.perf_counter() - start)
+    elements = len(response.data.exchange_keys) + len(response.data.messages)
+    rate = elements / statistics.median(durations)
+    print(f'{name:<22} {rate:>12,.0f} elements/s')
+    return rate
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--elements', type=int, default=10000)
+    parser.add_argument('--senders', type=int, default=10)
+    parser.add_argument('--repeats', type=int, default=10)
+    args = parser.parse_args()
+    body = _make_body(args.elements, args.senders)
+    before = _measure(
+        'loaded, compatible',
+        body,
+        lambda x: CompatibleFetchResponseSchema.model_validate(json.loads(x)),
+        args.repeats,
+    )
+    _measure(
+        'raw, compatible',
+        body,
+        CompatibleFetchResponseSchema.model_validate_json,
+        args.repeats,
+    )
+    after = _measure(
+        'raw, canonical',
+        body,
+        FetchResponseSchema.model_validate_json,
+        args.repeats,
+    )
+    print(f'{"":<22} {after / before:.1f}x speedup')
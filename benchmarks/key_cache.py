@@ -0,0 +1,81 @@
+"""
+Compares validating contacts with cold and warm key caches.
+
+Run from the repository root with ```python -m benchmarks.key_cache```.
+Contacts, each with several fernet keys, are validated as they would be when
+loaded for a fetch. The key cache is cleared before every cold repeat, so
+each key is decoded afresh, while warm repeats reuse the decoded keys. By
+default every key fits in the cache at once. Throughput is reported in
+contacts per second, followed by the statistics of the cache.
+"""
+
+import secrets
+import statistics
+import time
+
+from argparse import ArgumentParser
+from base64 import urlsafe_b64encode
+from typing import Any
+
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+from database.schemas.outputs import ContactOutputSchema
+from schema_components.cache import key_cache
+from schema_components.validators import validate_key_input
+
+def _make_contacts(contacts: int, fernet_keys: int) -> list[dict[str, Any]]:
+    return [
+        {
+            'id': index,
+            'name': f'Contact {index}',
+            'verification_key': validate_key_input(
+                Ed25519PrivateKey.generate().public_key(),
+            ),
+            'fernet_keys': [
+                {
+                    'encoded_bytes': urlsafe_b64encode(
+                        secrets.token_bytes(32),
+                    ).decode(),
+                }
+                for _ in range(fernet_keys)
+            ],
+        }
+        for index in range(contacts)
+    ]
+
+
+def _measure(
+        name: str,
+        contacts: list[dict[str, Any]],
+        repeats: int,
+        cold: bool,
+    ) -> float:
+    durations: list[float] = list()
+    for _ in range(repeats):
+        if cold:
+            key_cache.clear()
+        start = time.perf_counter()
+        for contact in contacts:
+            ContactOutputSchema.model_validate(contact)
+        durations.append(time.perf_counter() - start)
+    rate = len(contacts) / statistics.median(durations)
+    print(f'{name:<10} {rate:>12,.0f} contacts/s')
+    return rate
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--contacts', type=int, default=300)
+    parser.add_argument('--fernet-keys', type=int, default=10)
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+    contacts = _make_contacts(args.contacts, args.fernet_keys)
+    before = _measure('cold', contacts, args.repeats, cold=True)
+    after = _measure('warm', contacts, args.repeats, cold=False)
+    print(f'{"":<10} {after / before:.1f}x speedup')
+    stats = key_cache.stats()
+    print(
+        f'cache      {stats.hits} hits, {stats.misses} misses, '
+        f'{stats.evictions} evictions, {stats.size} entries, '
+        f'{stats.hit_rate:.1%} hit rate'
+    )
@@ -0,0 +1,167 @@
+"""
+Compares ORM loading plus pydantic validation with lightweight read models.
+
+Run from the repository root with ```python -m benchmarks.read_models```.
+A fresh SQLite file in a temporary directory is filled with contacts, each
+with several fernet keys, along with messages and unmatched received keys.
+Each hot query is then timed both ways, and throughput is reported in rows
+per second.
+"""
+
+import os
+import secrets
+import statistics
+import tempfile
+import time
+
+from argparse import ArgumentParser
+from base64 import urlsafe_b64encode
+from collections.abc import Callable
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import Engine, insert, select
+from sqlalchemy.orm import Session
+
+from database.engine import create_database_engine, upgrade_schema
+from database.models import (
+    Contact,
+    FernetKey,
+    Message,
+    MessageType,
+    ReceivedExchangeKey,
+)
+from database.operations import get_contacts, get_unmatched_keys
+from database.records import MESSAGE_COLUMNS, MessageRecord
+from database.schemas.outputs import (
+    BaseContactOutputSchema,
+    MessageOutputSchema,
+    ReceivedKeyOutputSchema,
+)
+
+def _random_key() -> str:
+    return urlsafe_b64encode(secrets.token_bytes(32)).decode()
+
+
+def _populate(engine: Engine, contacts: int, messages: int):
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    with engine.begin() as connection:
+        connection.execute(insert(Contact), [
+            {'name': f'Contact {index}', 'verification_key': _random_key()}
+            for index in range(contacts)
+        ])
+        connection.execute(insert(FernetKey), [
+            {
+                'contact_id': index % contacts + 1,
+                'encoded_bytes': _random_key(),
+                'timestamp': start + timedelta(seconds=index),
+            }
+            for index in range(contacts * 3)
+        ])
+        connection.execute(insert(ReceivedExchangeKey), [
+            {
+                'contact_id': index + 1,
+                'encoded_bytes': _random_key(),
+                'matched': False,
+            }
+            for index in range(contacts)
+        ])
+        connection.execute(insert(Message), [
+            {
+                'contact_id': 1,
+                'timestamp': start + timedelta(seconds=index),
+                'text': f'Message {index}',
+                'nonce': secrets.token_hex(16),
+                'message_type': MessageType.RECEIVED,
+            }
+            for index in range(messages)
+        ])
+
+
+def _get_contacts_validated(engine: Engine) -> list[BaseContactOutputSchema]:
+    with Session(engine) as session:
+        return [
+            BaseContactOutputSchema.model_validate(x)
+            for x in session.scalars(select(Contact).order_by(Contact.name))
+        ]
+
+
+def _get_unmatched_keys_validated(
+        engine: Engine,
+    ) -> list[ReceivedKeyOutputSchema]:
+    query = (
+        select(ReceivedExchangeKey)
+        .where(ReceivedExchangeKey.matched == False)
+    )
+    with Session(engine) as session:
+        return [
+            ReceivedKeyOutputSchema.model_validate(x)
+            for x in session.scalars(query)
+        ]
+
+
+def _get_messages_validated(engine: Engine) -> list[MessageOutputSchema]:
+    query = select(Message).where(Message.contact_id == 1)
+    with Session(engine) as session:
+        return [
+            MessageOutputSchema.model_validate(x)
+            for x in session.scalars(query)
+        ]
+
+
+def _get_messages(engine: Engine) -> list[MessageRecord]:
+    query = select(*MESSAGE_COLUMNS).where(Message.contact_id == 1)
+    with Session(engine) as session:
+        return [MessageRecord(*x) for x in session.execute(query)]
+
+
+def _measure(
+        name: str,
+        engine: Engine,
+        operation: Callable[[Engine], list],
+        repeats: int,
+    ) -> float:
+    durations: list[float] = list()
+    for _ in range(repeats):
+        start = time.perf_counter()
+        rows = len(operation(engine))
+        durations.append(time.perf_counter() - start)
+    rate = rows / statistics.median(durations)
+    print(f'{name:<28} {rows:>7} rows  {rate:>12,.0f} rows/s')
+    return rate
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--contacts', type=int, default=1000)
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        url = f'sqlite:///{os.path.join(directory, "benchmark.db")}'
+        engine = create_database_engine(url)
+        upgrade_schema(engine)
+        _populate(engine, args.contacts, args.messages)
+        comparisons = (
+            ('contacts', _get_contacts_validated, get_contacts),
+            (
+                'unmatched keys',
+                _get_unmatched_keys_validated,
+                get_unmatched_keys,
+            ),
+            ('messages', _get_messages_validated, _get_messages),
+        )
+        for name, validated, lightweight in comparisons:
+            before = _measure(
+                f'{name} (validated)',
+                engine,
+                validated,
+                args.repeats,
+            )
+            after = _measure(
+                f'{name} (records)',
+                engine,
+                lightweight,
+                args.repeats,
+            )
+            print(f'{"":<28} {after / before:.1f}x speedup')
+        engine.dispose()
@@ -0,0 +1,98 @@
+"""
+Measures full-text search latency on a large message database.
+
+Run from the repository root with ```python -m benchmarks.search_latency```.
+A fresh SQLite file in a temporary directory is filled with generated
+messages spread across several contacts, then each query is timed through
+search_messages. Query terms range from words in most messages to words in
+very few of them.
+"""
+
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from argparse import ArgumentParser
+from datetime import datetime, timedelta, timezone
+
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from sqlalchemy import Engine, insert
+from sqlalchemy.orm import Session
+
+from database.engine import create_database_engine, upgrade_schema
+from database.models import Message, MessageType
+from database.operations import add_contact
+from database.schemas.inputs import ContactInputSchema
+from database.search import search_messages
+
+_VOCABULARY = [f'word{index}' for index in range(20000)]
+
+_QUERIES = [
+    'word0',
+    'word1 word2',
+    'word50',
+    'word500',
+    'word5000',
+    'word19999',
+    'word3 word4000',
+    'absent',
+]
+
+def _populate(engine: Engine, messages: int, contacts: int, seed: int):
+    rng = random.Random(seed)
+    for index in range(contacts):
+        with Session(engine) as session:
+            add_contact(session, ContactInputSchema.model_validate({
+                'name': f'Contact {index}',
+                'verification_key': Ed25519PrivateKey.generate().public_key(),
+            }))
+            session.commit()
+    # Word frequencies follow a rough Zipf distribution.
+    weights = [1 / (rank + 1) for rank in range(len(_VOCABULARY))]
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    batch_size = 10000
+    with engine.begin() as connection:
+        for offset in range(0, messages, batch_size):
+            count = min(batch_size, messages - offset)
+            words = rng.choices(_VOCABULARY, weights, k=count * 12)
+            connection.execute(insert(Message), [
+                {
+                    'contact_id': rng.randint(1, contacts),
+                    'timestamp': start + timedelta(seconds=offset + index),
+                    'nonce': f'{offset + index:032x}',
+                    'text': ' '.join(words[index * 12:(index + 1) * 12]),
+                    'message_type': MessageType.RECEIVED,
+                }
+                for index in range(count)
+            ])
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--contacts', type=int, default=20)
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        url = f'sqlite:///{os.path.join(directory, "search.db")}'
+        engine = create_database_engine(url)
+        upgrade_schema(engine)
+        start = time.perf_counter()
+        _populate(engine, args.messages, args.contacts, args.seed)
+        elapsed = time.perf_counter() - start
+        print(f'Stored {args.messages} messages in {elapsed:.1f} s')
+        for query in _QUERIES:
+            latencies: list[float] = list()
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                results = search_messages(engine, query)
+                latencies.append((time.perf_counter() - start) * 1000)
+            print(
+                f'{query!r:<20} {len(results):>4} results  '
+                f'median {statistics.median(latencies):7.3f} ms  '
+                f'max {max(latencies):7.3f} ms'
+            )
+        engine.dispose()
@@ -0,0 +1,99 @@
+"""
+Compares the peak memory use of buffered and streamed fetches.
+
+Run from the repository root with ```python -m benchmarks.streaming_fetch```.
+A fetch response body is generated as for the fetch parsing benchmark and
+served by a mock transport in pieces of the given size. It is then fetched
+once with the whole response read and validated at once, and once with its
+elements validated as they arrive and discarded chunk by chunk, as if each
+chunk had been stored. The peak memory allocated during each fetch is
+reported, along with its throughput in elements per second.
+"""
+
+import asyncio
+import time
+import tracemalloc
+
+from argparse import ArgumentParser
+from collections.abc import AsyncIterator, Awaitable, Callable
+
+import httpx
+
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+from benchmarks.fetch_parsing import _make_body
+from server.operations import fetch_data, stream_fetch_data
+
+def _make_client(body: bytes, piece_size: int) -> httpx.AsyncClient:
+    async def _pieces() -> AsyncIterator[bytes]:
+        for start in range(0, len(body), piece_size):
+            yield body[start:start + piece_size]
+    def _handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=_pieces())
+    return httpx.AsyncClient(transport=httpx.MockTransport(_handler))
+
+
+async def _fetch_buffered(client: httpx.AsyncClient, chunk_size: int) -> int:
+    response = await fetch_data(client, Ed25519PrivateKey.generate(), [])
+    return len(response.data.exchange_keys) + len(response.data.messages)
+
+
+async def _fetch_streamed(client: httpx.AsyncClient, chunk_size: int) -> int:
+    elements = 0
+    async for chunk in stream_fetch_data(
+        client=client,
+        signature_key=Ed25519PrivateKey.generate(),
+        contact_keys=[],
+        chunk_size=chunk_size,
+    ):
+        elements += len(chunk.exchange_keys) + len(chunk.messages)
+    return elements
+
+
+def _measure(
+        name: str,
+        body: bytes,
+        fetch: Callable[[httpx.AsyncClient, int], Awaitable[int]],
+        piece_size: int,
+        chunk_size: int,
+    ) -> int:
+    async def _run() -> int:
+        async with _make_client(body, piece_size) as client:
+            return await fetch(client, chunk_size)
+    tracemalloc.start()
+    start = time.perf_counter()
+    elements = asyncio.run(_run())
+    duration = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f'{name:<10} {peak / 2 ** 20:>10,.1f} MiB peak '
+        f'{elements / duration:>12,.0f} elements/s'
+    )
+    return peak
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--elements', type=int, default=100000)
+    parser.add_argument('--senders', type=int, default=10)
+    parser.add_argument('--piece-size', type=int, default=65536)
+    parser.add_argument('--chunk-size', type=int, default=500)
+    args = parser.parse_args()
+    body = _make_body(args.elements, args.senders)
+    print(f'{"body":<10} {len(body) / 2 ** 20:>10,.1f} MiB')
+    before = _measure(
+        'buffered',
+        body,
+        _fetch_buffered,
+        args.piece_size,
+        args.chunk_size,
+    )
+    after = _measure(
+        'streamed',
+        body,
+        _fetch_streamed,
+        args.piece_size,
+        args.chunk_size,
+    )
+    print(f'{"":<10} {before / after:.1f}x less memory')
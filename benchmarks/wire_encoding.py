@@ -0,0 +1,71 @@
+"""
+Compares the size and parsing speed of fetch responses in each encoding.
+
+Run from the repository root with ```python -m benchmarks.wire_encoding```,
+with msgpack installed. A fetch response body is generated as for the fetch
+parsing benchmark, and converted to MessagePack as the stand-in server would
+send it. Both bodies are then parsed with the canonical schema. The size of
+each body is reported, along with throughput in elements per second.
+"""
+
+import json
+import statistics
+import time
+
+from argparse import ArgumentParser
+
+from benchmarks.fetch_parsing import _make_body
+from server.encoding import (
+    decode_model,
+    encode_data,
+    JSON_CONTENT_TYPE,
+    msgpack_available,
+    MSGPACK_CONTENT_TYPE,
+)
+from server.schemas.responses import FetchResponseSchema
+from server.standin import _to_binary
+
+def _measure(
+        name: str,
+        body: bytes,
+        content_type: str,
+        repeats: int,
+    ) -> float:
+    durations: list[float] = list()
+    for _ in range(repeats):
+        start = time.perf_counter()
+        response = decode_model(FetchResponseSchema, body, content_type)
+        durations.append(time.perf_counter() - start)
+    elements = len(response.data.exchange_keys) + len(response.data.messages)
+    rate = elements / statistics.median(durations)
+    print(
+        f'{name:<10} {len(body) / 2 ** 20:>8,.2f} MiB '
+        f'{rate:>12,.0f} elements/s'
+    )
+    return rate
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--elements', type=int, default=10000)
+    parser.add_argument('--senders', type=int, default=10)
+    parser.add_argument('--repeats', type=int, default=10)
+    args = parser.parse_args()
+    if not msgpack_available():
+        parser.error('msgpack must be installed.')
+    json_body = _make_body(args.elements, args.senders)
+    msgpack_body = encode_data(
+        data=_to_binary(json.loads(json_body)),
+        content_type=MSGPACK_CONTENT_TYPE,
+    )
+    before = _measure('json', json_body, JSON_CONTENT_TYPE, args.repeats)
+    after = _measure(
+        'msgpack',
+        msgpack_body,
+        MSGPACK_CONTENT_TYPE,
+        args.repeats,
+    )
+    print(
+        f'{"":<10} {len(msgpack_body) / len(json_body):.0%} of the size, '
+        f'{after / before:.1f}x speedup'
+    )
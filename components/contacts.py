@@ -8,23 +8,22 @@ from cryptography.hazmat.primitives.serialization import (
     load_pem_public_key,
     load_der_public_key,
 )
-from sqlalchemy import Engine
 
 from components.menus import PaginatedMenu
 from components.prompts import Prompt, ChoicePromptNode, TextPromptNode
-from database.operations import get_contacts
+from database.storage import Storage
 from states import State
 from styling import Layout, Padding
 
 class ContactsMenu(PaginatedMenu):
     def __init__(
             self,
-            engine: Engine,
+            storage: Storage,
             layout: Layout,
             padding: Padding | None = None,
         ) -> None:
-        self.engine = engine
-        self.contacts = get_contacts(self.engine)
+        self.storage = storage
+        self.contacts = self.storage.get_contacts()
         items = [contact.name for contact in self.contacts]
         title = 'Contacts'
         footer = 'Ctrl-K: Send Key'
@@ -47,7 +46,7 @@ class ContactsMenu(PaginatedMenu):
             initial_contact_id = self.contacts[self.cursor_index].id
         else:
             initial_contact_id = None
-        self.contacts = get_contacts(self.engine)
+        self.contacts = self.storage.get_contacts()
         self.items = [x.name for x in self.contacts]
         if initial_contact_id is not None:
             if self.contacts[self.cursor_index].id != initial_contact_id:
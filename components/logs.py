@@ -61,34 +61,45 @@ class Log(ManagedWindow):
                 self.draw_required = True
         return State.STANDARD
 
-    def add_item(
+    def _wrap_item(
             self,
             text: str,
-            cached: bool = False,
             title: str | None = None,
             timestamp: datetime | None = None,
-        ):
-        if not cached:
-            self.items.append((text, title, timestamp))
+        ) -> list[tuple[str, bool]]:
         width = self._get_internal_size()[1]
         if width <= 0:
-            return
+            return []
         wrapped_text = textwrap.wrap(text, width)
         if not wrapped_text:
-            return
+            return []
         header = ''
         if title is not None:
             header += title
         if timestamp is not None:
             header += ' ' * (width - len(header) - 16)
             header += timestamp.strftime('%Y-%m-%d %H:%M')
+        lines: list[tuple[str, bool]] = list()
         if header:
-            self.item_lines += [(header, True)]
-            if self.scroll_index > 0:
-                self.scroll_index += 1
-        self.item_lines += [(x, False) for x in wrapped_text]
+            lines.append((header, True))
+        lines += [(x, False) for x in wrapped_text]
+        return lines
+
+    def add_item(
+            self,
+            text: str,
+            cached: bool = False,
+            title: str | None = None,
+            timestamp: datetime | None = None,
+        ):
+        if not cached:
+            self.items.append((text, title, timestamp))
+        lines = self._wrap_item(text, title, timestamp)
+        if not lines:
+            return
+        self.item_lines += lines
         if self.scroll_index > 0:
-            self.scroll_index += len(wrapped_text)
+            self.scroll_index += len(lines)
         self.draw_required = True
 
     def place(self, stdscr: curses.window):
@@ -1,31 +1,42 @@
 import curses
 
-from sqlalchemy import Engine, select
-from sqlalchemy.orm import Session
+from bisect import bisect
+from datetime import datetime
 
 from components.entries import Entry
 from components.logs import Log
-from database.models import Message, MessageType
-from database.schemas.outputs import (
-    BaseContactOutputSchema,
-    MessageOutputSchema,
-)
+from database.models import MessageType
+from database.records import ContactRecord, MessageKey, MessageRecord
+from database.storage import Storage
+from settings import settings
 from states import State
 from styling import Layout, Padding
 
 
 class _SetContactMixin:
-    def set_contact(self, contact: BaseContactOutputSchema | None) -> bool:
+    def set_contact(self, contact: ContactRecord | None) -> bool:
         if self.contact != contact:
             self.contact = contact
             return True
         return False
 
+type _Item = tuple[str, str | None, datetime | None]
+
 class MessageLog(Log, _SetContactMixin):
+    """
+    A log of the messages exchanged with a single contact.
+
+    Only a window of consecutive messages is held, in timestamp order. It
+    starts as the most recent page, and older or newer pages are loaded as
+    the view approaches either edge. Whenever more than the configured
+    number of pages are held, messages at the opposite edge are evicted.
+    Pending outbox messages follow the window while it reaches the end of
+    the history.
+    """
     def __init__(
             self,
-            engine: Engine,
-            contact: BaseContactOutputSchema | None,
+            storage: Storage,
+            contact: ContactRecord | None,
             layout: Layout,
             padding: Padding | None = None,
             title: str | None = None,
@@ -36,10 +47,15 @@ class MessageLog(Log, _SetContactMixin):
         super().__init__(layout, padding, title, footer, bordered, focusable)
         if not self.title and contact is not None:
             self.title = contact.name
-        self.engine = engine
+        self.storage = storage
         self.contact = contact
-        self.loaded_nonces: list[str] = list()
-        self.update()
+        # Keys are held for loaded messages, and line counts for all items.
+        self.item_keys: list[MessageKey] = list()
+        self.item_line_counts: list[int] = list()
+        self.has_older = False
+        self.has_newer = False
+        self.last_message_id = 0
+        self.refresh()
 
     def handle_key(self, key: int) -> State:
         match key:
@@ -50,9 +66,11 @@ class MessageLog(Log, _SetContactMixin):
                 self.refresh()
                 return State.STANDARD
             case _:
-                return super().handle_key(key)
+                state = super().handle_key(key)
+                self._load_visible_pages()
+                return state
 
-    def set_contact(self, contact: BaseContactOutputSchema | None) -> bool:
+    def set_contact(self, contact: ContactRecord | None) -> bool:
         contact_replaced = super().set_contact(contact)
         if contact_replaced:
             if self.contact is not None:
@@ -63,38 +81,206 @@ class MessageLog(Log, _SetContactMixin):
             self.draw_required = True
         return contact_replaced
 
+    def _make_item(self, record: MessageRecord) -> _Item:
+        assert self.contact is not None
+        if record.message_type == MessageType.RECEIVED:
+            title = f'{self.contact.name}:'
+        else:
+            title = 'You:'
+        return record.text, title, record.timestamp
+
+    def _insert_items(
+            self,
+            index: int,
+            items: list[_Item],
+            keys: list[MessageKey] | None = None,
+        ):
+        line_index = sum(self.item_line_counts[:index])
+        lines: list[tuple[str, bool]] = list()
+        line_counts: list[int] = list()
+        for item in items:
+            item_lines = self._wrap_item(*item)
+            lines += item_lines
+            line_counts.append(len(item_lines))
+        # Keep the view still unless it is following the end of the log.
+        if self.scroll_index > 0:
+            if line_index >= len(self.item_lines) - self.scroll_index:
+                self.scroll_index += len(lines)
+        self.items[index:index] = items
+        if keys is not None:
+            self.item_keys[index:index] = keys
+        self.item_line_counts[index:index] = line_counts
+        self.item_lines[line_index:line_index] = lines
+        self.draw_required = True
+
+    def _remove_items(self, start: int, stop: int):
+        line_start = sum(self.item_line_counts[:start])
+        line_stop = line_start + sum(self.item_line_counts[start:stop])
+        if line_start >= len(self.item_lines) - self.scroll_index:
+            self.scroll_index -= min(
+                line_stop - line_start,
+                self.scroll_index,
+            )
+        del self.items[start:stop]
+        del self.item_keys[start:min(stop, len(self.item_keys))]
+        del self.item_line_counts[start:stop]
+        del self.item_lines[line_start:line_stop]
+        self.draw_required = True
+
+    def _remove_pending_items(self):
+        # Pending messages are always the last items in the log.
+        self._remove_items(len(self.item_keys), len(self.items))
+
+    def _add_pending_items(self):
+        assert self.contact is not None
+        if self.has_newer:
+            return
+        self._insert_items(len(self.items), [
+            (x.text, 'You (pending):', None)
+            for x in self.storage.get_queued_messages(self.contact.id)
+        ])
+
+    def _load_page(self, older: bool):
+        # Pages are selected by (timestamp, id) from the edge of the window,
+        # with one extra row showing whether any remain beyond the page.
+        assert self.contact is not None
+        page_size = settings.display.message_page_size
+        if not self.item_keys:
+            key = None
+        elif older:
+            key = self.item_keys[0]
+        else:
+            key = self.item_keys[-1]
+        records = self.storage.get_message_page(
+            contact_id=self.contact.id,
+            key=key,
+            older=older,
+            limit=page_size + 1,
+        )
+        items = [self._make_item(x) for x in records[:page_size]]
+        keys = [(x.timestamp, x.id) for x in records[:page_size]]
+        if older:
+            self.has_older = len(records) > page_size
+            items.reverse()
+            keys.reverse()
+            self._insert_items(0, items, keys)
+        else:
+            self.has_newer = len(records) > page_size
+            self._insert_items(len(self.item_keys), items, keys)
+
+    def _evict_items(self, older: bool):
+        max_items = (
+            settings.display.message_page_size
+            * settings.display.max_loaded_pages
+        )
+        excess = len(self.item_keys) - max_items
+        if excess <= 0:
+            return
+        elif older:
+            self._remove_items(0, excess)
+            self.has_older = True
+        else:
+            self._remove_pending_items()
+            self._remove_items(max_items, len(self.item_keys))
+            self.has_newer = True
+
+    def _load_visible_pages(self):
+        if self.contact is None:
+            return
+        height = self._get_internal_size()[0]
+        lines_above = len(self.item_lines) - height - self.scroll_index
+        if self.has_older and lines_above < height:
+            self._load_page(older=True)
+            self._evict_items(older=False)
+        elif self.has_newer and self.scroll_index < height:
+            self._load_page(older=False)
+            self._add_pending_items()
+            self._evict_items(older=True)
+
     def update(self):
         if self.contact is None:
             return
-        with Session(self.engine) as session:
-            query = (
-                select(Message)
-                .where(Message.contact_id == self.contact.id)
-                .where(~Message.nonce.in_(self.loaded_nonces))
-                .order_by(Message.timestamp)
-            )
-            for obj in session.scalars(query):
-                output = MessageOutputSchema.model_validate(obj)
-                if output.message_type == MessageType.RECEIVED:
-                    title = f'{self.contact.name}:'
-                else:
-                    title = 'You:'
-                self.add_item(output.text, False, title, output.timestamp)
-                self.loaded_nonces.append(output.nonce)
-                self.draw_required = True
+        self._remove_pending_items()
+        # Ids only ever increase, so every message stored since the last
+        # update is after the high-water mark, even if it has an older
+        # timestamp than messages already shown.
+        records = self.storage.get_messages_after(
+            contact_id=self.contact.id,
+            message_id=self.last_message_id,
+        )
+        for record in records:
+            self.last_message_id = max(self.last_message_id, record.id)
+            key = (record.timestamp, record.id)
+            index = bisect(self.item_keys, key)
+            # Messages outside the window are left for paging to load.
+            if index == len(self.item_keys) and self.has_newer:
+                continue
+            elif index == 0 and self.has_older:
+                continue
+            self._insert_items(index, [self._make_item(record)], [key])
+        self._add_pending_items()
+        if self.scroll_index == 0:
+            self._evict_items(older=True)
 
-    def refresh(self):
+    def place(self, stdscr: curses.window):
+        super().place(stdscr)
+        self.item_line_counts = [len(self._wrap_item(*x)) for x in self.items]
+
+    def _reset(self):
         self.window.erase()
-        self.loaded_nonces.clear()
+        self.items.clear()
+        self.item_keys.clear()
+        self.item_line_counts.clear()
         self.item_lines.clear()
         self.scroll_index = 0
-        self.update()
+        self.has_older = False
+        self.has_newer = False
+        self.last_message_id = 0
+        if self.contact is None:
+            return
+        self.last_message_id = self.storage.get_last_message_id(
+            self.contact.id,
+        )
+        self.draw_required = True
+
+    def refresh(self):
+        self._reset()
+        if self.contact is not None:
+            self._load_page(older=True)
+            self._add_pending_items()
+
+    def jump_to(self, message_id: int) -> bool:
+        """
+        Load the pages around a message and scroll it into view.
+
+        Returns False if the message does not belong to the current contact.
+        """
+        if self.contact is None:
+            return False
+        record = self.storage.get_message(self.contact.id, message_id)
+        if record is None:
+            return False
+        key = (record.timestamp, record.id)
+        self._reset()
+        self._insert_items(0, [self._make_item(record)], [key])
+        self._load_page(older=True)
+        self._load_page(older=False)
+        self._add_pending_items()
+        # Place the message at the bottom of the view where possible.
+        index = self.item_keys.index(key)
+        line_stop = sum(self.item_line_counts[:index + 1])
+        height = self._get_internal_size()[0]
+        self.scroll_index = min(
+            len(self.item_lines) - line_stop,
+            max(len(self.item_lines) - height, 0),
+        )
+        return True
 
 class MessageEntry(Entry, _SetContactMixin):
     def __init__(
             self,
-            engine: Engine,
-            contact: BaseContactOutputSchema | None,
+            storage: Storage,
+            contact: ContactRecord | None,
             layout: Layout,
             padding: Padding | None = None,
             title: str | None = None,
@@ -103,7 +289,7 @@ class MessageEntry(Entry, _SetContactMixin):
             focusable: bool = True,
         ):
         super().__init__(layout, padding, title, footer, bordered, focusable)
-        self.engine = engine
+        self.storage = storage
         self.contact = contact
         self.stored_inputs: dict[int, str] = dict()
 
@@ -116,7 +302,7 @@ class MessageEntry(Entry, _SetContactMixin):
                     return super().handle_key(key)
         return State.STANDARD
 
-    def set_contact(self, contact: BaseContactOutputSchema | None) -> bool:
+    def set_contact(self, contact: ContactRecord | None) -> bool:
         if self.contact is not None:
             self.stored_inputs[self.contact.id] = self.input
         contact_replaced = super().set_contact(contact)
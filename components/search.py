@@ -0,0 +1,67 @@
+import curses
+
+from components.menus import PaginatedMenu
+from components.prompts import Prompt, TextPromptNode
+from database.models import MessageType
+from database.records import MessageSearchResult
+from states import State
+from styling import Layout, LayoutMeasure, LayoutUnit, Padding
+
+class SearchPrompt(Prompt):
+    def __init__(self) -> None:
+        self.query_node = TextPromptNode(
+            name='query',
+            message='Enter the words to search messages for.',
+        )
+        super().__init__(self.query_node)
+
+    @property
+    def query(self) -> str:
+        return self.query_node.input
+
+
+class SearchResultsMenu(PaginatedMenu):
+    def __init__(
+            self,
+            query: str,
+            results: list[MessageSearchResult],
+        ) -> None:
+        self.results = results
+        items = [self._format_result(x) for x in results]
+        super().__init__(
+            items=items,
+            layout=Layout(
+                height=LayoutMeasure((100, LayoutUnit.PERCENTAGE)),
+                width=LayoutMeasure((100, LayoutUnit.PERCENTAGE)),
+                top=LayoutMeasure(),
+                left=LayoutMeasure(),
+            ),
+            padding=Padding(1),
+            title=f"{len(results)} results for '{query}'",
+            footer='Enter: Jump to Message | Esc: Cancel',
+        )
+
+    @staticmethod
+    def _format_result(result: MessageSearchResult) -> str:
+        if result.message_type == MessageType.RECEIVED:
+            sender = result.contact_name
+        else:
+            sender = f'You to {result.contact_name}'
+        timestamp = result.timestamp.strftime('%Y-%m-%d %H:%M')
+        text = ' '.join(result.text.split())
+        return f'{timestamp} {sender}: {text}'
+
+    def handle_key(self, key: int) -> State:
+        match key:
+            case curses.KEY_ENTER | 10:
+                if self.results:
+                    return State.PROMPT_SUBMITTED
+            case 27:  # Esc
+                return State.PROMPT_CANCELLED
+            case _:
+                super().handle_key(key)
+        return State.PROMPT_ACTIVE
+
+    @property
+    def current_result(self) -> MessageSearchResult:
+        return self.results[self.cursor_index]
@@ -0,0 +1,157 @@
+from collections import OrderedDict
+from collections.abc import Iterable
+from dataclasses import dataclass
+from threading import Lock
+
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+
+from database.schemas.outputs import ContactOutputSchema
+from database.storage import Storage
+
+class ContactCache:
+    """
+    Process-wide index of contacts by their encoded verification key.
+
+    Each entry holds the decoded verification key and fernet keys of the
+    contact, so that these are only rebuilt after the cache is invalidated.
+    This must happen whenever a contact or fernet key is added or removed.
+
+    The fernet key that most recently decrypted a message from each contact
+    is also tracked, so that it can be tried first regardless of how many
+    keys have accumulated. This survives invalidation, as keys are only ever
+    added or pruned.
+    """
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._contacts: dict[str, ContactOutputSchema | None] = dict()
+        self._preferred_keys: dict[int, str] = dict()
+        self._generation = 0
+
+    def get(
+            self,
+            storage: Storage,
+            verification_key: str,
+        ) -> ContactOutputSchema | None:
+        with self._lock:
+            if verification_key in self._contacts:
+                return self._contacts[verification_key]
+            generation = self._generation
+        contact = storage.get_contact(verification_key)
+        with self._lock:
+            # Discard the result if the cache was invalidated while loading.
+            if self._generation == generation:
+                self._contacts[verification_key] = contact
+        return contact
+
+    def get_fernet_keys(
+            self,
+            contact: ContactOutputSchema,
+        ) -> tuple[str, ...]:
+        """Returns a contact's encoded fernet keys in the order to try them."""
+        keys = tuple(x.encoded_bytes for x in contact.fernet_keys)
+        with self._lock:
+            preferred_key = self._preferred_keys.get(contact.id)
+        if preferred_key is not None and preferred_key in keys[1:]:
+            keys = (preferred_key,) + tuple(
+                x for x in keys if x != preferred_key
+            )
+        return keys
+
+    def set_preferred_fernet_key(self, contact_id: int, key: str) -> None:
+        with self._lock:
+            self._preferred_keys[contact_id] = key
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._contacts.clear()
+            self._generation += 1
+
+
+contact_cache = ContactCache()
+
+
+@dataclass(frozen=True, slots=True)
+class SendContext:
+    """Everything needed to encrypt and address a message to a contact."""
+    contact_id: int
+    name: str
+    verification_key: Ed25519PublicKey
+    fernet_key: Fernet
+
+
+class SendContextCache:
+    """
+    Process-wide send contexts, by contact id.
+
+    Messages are always encrypted with the newest fernet key of a contact,
+    so each context only changes when a new fernet key is stored, and must
+    be invalidated for that contact when this happens. Pruning never removes
+    the newest key. Contacts without any fernet key are cached as None, so
+    that checking whether a message can be sent costs no reads either.
+    """
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._contexts: dict[int, SendContext | None] = dict()
+        self._generation = 0
+
+    def get(self, storage: Storage, contact_id: int) -> SendContext | None:
+        with self._lock:
+            if contact_id in self._contexts:
+                return self._contexts[contact_id]
+            generation = self._generation
+        contact = storage.get_contact_by_id(contact_id)
+        if contact is not None and contact.fernet_keys:
+            context = SendContext(
+                contact_id=contact.id,
+                name=contact.name,
+                verification_key=contact.verification_key,
+                fernet_key=contact.fernet_keys[0].key,
+            )
+        else:
+            context = None
+        with self._lock:
+            # Discard the result if the cache was invalidated while loading.
+            if self._generation == generation:
+                self._contexts[contact_id] = context
+        return context
+
+    def invalidate(self, contact_ids: Iterable[int]) -> None:
+        with self._lock:
+            for contact_id in contact_ids:
+                self._contexts.pop(contact_id, None)
+            self._generation += 1
+
+
+send_context_cache = SendContextCache()
+
+
+class VerificationCache:
+    """
+    Bounded record of fetched elements whose signatures have been verified.
+
+    Entries are digests of the sender key, signature and signed data of each
+    element, so a hit can only occur when the same signature has already been
+    verified against the same sender and data.
+    """
+    def __init__(self, maxsize: int = 4096) -> None:
+        self._lock = Lock()
+        self._digests: OrderedDict[bytes, None] = OrderedDict()
+        self.maxsize = maxsize
+
+    def __contains__(self, digest: bytes) -> bool:
+        with self._lock:
+            if digest in self._digests:
+                self._digests.move_to_end(digest)
+                return True
+            return False
+
+    def add(self, digest: bytes) -> None:
+        with self._lock:
+            self._digests[digest] = None
+            self._digests.move_to_end(digest)
+            while len(self._digests) > self.maxsize:
+                self._digests.popitem(last=False)
+
+
+verification_cache = VerificationCache()
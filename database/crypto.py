@@ -0,0 +1,129 @@
+import math
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from multiprocessing import get_context
+from threading import Lock
+
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+
+@dataclass(frozen=True, slots=True)
+class CryptoTask:
+    """
+    Signature verification and trial decryption for a single fetched element.
+
+    Tasks only hold raw bytes and encoded keys so that they can be sent to
+    worker processes. If fernet keys are given, the signed data is treated as
+    a Fernet token and decrypted with the first key that accepts it.
+    """
+    sender_key: bytes
+    signature: bytes
+    data: bytes
+    verify: bool = True
+    fernet_keys: tuple[str, ...] = ()
+
+
+@dataclass(frozen=True, slots=True)
+class CryptoResult:
+    valid: bool
+    plaintext: str = ''
+    fernet_key: str | None = None
+
+
+@lru_cache(maxsize=1024)
+def _get_fernet(key: str) -> Fernet:
+    return Fernet(key)
+
+
+def run_crypto_task(
+        task: CryptoTask,
+        preferred_key: str | None = None,
+    ) -> CryptoResult:
+    """
+    Runs a single task, trying the preferred fernet key first if present.
+
+    The result records which fernet key decrypted the data, so that callers
+    can prefer it for later messages from the same contact.
+    """
+    if task.verify:
+        try:
+            sender_key = Ed25519PublicKey.from_public_bytes(task.sender_key)
+            sender_key.verify(task.signature, task.data)
+        except Exception:
+            return CryptoResult(False)
+    fernet_keys = task.fernet_keys
+    if preferred_key is not None and preferred_key in fernet_keys[1:]:
+        fernet_keys = (preferred_key,) + tuple(
+            x for x in fernet_keys if x != preferred_key
+        )
+    for key in fernet_keys:
+        try:
+            plaintext = _get_fernet(key).decrypt(task.data).decode()
+            return CryptoResult(True, plaintext, key)
+        except Exception:
+            pass
+    return CryptoResult(True)
+
+
+def _run_crypto_chunk(tasks: list[CryptoTask]) -> list[CryptoResult]:
+    # Consecutive messages are usually encrypted with the same key.
+    results: list[CryptoResult] = list()
+    preferred_key: str | None = None
+    for task in tasks:
+        result = run_crypto_task(task, preferred_key)
+        if result.fernet_key is not None:
+            preferred_key = result.fernet_key
+        results.append(result)
+    return results
+
+
+class CryptoPool:
+    """
+    Runs crypto tasks, spreading large batches across worker processes.
+
+    Processes are used rather than threads because the cryptography backend
+    holds the GIL while verifying and decrypting. The pool is only started
+    the first time a batch reaches the threshold, and results are always
+    returned in the same order as the tasks. Call shutdown once done with
+    the pool to stop its worker processes.
+    """
+    def __init__(self, workers: int, threshold: int = 256) -> None:
+        self.workers = workers
+        self.threshold = threshold
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=get_context('spawn'),
+                )
+            return self._executor
+
+    def shutdown(self) -> None:
+        """Stop the worker processes, if started, waiting for them to exit."""
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def run(self, tasks: list[CryptoTask]) -> list[CryptoResult]:
+        if self.workers <= 1 or len(tasks) < self.threshold:
+            return _run_crypto_chunk(tasks)
+        chunk_size = math.ceil(len(tasks) / (self.workers * 4))
+        chunks = [
+            tasks[index:index + chunk_size]
+            for index in range(0, len(tasks), chunk_size)
+        ]
+        results: list[CryptoResult] = list()
+        for chunk_results in self._get_executor().map(
+            _run_crypto_chunk,
+            chunks,
+        ):
+            results += chunk_results
+        return results
@@ -0,0 +1,59 @@
+from typing import Any
+
+from sqlalchemy import create_engine, Engine, event, make_url
+
+from database.models import Base
+from database.search import create_search_index
+from settings import settings
+
+def _apply_sqlite_pragmas(dbapi_connection: Any, _: Any):
+    pragmas = settings.local_database.sqlite_pragmas
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f'PRAGMA journal_mode = {pragmas.journal_mode}')
+        cursor.execute(f'PRAGMA synchronous = {pragmas.synchronous}')
+        cursor.execute(f'PRAGMA mmap_size = {pragmas.mmap_size}')
+        cursor.execute(f'PRAGMA cache_size = {pragmas.cache_size}')
+        cursor.execute(f'PRAGMA temp_store = {pragmas.temp_store}')
+        cursor.execute(f'PRAGMA busy_timeout = {pragmas.busy_timeout}')
+    finally:
+        cursor.close()
+
+
+def create_database_engine(url: str | None = None) -> Engine:
+    """
+    Create an engine for the local database using the configured profile.
+
+    For SQLite files, the configured pragmas are applied to every new
+    connection. Pool sizing is not applied to in-memory SQLite databases,
+    as these use a single connection per thread.
+    """
+    database_settings = settings.local_database
+    database_url = make_url(url or database_settings.url)
+    is_sqlite = database_url.get_backend_name() == 'sqlite'
+    in_memory = database_url.database in (None, '', ':memory:')
+    kwargs: dict[str, Any] = dict()
+    if not (is_sqlite and in_memory):
+        kwargs['pool_size'] = database_settings.pool_size
+        kwargs['max_overflow'] = database_settings.max_overflow
+    engine = create_engine(database_url, **kwargs)
+    if is_sqlite and database_settings.sqlite_pragmas.enabled:
+        event.listen(engine, 'connect', _apply_sqlite_pragmas)
+    return engine
+
+
+def upgrade_schema(engine: Engine):
+    """
+    Bring an existing database up to date with the current models.
+
+    Missing tables are created with all of their indexes, but create_all
+    never alters existing tables, so any indexes added to the models since
+    the database was created are then created individually. The full-text
+    search index is also created if possible.
+    """
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+        create_search_index(connection)
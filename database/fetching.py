@@ -0,0 +1,356 @@
+"""
+Verification, decryption and storage of the data in fetch responses.
+"""
+
+from base64 import urlsafe_b64encode
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any
+
+from database.cache import (
+    contact_cache,
+    send_context_cache,
+    verification_cache,
+)
+from database.crypto import CryptoPool, CryptoResult, CryptoTask
+from database.models import MessageType
+from database.schemas.outputs import ContactOutputSchema
+from database.storage import Storage
+from server.schemas.responses import (
+    FetchResponseData,
+    FetchResponseExchangeKey,
+    FetchResponseMessage,
+    FetchResponseSchema,
+)
+from settings import settings
+
+type _FetchElement = FetchResponseExchangeKey | FetchResponseMessage
+
+_crypto_pool = CryptoPool(settings.server.crypto_workers)
+
+# The smallest step between timestamps, used to hold a cursor just before
+# an element that must be fetched again.
+_CURSOR_RESOLUTION = timedelta(microseconds=1)
+
+@dataclass
+class FetchReport:
+    """Counts of the elements in a fetch response that needed verifying."""
+    verified: int = 0
+    skipped: int = 0
+
+
+@dataclass
+class _FetchBatch:
+    """Accumulates the rows to be written for a single fetch response."""
+    cursors: dict[int, datetime] = field(default_factory=dict)
+    holds: dict[int, datetime] = field(default_factory=dict)
+    known_exchange_keys: set[str] = field(default_factory=set)
+    known_nonces: set[str] = field(default_factory=set)
+    consumed_key_ids: set[int] = field(default_factory=set)
+    received_keys: list[dict[str, Any]] = field(default_factory=list)
+    fernet_keys: list[dict[str, Any]] = field(default_factory=list)
+    messages: list[dict[str, Any]] = field(default_factory=list)
+    report: FetchReport = field(default_factory=FetchReport)
+
+    def advance_cursor(self, contact_id: int, timestamp: datetime) -> None:
+        cursor = self.cursors.get(contact_id)
+        if cursor is None or cursor < timestamp:
+            self.cursors[contact_id] = timestamp
+
+    def hold_cursor(self, contact_id: int, timestamp: datetime) -> None:
+        """Keeps the cursor before an element that was not stored."""
+        hold = self.holds.get(contact_id)
+        if hold is None or timestamp < hold:
+            self.holds[contact_id] = timestamp
+
+    def merge(self, other: '_FetchBatch') -> None:
+        """Adds the cursors, holds and report of another batch."""
+        for contact_id, timestamp in other.cursors.items():
+            self.advance_cursor(contact_id, timestamp)
+        for contact_id, timestamp in other.holds.items():
+            self.hold_cursor(contact_id, timestamp)
+        self.report.verified += other.report.verified
+        self.report.skipped += other.report.skipped
+
+    def get_cursors(self) -> dict[int, datetime]:
+        """
+        Returns the cursors to store, each capped just before the earliest
+        element from its contact that was not stored, so that the element
+        is fetched again.
+        """
+        cursors: dict[int, datetime] = dict()
+        for contact_id, timestamp in self.cursors.items():
+            hold = self.holds.get(contact_id)
+            if hold is not None:
+                timestamp = min(timestamp, hold - _CURSOR_RESOLUTION)
+            cursors[contact_id] = timestamp
+        return cursors
+
+
+def _select_new_elements[T: _FetchElement](
+        storage: Storage,
+        elements: list[T],
+        get_value: Callable[[T], str],
+        known_values: set[str],
+        batch: _FetchBatch,
+    ) -> list[tuple[T, ContactOutputSchema]]:
+    """Pairs elements with their senders, dropping those already stored."""
+    result: list[tuple[T, ContactOutputSchema]] = list()
+    for element in elements:
+        contact = contact_cache.get(storage, element.sender_key_b64)
+        if contact is None:
+            continue
+        elif get_value(element) in known_values:
+            batch.report.skipped += 1
+            batch.advance_cursor(contact.id, element.timestamp)
+        else:
+            result.append((element, contact))
+    return result
+
+
+def _run_crypto_stage(
+        elements: Sequence[tuple[_FetchElement, ContactOutputSchema]],
+        batch: _FetchBatch,
+        decrypt: bool = False,
+    ) -> list[CryptoResult]:
+    """Verifies and optionally decrypts new elements as a single batch."""
+    tasks: list[CryptoTask] = list()
+    for element, contact in elements:
+        verify = element.signature_digest not in verification_cache
+        if verify:
+            batch.report.verified += 1
+        else:
+            batch.report.skipped += 1
+        if decrypt:
+            fernet_keys = contact_cache.get_fernet_keys(contact)
+        else:
+            fernet_keys = tuple()
+        tasks.append(
+            CryptoTask(
+                sender_key=element.sender_key.public_bytes_raw(),
+                signature=element.signature,
+                data=element.signed_data,
+                verify=verify,
+                fernet_keys=fernet_keys,
+            ),
+        )
+    results = _crypto_pool.run(tasks)
+    for task, (element, contact), result in zip(tasks, elements, results):
+        if task.verify and result.valid:
+            verification_cache.add(element.signature_digest)
+        if result.fernet_key is not None:
+            contact_cache.set_preferred_fernet_key(
+                contact_id=contact.id,
+                key=result.fernet_key,
+            )
+    return results
+
+
+def _handle_exchange_key_element(
+        storage: Storage,
+        element: FetchResponseExchangeKey,
+        contact: ContactOutputSchema,
+        result: CryptoResult,
+        batch: _FetchBatch,
+    ) -> None:
+    # Elements with invalid signatures can never be stored, so they are
+    # passed by the cursor rather than fetched again.
+    if not result.valid:
+        return
+    batch.advance_cursor(contact.id, element.timestamp)
+    if element.exchange_key_b64 in batch.known_exchange_keys:
+        return
+    elif element.initial_key_b64 is not None:
+        # Responses may arrive before their initial key has been stored.
+        initial_key = storage.get_sent_key(element.initial_key_b64)
+        if initial_key is None or initial_key.contact.id != contact.id:
+            batch.hold_cursor(contact.id, element.timestamp)
+            return
+        elif initial_key.id in batch.consumed_key_ids:
+            return
+        shared_secret = initial_key.private_key.exchange(element.exchange_key)
+        batch.fernet_keys.append({
+            'contact_id': contact.id,
+            'encoded_bytes': urlsafe_b64encode(shared_secret).decode(),
+            'timestamp': element.timestamp,
+        })
+        batch.received_keys.append({
+            'encoded_bytes': element.exchange_key_b64,
+            'matched': True,
+            'contact_id': contact.id,
+        })
+        batch.consumed_key_ids.add(initial_key.id)
+    else:
+        batch.received_keys.append({
+            'encoded_bytes': element.exchange_key_b64,
+            'matched': False,
+            'contact_id': contact.id,
+        })
+    batch.known_exchange_keys.add(element.exchange_key_b64)
+
+
+def _handle_message_element(
+        element: FetchResponseMessage,
+        contact: ContactOutputSchema,
+        result: CryptoResult,
+        batch: _FetchBatch,
+    ) -> None:
+    if not result.valid:
+        return
+    batch.advance_cursor(contact.id, element.timestamp)
+    # Messages that cannot be decrypted yet, such as those arriving before
+    # their fernet key, hold the cursor back so they are fetched again.
+    if result.fernet_key is None:
+        batch.hold_cursor(contact.id, element.timestamp)
+        return
+    if element.nonce in batch.known_nonces:
+        return
+    elif result.plaintext:
+        batch.messages.append({
+            'text': result.plaintext,
+            'contact_id': contact.id,
+            'message_type': MessageType.RECEIVED,
+            'timestamp': element.timestamp,
+            'nonce': element.nonce,
+        })
+        batch.known_nonces.add(element.nonce)
+
+
+def _store_data(
+        storage: Storage,
+        data: FetchResponseData,
+        write_cursors: bool = True,
+    ) -> _FetchBatch:
+    batch = _FetchBatch()
+    # Exchange keys at or before the cursor of their sender were handled by
+    # an earlier fetch, even if they have since been pruned, so they must
+    # not be stored again as keys awaiting a response. Cursors are never
+    # advanced past keys that were held back, so none of these are lost.
+    stored_cursors = storage.get_fetch_cursors()
+    exchange_keys: list[FetchResponseExchangeKey] = list()
+    for element in data.exchange_keys:
+        cursor = stored_cursors.get(element.sender_key_b64)
+        if cursor is not None and element.timestamp <= cursor:
+            batch.report.skipped += 1
+        else:
+            exchange_keys.append(element)
+    # Exchange keys are stored first, so that new fernet keys are available
+    # to decrypt messages in the same response.
+    batch.known_exchange_keys = storage.get_existing_exchange_keys(
+        x.exchange_key_b64 for x in exchange_keys
+    )
+    new_exchange_keys = _select_new_elements(
+        storage=storage,
+        elements=exchange_keys,
+        get_value=lambda x: x.exchange_key_b64,
+        known_values=batch.known_exchange_keys,
+        batch=batch,
+    )
+    results = _run_crypto_stage(new_exchange_keys, batch)
+    for (element, contact), result in zip(new_exchange_keys, results):
+        _handle_exchange_key_element(storage, element, contact, result, batch)
+    storage.store_exchange_keys(
+        received_keys=batch.received_keys,
+        fernet_keys=batch.fernet_keys,
+        consumed_key_ids=batch.consumed_key_ids,
+    ).result()
+    if batch.fernet_keys:
+        contact_cache.invalidate()
+        send_context_cache.invalidate(
+            x['contact_id'] for x in batch.fernet_keys
+        )
+    batch.known_nonces = storage.get_existing_nonces(
+        x.nonce for x in data.messages
+    )
+    new_messages = _select_new_elements(
+        storage=storage,
+        elements=data.messages,
+        get_value=lambda x: x.nonce,
+        known_values=batch.known_nonces,
+        batch=batch,
+    )
+    results = _run_crypto_stage(new_messages, batch, decrypt=True)
+    for (element, contact), result in zip(new_messages, results):
+        _handle_message_element(element, contact, result, batch)
+    storage.store_messages(
+        messages=batch.messages,
+        cursors=batch.get_cursors() if write_cursors else {},
+    ).result()
+    return batch
+
+
+def shutdown_crypto_pool() -> None:
+    """Stops the crypto worker processes used to verify large batches."""
+    _crypto_pool.shutdown()
+
+
+def store_fetched_data(
+        storage: Storage,
+        response: FetchResponseSchema,
+    ) -> FetchReport:
+    """
+    Stores the data from a successful fetch request response.
+
+    Elements that are already stored are identified with one query per batch
+    of values rather than one per element, and new rows are bulk inserted.
+    Signatures are only verified for elements that are not already stored
+    and have not passed verification in an earlier fetch. Verification and
+    decryption of large batches is spread across the crypto worker pool.
+    The fetch cursor of each contact is advanced to the latest valid element
+    received from them, so that subsequent incremental fetches can skip it,
+    but never past an element that could not be stored yet, such as a
+    message that could not be decrypted or a response to an exchange key
+    that is not stored. Those are fetched again until they can be stored.
+
+    Only the inserts are queued as writes, so other writes are never held up
+    by verification. Calls must not overlap, as each relies on its reads of
+    already stored elements remaining accurate until it has written.
+    """
+    return _store_data(storage, response.data).report
+
+
+class FetchStream:
+    """
+    Stores the chunks of a streamed fetch response as they are received.
+
+    Each chunk is stored as a response of its own would be, except that the
+    fetch cursors are only advanced once the whole response has been stored,
+    so that an interrupted stream never leaves a cursor beyond elements that
+    were not received. As with store_fetched_data, storing must not overlap
+    with that of any other response.
+
+    Server-sent events are each complete, so their cursors are advanced per
+    event by setting advance_each_chunk. Events after the first only hold
+    elements newer than those already sent, so they are still stored as one
+    stream, to keep the cursors behind elements held back by earlier events.
+    """
+    def __init__(
+            self,
+            storage: Storage,
+            advance_each_chunk: bool = False,
+        ) -> None:
+        self.storage = storage
+        self.advance_each_chunk = advance_each_chunk
+        # Only the cursors, holds and report of the totals are used.
+        self._totals = _FetchBatch()
+
+    def _store_cursors(self) -> None:
+        if self._totals.cursors:
+            self.storage.store_messages(
+                messages=[],
+                cursors=self._totals.get_cursors(),
+            ).result()
+
+    def store(self, chunk: FetchResponseData) -> FetchReport:
+        """Stores a single chunk, returning the report for it alone."""
+        batch = _store_data(self.storage, chunk, write_cursors=False)
+        self._totals.merge(batch)
+        if self.advance_each_chunk:
+            self._store_cursors()
+        return batch.report
+
+    def finish(self) -> FetchReport:
+        """Advances the fetch cursors, returning the report for every chunk."""
+        self._store_cursors()
+        return self._totals.report
@@ -0,0 +1,582 @@
+"""
+Storage held entirely in process memory, for ephemeral sessions and testing.
+
+Each table is a dictionary keyed by id, alongside dictionaries indexing rows
+by the values the client looks them up by. Messages are also kept in a
+sorted (timestamp, id) list per contact for paging, and in an inverted index
+of their tokens for search. Nothing is persisted, so all data is lost when
+the client exits.
+"""
+
+import re
+
+from base64 import urlsafe_b64encode
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from collections.abc import Callable, Iterable
+from concurrent.futures import Future
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from threading import Lock
+from typing import Any
+
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+
+from database.models import MessageType
+from database.records import (
+    ContactRecord,
+    MessageKey,
+    MessageRecord,
+    MessageSearchResult,
+    OutboxMessageRecord,
+    PruneReport,
+    ReceivedKeyRecord,
+)
+from database.schemas.inputs import (
+    ContactInputSchema,
+    MessageInputSchema,
+    OutboxMessageInputSchema,
+    SentKeyInputSchema,
+)
+from database.schemas.outputs import ContactOutputSchema, SentKeyOutputSchema
+from database.storage import Storage
+from server.schemas.responses import PostMessageResponseSchema
+
+_TOKEN_PATTERN = re.compile(r'\w+')
+
+def _tokenize(text: str) -> set[str]:
+    return set(_TOKEN_PATTERN.findall(text.casefold()))
+
+
+@dataclass(slots=True)
+class _FernetKeyRow:
+    id: int
+    contact_id: int
+    encoded_bytes: str
+    timestamp: datetime
+
+
+@dataclass(slots=True)
+class _MessageRow:
+    id: int
+    contact_id: int
+    text: str
+    timestamp: datetime
+    nonce: str
+    message_type: MessageType
+
+    def to_record(self) -> MessageRecord:
+        return MessageRecord(
+            self.id,
+            self.text,
+            self.timestamp,
+            self.message_type,
+        )
+
+
+@dataclass(slots=True)
+class _OutboxMessageRow:
+    id: int
+    contact_id: int
+    text: str
+    timestamp: datetime
+    attempts: int = 0
+
+    def to_record(self) -> OutboxMessageRecord:
+        return OutboxMessageRecord(
+            self.id,
+            self.contact_id,
+            self.text,
+            self.timestamp,
+            self.attempts,
+        )
+
+
+@dataclass(slots=True)
+class _ReceivedKeyRow:
+    id: int
+    contact_id: int
+    encoded_bytes: str
+    matched: bool
+
+
+@dataclass(slots=True)
+class _SentKeyRow:
+    id: int
+    contact_id: int
+    encoded_private_bytes: str
+    encoded_public_bytes: str
+
+
+class MemoryStorage(Storage):
+    """
+    Storage in dictionaries guarded by a single lock.
+
+    Writes are applied immediately, and return futures that have already
+    resolved. As with the database, a write that fails leaves no changes
+    behind, and its future holds the exception.
+    """
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._next_ids: defaultdict[str, int] = defaultdict(int)
+        self._contacts: dict[int, ContactRecord] = dict()
+        self._contact_ids_by_key: dict[str, int] = dict()
+        self._contact_ids_by_name: dict[str, int] = dict()
+        self._fernet_keys: defaultdict[int, dict[int, _FernetKeyRow]] = (
+            defaultdict(dict)
+        )
+        self._sent_keys: dict[int, _SentKeyRow] = dict()
+        self._sent_key_ids_by_public_bytes: dict[str, int] = dict()
+        self._received_keys: dict[int, _ReceivedKeyRow] = dict()
+        self._received_key_ids_by_bytes: dict[str, int] = dict()
+        self._fetch_cursors: dict[int, datetime] = dict()
+        self._messages: dict[int, _MessageRow] = dict()
+        self._message_nonces: set[str] = set()
+        self._message_keys: defaultdict[int, list[MessageKey]] = (
+            defaultdict(list)
+        )
+        self._message_ids: defaultdict[int, list[int]] = defaultdict(list)
+        self._message_ids_by_token: defaultdict[str, set[int]] = (
+            defaultdict(set)
+        )
+        self._outbox: dict[int, _OutboxMessageRow] = dict()
+
+    def _next_id(self, table: str) -> int:
+        self._next_ids[table] += 1
+        return self._next_ids[table]
+
+    def _write[T](self, operation: Callable[[], T]) -> Future[T]:
+        future: Future[T] = Future()
+        try:
+            with self._lock:
+                result = operation()
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        return future
+
+    def _insert_message(self, row: _MessageRow) -> None:
+        self._messages[row.id] = row
+        self._message_nonces.add(row.nonce)
+        insort(self._message_keys[row.contact_id], (row.timestamp, row.id))
+        insort(self._message_ids[row.contact_id], row.id)
+        for token in _tokenize(row.text):
+            self._message_ids_by_token[token].add(row.id)
+
+    def _check_new_nonces(self, nonces: Iterable[str]) -> None:
+        seen: set[str] = set()
+        for nonce in nonces:
+            if nonce in self._message_nonces or nonce in seen:
+                raise ValueError(f'Duplicate message nonce {nonce!r}.')
+            seen.add(nonce)
+
+    def _contact_output(self, contact_id: int) -> ContactOutputSchema:
+        contact = self._contacts[contact_id]
+        fernet_keys = sorted(
+            self._fernet_keys[contact_id].values(),
+            key=lambda x: x.timestamp,
+            reverse=True,
+        )
+        return ContactOutputSchema.model_validate({
+            'id': contact.id,
+            'name': contact.name,
+            'verification_key': contact.encoded_verification_key,
+            'fernet_keys': [
+                {'encoded_bytes': x.encoded_bytes} for x in fernet_keys
+            ],
+        })
+
+    # Contacts
+
+    def add_contact(
+            self,
+            contact: ContactInputSchema,
+        ) -> Future[ContactRecord]:
+        def operation() -> ContactRecord:
+            if contact.name in self._contact_ids_by_name:
+                raise ValueError(f'Contact name {contact.name!r} is in use.')
+            elif contact.verification_key in self._contact_ids_by_key:
+                raise ValueError('Verification key is already in use.')
+            record = ContactRecord(
+                self._next_id('contacts'),
+                contact.name,
+                contact.verification_key,
+            )
+            self._contacts[record.id] = record
+            self._contact_ids_by_key[record.encoded_verification_key] = (
+                record.id
+            )
+            self._contact_ids_by_name[record.name] = record.id
+            return record
+        return self._write(operation)
+
+    def get_contacts(self) -> list[ContactRecord]:
+        with self._lock:
+            return sorted(self._contacts.values(), key=lambda x: x.name)
+
+    def get_contacts_without_keys(self) -> list[ContactRecord]:
+        with self._lock:
+            with_keys = {x.contact_id for x in self._sent_keys.values()}
+            with_keys.update(x for x, y in self._fernet_keys.items() if y)
+            return sorted(
+                (x for x in self._contacts.values() if x.id not in with_keys),
+                key=lambda x: x.name,
+            )
+
+    def get_contact_keys(self) -> list[str]:
+        with self._lock:
+            return list(self._contact_ids_by_key)
+
+    def get_contact(
+            self,
+            verification_key: str,
+        ) -> ContactOutputSchema | None:
+        with self._lock:
+            contact_id = self._contact_ids_by_key.get(verification_key)
+            if contact_id is not None:
+                return self._contact_output(contact_id)
+            return None
+
+    def get_contact_by_id(
+            self,
+            contact_id: int,
+        ) -> ContactOutputSchema | None:
+        with self._lock:
+            if contact_id in self._contacts:
+                return self._contact_output(contact_id)
+            return None
+
+    # Key exchange
+
+    def get_sent_key(
+            self,
+            encoded_public_bytes: str,
+        ) -> SentKeyOutputSchema | None:
+        with self._lock:
+            sent_key_id = self._sent_key_ids_by_public_bytes.get(
+                encoded_public_bytes,
+            )
+            if sent_key_id is None:
+                return None
+            sent_key = self._sent_keys[sent_key_id]
+            contact = self._contacts[sent_key.contact_id]
+        return SentKeyOutputSchema.model_validate({
+            'id': sent_key.id,
+            'contact': {
+                'id': contact.id,
+                'name': contact.name,
+                'verification_key': contact.encoded_verification_key,
+            },
+            'encoded_private_bytes': sent_key.encoded_private_bytes,
+            'encoded_public_bytes': sent_key.encoded_public_bytes,
+        })
+
+    def get_unmatched_keys(self) -> list[ReceivedKeyRecord]:
+        with self._lock:
+            return [
+                ReceivedKeyRecord(
+                    x.id,
+                    x.encoded_bytes,
+                    self._contacts[x.contact_id],
+                )
+                for x in self._received_keys.values()
+                if not x.matched
+            ]
+
+    def store_posted_exchange_key(
+            self,
+            contact_id: int,
+            private_exchange_key: X25519PrivateKey,
+        ) -> Future[None]:
+        input = SentKeyInputSchema.model_validate({
+            'encoded_private_bytes': private_exchange_key,
+            'encoded_public_bytes': private_exchange_key.public_key(),
+            'contact_id': contact_id,
+        })
+        def operation() -> None:
+            public_bytes = input.encoded_public_bytes
+            if public_bytes in self._sent_key_ids_by_public_bytes:
+                raise ValueError('Exchange key has already been sent.')
+            row = _SentKeyRow(self._next_id('sent_keys'), **input.model_dump())
+            self._sent_keys[row.id] = row
+            self._sent_key_ids_by_public_bytes[row.encoded_public_bytes] = (
+                row.id
+            )
+        return self._write(operation)
+
+    def store_key_response(
+            self,
+            received_key_id: int,
+            contact_id: int,
+            shared_secret: bytes,
+            timestamp: datetime,
+        ) -> Future[None]:
+        def operation() -> None:
+            received_key = self._received_keys.get(received_key_id)
+            if received_key is not None:
+                received_key.matched = True
+            row = _FernetKeyRow(
+                id=self._next_id('fernet_keys'),
+                contact_id=contact_id,
+                encoded_bytes=urlsafe_b64encode(shared_secret).decode(),
+                timestamp=timestamp,
+            )
+            self._fernet_keys[contact_id][row.id] = row
+        return self._write(operation)
+
+    def prune_keys(
+            self,
+            max_fernet_keys: int | None,
+            max_fernet_key_age: timedelta | None,
+            prune_matched_keys: bool = False,
+        ) -> Future[PruneReport]:
+        def operation() -> PruneReport:
+            removed_fernet_keys = 0
+            removed_matched_keys = 0
+            if max_fernet_keys is not None or max_fernet_key_age is not None:
+                if max_fernet_key_age is not None:
+                    cutoff = datetime.now(timezone.utc) - max_fernet_key_age
+                else:
+                    cutoff = None
+                for keys in self._fernet_keys.values():
+                    ranked = sorted(
+                        keys.values(),
+                        key=lambda x: (x.timestamp, x.id),
+                        reverse=True,
+                    )
+                    for key in ranked[max_fernet_keys or 1:]:
+                        if cutoff is None or key.timestamp < cutoff:
+                            del keys[key.id]
+                            removed_fernet_keys += 1
+            if prune_matched_keys:
+                matched = [
+                    x for x in self._received_keys.values() if x.matched
+                ]
+                for received_key in matched:
+                    del self._received_keys[received_key.id]
+                    del self._received_key_ids_by_bytes[
+                        received_key.encoded_bytes
+                    ]
+                removed_matched_keys = len(matched)
+            return PruneReport(removed_fernet_keys, removed_matched_keys)
+        return self._write(operation)
+
+    # Fetching
+
+    def get_fetch_cursors(self) -> dict[str, datetime]:
+        with self._lock:
+            return {
+                self._contacts[x].encoded_verification_key: y
+                for x, y in self._fetch_cursors.items()
+            }
+
+    def get_existing_exchange_keys(
+            self,
+            encoded_keys: Iterable[str],
+        ) -> set[str]:
+        with self._lock:
+            return {
+                x for x in encoded_keys if x in self._received_key_ids_by_bytes
+            }
+
+    def get_existing_nonces(self, nonces: Iterable[str]) -> set[str]:
+        with self._lock:
+            return {x for x in nonces if x in self._message_nonces}
+
+    def store_exchange_keys(
+            self,
+            received_keys: list[dict[str, Any]],
+            fernet_keys: list[dict[str, Any]],
+            consumed_key_ids: set[int],
+        ) -> Future[None]:
+        def operation() -> None:
+            new_keys = {x['encoded_bytes'] for x in received_keys}
+            if (len(new_keys) < len(received_keys)
+                    or not new_keys.isdisjoint(
+                        self._received_key_ids_by_bytes,
+                    )):
+                raise ValueError('Exchange key has already been received.')
+            for values in received_keys:
+                row = _ReceivedKeyRow(self._next_id('received_keys'), **values)
+                self._received_keys[row.id] = row
+                self._received_key_ids_by_bytes[row.encoded_bytes] = row.id
+            for values in fernet_keys:
+                row = _FernetKeyRow(self._next_id('fernet_keys'), **values)
+                self._fernet_keys[row.contact_id][row.id] = row
+            for sent_key_id in consumed_key_ids:
+                sent_key = self._sent_keys.pop(sent_key_id, None)
+                if sent_key is not None:
+                    del self._sent_key_ids_by_public_bytes[
+                        sent_key.encoded_public_bytes
+                    ]
+        return self._write(operation)
+
+    def store_messages(
+            self,
+            messages: list[dict[str, Any]],
+            cursors: dict[int, datetime],
+        ) -> Future[None]:
+        def operation() -> None:
+            self._check_new_nonces(x['nonce'] for x in messages)
+            for values in messages:
+                self._insert_message(
+                    _MessageRow(self._next_id('messages'), **values),
+                )
+            for contact_id, timestamp in cursors.items():
+                cursor = self._fetch_cursors.get(contact_id)
+                if cursor is None or cursor < timestamp:
+                    self._fetch_cursors[contact_id] = timestamp
+        return self._write(operation)
+
+    # Messages
+
+    def get_message(
+            self,
+            contact_id: int,
+            message_id: int,
+        ) -> MessageRecord | None:
+        with self._lock:
+            row = self._messages.get(message_id)
+            if row is not None and row.contact_id == contact_id:
+                return row.to_record()
+            return None
+
+    def get_message_page(
+            self,
+            contact_id: int,
+            key: MessageKey | None,
+            older: bool,
+            limit: int,
+        ) -> list[MessageRecord]:
+        with self._lock:
+            keys = self._message_keys.get(contact_id, [])
+            if older:
+                end = len(keys) if key is None else bisect_left(keys, key)
+                page = keys[max(end - limit, 0):end][::-1]
+            else:
+                start = 0 if key is None else bisect_right(keys, key)
+                page = keys[start:start + limit]
+            return [self._messages[x].to_record() for _, x in page]
+
+    def get_messages_after(
+            self,
+            contact_id: int,
+            message_id: int,
+        ) -> list[MessageRecord]:
+        with self._lock:
+            ids = self._message_ids.get(contact_id, [])
+            rows = [
+                self._messages[x]
+                for x in ids[bisect_right(ids, message_id):]
+            ]
+            rows.sort(key=lambda x: (x.timestamp, x.id))
+            return [x.to_record() for x in rows]
+
+    def get_last_message_id(self, contact_id: int) -> int:
+        with self._lock:
+            ids = self._message_ids.get(contact_id, [])
+            return ids[-1] if ids else 0
+
+    def search_messages(
+            self,
+            query: str,
+            contact_id: int | None = None,
+            limit: int = 100,
+        ) -> list[MessageSearchResult]:
+        """
+        Return the newest messages containing every term in the query.
+
+        Terms are matched as whole tokens, ignoring case.
+        """
+        tokens = _tokenize(query)
+        if not tokens:
+            return []
+        with self._lock:
+            matches = set.intersection(*(
+                self._message_ids_by_token.get(x, set()) for x in tokens
+            ))
+            result: list[MessageSearchResult] = list()
+            for message_id in sorted(matches, reverse=True):
+                row = self._messages[message_id]
+                if contact_id is not None and row.contact_id != contact_id:
+                    continue
+                result.append(
+                    MessageSearchResult(
+                        row.id,
+                        row.contact_id,
+                        self._contacts[row.contact_id].name,
+                        row.text,
+                        row.timestamp,
+                        row.message_type,
+                    ),
+                )
+                if len(result) >= limit:
+                    break
+            return result
+
+    # Outbox
+
+    def queue_message(
+            self,
+            plaintext: str,
+            contact_id: int,
+        ) -> Future[int]:
+        input = OutboxMessageInputSchema.model_validate({
+            'text': plaintext,
+            'contact_id': contact_id,
+            'timestamp': datetime.now(timezone.utc),
+        })
+        def operation() -> int:
+            row = _OutboxMessageRow(
+                self._next_id('outbox_messages'),
+                **input.model_dump(),
+            )
+            self._outbox[row.id] = row
+            return row.id
+        return self._write(operation)
+
+    def get_queued_messages(
+            self,
+            contact_id: int | None = None,
+        ) -> list[OutboxMessageRecord]:
+        with self._lock:
+            return [
+                x.to_record() for x in self._outbox.values()
+                if contact_id is None or x.contact_id == contact_id
+            ]
+
+    def store_posted_message(
+            self,
+            plaintext: str,
+            contact_id: int,
+            response: PostMessageResponseSchema,
+            outbox_id: int | None = None,
+        ) -> Future[None]:
+        input = MessageInputSchema.model_validate({
+            'text': plaintext,
+            'contact_id': contact_id,
+            'timestamp': response.data.timestamp,
+            'nonce': response.data.nonce,
+            'message_type': MessageType.SENT,
+        })
+        def operation() -> None:
+            self._check_new_nonces([input.nonce])
+            self._insert_message(
+                _MessageRow(self._next_id('messages'), **input.model_dump()),
+            )
+            if outbox_id is not None:
+                self._outbox.pop(outbox_id, None)
+        return self._write(operation)
+
+    def record_failed_attempt(self, outbox_id: int) -> Future[None]:
+        def operation() -> None:
+            row = self._outbox.get(outbox_id)
+            if row is not None:
+                row.attempts += 1
+        return self._write(operation)
+
+    def dequeue_message(self, outbox_id: int) -> Future[None]:
+        def operation() -> None:
+            self._outbox.pop(outbox_id, None)
+        return self._write(operation)
@@ -45,15 +45,15 @@ class Contact(Base):
         unique=True,
         nullable=False,
     )
+    # Relationships are loaded lazily, so queries that need them must ask for
+    # them with selectinload rather than paying for them on every query.
     sent_exchange_keys: Mapped[list['SentExchangeKey']] = relationship(
         argument='SentExchangeKey',
-        lazy='selectin',
         back_populates='contact',
     )
     fernet_keys: Mapped[list['FernetKey']] = relationship(
         argument='FernetKey',
         order_by='FernetKey.timestamp.desc()',
-        lazy='selectin',
     )
 
 
@@ -71,6 +71,7 @@ class Message(Base, _ContactRelationshipMixin, _TimestampMixin):
             'timestamp',
             'nonce',
         ),
+        Index('messages_contact_id_index', 'contact_id', 'id'),
     )
     text: Mapped[str] = mapped_column(Text(), nullable=False)
     nonce: Mapped[str] = mapped_column(String(32), unique=True)
@@ -81,17 +82,53 @@ class Message(Base, _ContactRelationshipMixin, _TimestampMixin):
 
 class FernetKey(Base, _KeyMixin, _TimestampMixin):
     __tablename__ = 'fernet_keys'
+    __table_args__ = (
+        Index('fernet_keys_contact_id_index', 'contact_id'),
+    )
+    contact_id: Mapped[int] = mapped_column(ForeignKey(column='contacts.id'))
+
+
+class FetchCursor(Base, _TimestampMixin):
+    __tablename__ = 'fetch_cursors'
+    contact_id: Mapped[int] = mapped_column(
+        ForeignKey(column='contacts.id'),
+        unique=True,
+    )
+
+
+class OutboxMessage(Base, _TimestampMixin):
+    __tablename__ = 'outbox_messages'
+    __table_args__ = (
+        Index('outbox_messages_contact_id_index', 'contact_id'),
+    )
     contact_id: Mapped[int] = mapped_column(ForeignKey(column='contacts.id'))
+    text: Mapped[str] = mapped_column(Text(), nullable=False)
+    attempts: Mapped[int] = mapped_column(default=0)
 
 
 class ReceivedExchangeKey(Base, _ContactRelationshipMixin, _KeyMixin):
     __tablename__ = 'received_exchange_keys'
+    __table_args__ = (
+        Index(
+            'received_exchange_keys_encoded_bytes_index',
+            'encoded_bytes',
+            unique=True,
+        ),
+        Index('received_exchange_keys_matched_index', 'matched'),
+    )
 
-    matched: Mapped[bool] = mapped_column(default=False, index=True)
+    matched: Mapped[bool] = mapped_column(default=False)
 
 
 class SentExchangeKey(Base, _ContactRelationshipMixin):
     __tablename__ = 'sent_exchange_keys'
+    __table_args__ = (
+        Index(
+            'sent_exchange_keys_encoded_public_bytes_index',
+            'encoded_public_bytes',
+            unique=True,
+        ),
+    )
 
     encoded_private_bytes: Mapped[str] = mapped_column(
         String(44),
@@ -1,50 +1,75 @@
 from base64 import urlsafe_b64encode
-from functools import lru_cache
+from collections.abc import Iterable
+from datetime import datetime, timedelta, timezone
+from typing import Any
 
 from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
-from sqlalchemy import Engine, exists, select
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, Engine, func, insert, select, tuple_, update
+from sqlalchemy.orm import (
+    InstrumentedAttribute,
+    joinedload,
+    selectinload,
+    Session,
+)
 
 from database.models import (
+    Base,
     Contact,
     FernetKey,
+    FetchCursor,
     Message,
     MessageType,
+    OutboxMessage,
     ReceivedExchangeKey,
     SentExchangeKey,
 )
+from database.records import (
+    CONTACT_COLUMNS,
+    MESSAGE_COLUMNS,
+    OUTBOX_MESSAGE_COLUMNS,
+    RECEIVED_KEY_COLUMNS,
+    ContactRecord,
+    MessageKey,
+    MessageRecord,
+    OutboxMessageRecord,
+    PruneReport,
+    ReceivedKeyRecord,
+)
 from database.schemas.inputs import (
     ContactInputSchema,
     MessageInputSchema,
+    OutboxMessageInputSchema,
     SentKeyInputSchema,
 )
-from database.schemas.outputs import (
-    BaseContactOutputSchema,
-    ContactOutputSchema,
-    ReceivedKeyOutputSchema,
-    SentKeyOutputSchema,
-)
-from server.schemas.responses import (
-    FetchResponseExchangeKey,
-    FetchResponseMessage,
-    FetchResponseSchema,
-    PostMessageResponseSchema
-)
+from database.schemas.outputs import ContactOutputSchema, SentKeyOutputSchema
+from schema_components.validators import validate_timestamp_input
+from server.schemas.responses import PostMessageResponseSchema
 
-def add_contact(engine: Engine, contact: ContactInputSchema):
-    with Session(engine) as session:
-        session.add(Contact(**contact.model_dump()))
-        session.commit()
+# The maximum number of bound parameters used in a single IN clause.
+_QUERY_BATCH_SIZE = 500
+
+def add_contact(
+        session: Session,
+        contact: ContactInputSchema,
+    ) -> ContactRecord:
+    """
+    Add a new contact. The contact cache must be invalidated after commit.
+    """
+    obj = Contact(**contact.model_dump())
+    session.add(obj)
+    session.flush()
+    return ContactRecord(obj.id, obj.name, obj.verification_key)
 
 
 def get_contact(
         engine: Engine,
-        verification_key_bytes: bytes,
+        verification_key: str,
     ) -> ContactOutputSchema | None:
-    b64_key_bytes = urlsafe_b64encode(verification_key_bytes)
+    """Return a contact along with its fernet keys, newest first."""
     query = (
         select(Contact)
-        .where(Contact.verification_key == b64_key_bytes.decode())
+        .where(Contact.verification_key == verification_key)
+        .options(selectinload(Contact.fernet_keys))
     )
     with Session(engine) as session:
         contact = session.scalar(query)
@@ -53,169 +78,186 @@ def get_contact(
         return None
 
 
+def get_contact_by_id(
+        engine: Engine,
+        contact_id: int,
+    ) -> ContactOutputSchema | None:
+    """Return a contact along with its fernet keys, newest first."""
+    with Session(engine) as session:
+        contact = session.get(
+            Contact,
+            contact_id,
+            options=[selectinload(Contact.fernet_keys)],
+        )
+        if contact is not None:
+            return ContactOutputSchema.model_validate(contact)
+        return None
+
+
 def get_contact_keys(engine: Engine) -> list[str]:
     with Session(engine) as session:
         return list(session.scalars(select(Contact.verification_key)))
 
 
-def get_contacts(engine: Engine) -> list[BaseContactOutputSchema]:
+def get_fetch_cursors(engine: Engine) -> dict[str, datetime]:
+    """Return the timestamp of the latest fetched element for each contact."""
     query = (
-        select(Contact)
+        select(Contact.verification_key, FetchCursor.timestamp)
+        .join(FetchCursor, FetchCursor.contact_id == Contact.id)
+    )
+    with Session(engine) as session:
+        return {
+            key: validate_timestamp_input(timestamp)
+            for key, timestamp in session.execute(query)
+        }
+
+
+def get_contacts(engine: Engine) -> list[ContactRecord]:
+    query = (
+        select(*CONTACT_COLUMNS)
         .order_by(Contact.name)
     )
     with Session(engine) as session:
-        contacts = session.scalars(query)
-        return [BaseContactOutputSchema.model_validate(x) for x in contacts]
+        return [ContactRecord(*x) for x in session.execute(query)]
 
 
-def get_unmatched_keys(engine: Engine) -> list[ReceivedKeyOutputSchema]:
+def get_unmatched_keys(engine: Engine) -> list[ReceivedKeyRecord]:
     """Return all received keys that have not yet been responded to."""
     query = (
-        select(ReceivedExchangeKey)
+        select(*RECEIVED_KEY_COLUMNS)
+        .join(Contact, Contact.id == ReceivedExchangeKey.contact_id)
         .where(ReceivedExchangeKey.matched == False)
     )
     with Session(engine) as session:
-        keys = session.scalars(query)
-        return [ReceivedKeyOutputSchema.model_validate(x) for x in keys]
+        return [
+            ReceivedKeyRecord(key_id, encoded_bytes, ContactRecord(*contact))
+            for key_id, encoded_bytes, *contact in session.execute(query)
+        ]
 
-def get_contacts_without_keys(engine: Engine) -> list[BaseContactOutputSchema]:
+def get_contacts_without_keys(engine: Engine) -> list[ContactRecord]:
     query = (
-        select(Contact)
+        select(*CONTACT_COLUMNS)
         .where(~Contact.fernet_keys.any())
         .where(~Contact.sent_exchange_keys.any())
         .order_by(Contact.name)
     )
     with Session(engine) as session:
-        contacts = session.scalars(query)
-        return [BaseContactOutputSchema.model_validate(x) for x in contacts]
+        return [ContactRecord(*x) for x in session.execute(query)]
 
 
-@lru_cache(maxsize=256)
-def _get_contact_from_key(
-    session: Session,
-    public_key: str,
-) -> ContactOutputSchema | None:
-    """Internal function to identify contacts from response data."""
-    contact = session.scalar((
-        select(Contact)
-        .where(Contact.verification_key == public_key)
-    ))
-    if contact is not None:
-        return ContactOutputSchema.model_validate(contact)
-    return None
+def get_sent_key(
+        engine: Engine,
+        encoded_public_bytes: str,
+    ) -> SentKeyOutputSchema | None:
+    """Identifies a previously sent key from response data. Not cacheable."""
+    with Session(engine) as session:
+        sent_key = session.scalar((
+            select(SentExchangeKey)
+            .where(
+                SentExchangeKey.encoded_public_bytes == encoded_public_bytes,
+            )
+            .options(joinedload(SentExchangeKey.contact))
+        ))
+        if sent_key is not None:
+            return SentKeyOutputSchema.model_validate(sent_key)
+        return None
 
 
-def _get_initial_key(
-    session: Session,
-    encoded_public_bytes: str,
-) -> SentKeyOutputSchema | None:
-    """Identifies a previously sent key from response data. Not cacheable."""
-    sent_key = session.scalar((
-        select(SentExchangeKey)
-        .where(SentExchangeKey.encoded_public_bytes == encoded_public_bytes)
-    ))
-    if sent_key is not None:
-        return SentKeyOutputSchema.model_validate(sent_key)
-    return None
+def _select_existing(
+        engine: Engine,
+        column: InstrumentedAttribute[str],
+        values: Iterable[str],
+    ) -> set[str]:
+    """Returns the subset of values already present in a column."""
+    unique_values = list(set(values))
+    result: set[str] = set()
+    with Session(engine) as session:
+        for index in range(0, len(unique_values), _QUERY_BATCH_SIZE):
+            batch = unique_values[index:index + _QUERY_BATCH_SIZE]
+            result.update(
+                session.scalars(select(column).where(column.in_(batch))),
+            )
+    return result
 
 
-def _received_key_exists(session: Session, key: str) -> bool:
-    query = exists().where(ReceivedExchangeKey.encoded_bytes == key).select()
-    return bool(session.scalar(query))
+def get_existing_exchange_keys(
+        engine: Engine,
+        encoded_keys: Iterable[str],
+    ) -> set[str]:
+    """Return the subset of the given keys already received."""
+    return _select_existing(
+        engine,
+        ReceivedExchangeKey.encoded_bytes,
+        encoded_keys,
+    )
 
 
-def _received_message_exists(session: Session, nonce: str) -> bool:
-    query = exists().where(Message.nonce == nonce).select()
-    return bool(session.scalar(query))
+def get_existing_nonces(engine: Engine, nonces: Iterable[str]) -> set[str]:
+    """Return the subset of the given nonces already stored."""
+    return _select_existing(engine, Message.nonce, nonces)
 
 
-def _handle_exchange_key_element(
+def _insert_all(
         session: Session,
-        element: FetchResponseExchangeKey,
+        model: type[Base],
+        rows: list[dict[str, Any]],
     ) -> None:
-    if not element.is_valid:
-        return
-    elif _received_key_exists(session, element.exchange_key_b64):
-        return
-    contact = _get_contact_from_key(session, element.sender_key_b64)
-    if contact is None:
+    if rows:
+        session.execute(insert(model), rows)
+
+
+def _store_cursors(session: Session, cursors: dict[int, datetime]) -> None:
+    """Moves stored fetch cursors forward to the given timestamps."""
+    if not cursors:
         return
-    if element.initial_key_b64 is not None:
-        initial_key = _get_initial_key(session, element.initial_key_b64)
-        if initial_key is None or initial_key.contact.id != contact.id:
-            return
-        shared_secret = initial_key.private_key.exchange(element.exchange_key)
-        session.add(
-            FernetKey(
-                contact_id=contact.id,
-                encoded_bytes=urlsafe_b64encode(shared_secret).decode(),
-                timestamp=element.timestamp,
+    query = (
+        select(FetchCursor)
+        .where(FetchCursor.contact_id.in_(cursors))
+    )
+    existing = {x.contact_id: x for x in session.scalars(query)}
+    for contact_id, timestamp in cursors.items():
+        cursor = existing.get(contact_id)
+        if cursor is None:
+            session.add(
+                FetchCursor(contact_id=contact_id, timestamp=timestamp),
             )
-        )
-        session.add(
-            ReceivedExchangeKey(
-                encoded_bytes=element.exchange_key_b64,
-                matched=True,
-                contact_id=contact.id,
-            ),
-        )
-        session.delete(session.get(SentExchangeKey, initial_key.id))
-    else:
-        session.add(
-            ReceivedExchangeKey(
-                encoded_bytes=element.exchange_key_b64,
-                matched=False,
-                contact_id=contact.id,
-            ),
-        )
+        elif validate_timestamp_input(cursor.timestamp) < timestamp:
+            cursor.timestamp = timestamp
 
 
-def _handle_message_element(
+def store_exchange_keys(
         session: Session,
-        element: FetchResponseMessage,
+        received_keys: list[dict[str, Any]],
+        fernet_keys: list[dict[str, Any]],
+        consumed_key_ids: set[int],
     ) -> None:
-    if not element.is_valid:
-        return
-    elif _received_message_exists(session, element.nonce):
-        return
-    contact = _get_contact_from_key(session, element.sender_key_b64)
-    if contact is None:
-        return
-    plaintext = ''
-    for fernet_key in contact.fernet_keys:
-        try:
-            plaintext = fernet_key.key.decrypt(element.encrypted_text).decode()
-            break
-        except Exception:
-            pass
-    if plaintext:
-        session.add(
-            Message(
-                text=plaintext,
-                contact_id=contact.id,
-                message_type=MessageType.RECEIVED,
-                timestamp=element.timestamp,
-                nonce=element.nonce,
-            ),
+    """
+    Insert fetched exchange keys and the fernet keys derived from them.
+
+    Sent keys that have been consumed are removed. The contact cache must be
+    invalidated after commit if any fernet keys were inserted.
+    """
+    _insert_all(session, ReceivedExchangeKey, received_keys)
+    _insert_all(session, FernetKey, fernet_keys)
+    if consumed_key_ids:
+        session.execute(
+            delete(SentExchangeKey)
+            .where(SentExchangeKey.id.in_(consumed_key_ids))
         )
 
 
-def store_fetched_data(engine: Engine, response: FetchResponseSchema) -> None:
-    """Stores the data from a successful fetch request response."""
-    # Use an initial session for key exchange.
-    with Session(engine) as session:
-        for exchange_key in response.data.exchange_keys:
-            _handle_exchange_key_element(session, exchange_key)
-        session.commit()
-    # Use a second session for messages, ensuring fernet keys are accessible.
-    with Session(engine) as session:
-        for message in response.data.messages:
-            _handle_message_element(session, message)
-        session.commit()
+def store_messages(
+        session: Session,
+        messages: list[dict[str, Any]],
+        cursors: dict[int, datetime],
+    ) -> None:
+    """Insert fetched messages and advance the fetch cursors."""
+    _insert_all(session, Message, messages)
+    _store_cursors(session, cursors)
 
 
 def store_posted_exchange_key(
-        engine: Engine,
+        session: Session,
         contact_id: int,
         private_exchange_key: X25519PrivateKey,
     ):
@@ -224,16 +266,48 @@ def store_posted_exchange_key(
         'encoded_public_bytes': private_exchange_key.public_key(),
         'contact_id': contact_id,
     })
-    with Session(engine) as session:
-        session.add(SentExchangeKey(**sent_key_input.model_dump()))
-        session.commit()
+    session.add(SentExchangeKey(**sent_key_input.model_dump()))
+
+
+def store_key_response(
+        session: Session,
+        received_key_id: int,
+        contact_id: int,
+        shared_secret: bytes,
+        timestamp: datetime,
+    ):
+    """
+    Mark a received key as matched and store the resulting fernet key.
+
+    The contact cache must be invalidated after commit.
+    """
+    session.execute(
+        update(ReceivedExchangeKey)
+        .where(ReceivedExchangeKey.id == received_key_id)
+        .values(matched=True)
+    )
+    session.add(
+        FernetKey(
+            encoded_bytes=urlsafe_b64encode(shared_secret).decode(),
+            contact_id=contact_id,
+            timestamp=timestamp,
+        )
+    )
+
 
 def store_posted_message(
-        engine: Engine,
+        session: Session,
         plaintext: str,
         contact_id: int,
         response: PostMessageResponseSchema,
+        outbox_id: int | None = None,
     ):
+    """
+    Store a message that has been posted to the server.
+
+    If the message was sent from the outbox, its outbox row is removed in
+    the same transaction, so it is never both pending and sent.
+    """
     input = MessageInputSchema.model_validate({
         'text': plaintext,
         'contact_id': contact_id,
@@ -241,6 +315,169 @@ def store_posted_message(
         'nonce': response.data.nonce,
         'message_type': MessageType.SENT,
     })
+    session.add(Message(**input.model_dump()))
+    if outbox_id is not None:
+        session.execute(
+            delete(OutboxMessage).where(OutboxMessage.id == outbox_id)
+        )
+
+
+def queue_message(session: Session, plaintext: str, contact_id: int) -> int:
+    """Add a message to the outbox, returning the id of its outbox row."""
+    input = OutboxMessageInputSchema.model_validate({
+        'text': plaintext,
+        'contact_id': contact_id,
+        'timestamp': datetime.now(timezone.utc),
+    })
+    obj = OutboxMessage(**input.model_dump())
+    session.add(obj)
+    session.flush()
+    return obj.id
+
+
+def get_queued_messages(
+        engine: Engine,
+        contact_id: int | None = None,
+    ) -> list[OutboxMessageRecord]:
+    """Return all messages in the outbox, in the order they were queued."""
+    query = select(*OUTBOX_MESSAGE_COLUMNS).order_by(OutboxMessage.id)
+    if contact_id is not None:
+        query = query.where(OutboxMessage.contact_id == contact_id)
+    with Session(engine) as session:
+        return [OutboxMessageRecord(*x) for x in session.execute(query)]
+
+
+def get_message(
+        engine: Engine,
+        contact_id: int,
+        message_id: int,
+    ) -> MessageRecord | None:
+    query = (
+        select(*MESSAGE_COLUMNS)
+        .where(Message.id == message_id)
+        .where(Message.contact_id == contact_id)
+    )
+    with Session(engine) as session:
+        row = session.execute(query).first()
+        if row is not None:
+            return MessageRecord(*row)
+        return None
+
+
+def get_message_page(
+        engine: Engine,
+        contact_id: int,
+        key: MessageKey | None,
+        older: bool,
+        limit: int,
+    ) -> list[MessageRecord]:
+    """
+    Return a page of messages from one side of a (timestamp, id) key.
+
+    Older messages are returned newest first and newer messages oldest first,
+    so that either way the page starts next to the key. Without a key, the
+    newest messages are returned.
+    """
+    order = (Message.timestamp, Message.id)
+    query = select(*MESSAGE_COLUMNS).where(Message.contact_id == contact_id)
+    if older:
+        if key is not None:
+            query = query.where(tuple_(*order) < tuple_(*key))
+        query = query.order_by(*(x.desc() for x in order))
+    else:
+        if key is not None:
+            query = query.where(tuple_(*order) > tuple_(*key))
+        query = query.order_by(*order)
+    with Session(engine) as session:
+        return [MessageRecord(*x) for x in session.execute(query.limit(limit))]
+
+
+def get_messages_after(
+        engine: Engine,
+        contact_id: int,
+        message_id: int,
+    ) -> list[MessageRecord]:
+    """
+    Return every message stored after the one with the given id.
+
+    Ids only ever increase, so this includes messages stored since with an
+    older timestamp. Messages are returned in timestamp order.
+    """
+    query = (
+        select(*MESSAGE_COLUMNS)
+        .where(Message.contact_id == contact_id)
+        .where(Message.id > message_id)
+        .order_by(Message.timestamp, Message.id)
+    )
+    with Session(engine) as session:
+        return [MessageRecord(*x) for x in session.execute(query)]
+
+
+def get_last_message_id(engine: Engine, contact_id: int) -> int:
+    """Return the id of the latest message stored for a contact, or 0."""
+    query = (
+        select(func.max(Message.id))
+        .where(Message.contact_id == contact_id)
+    )
     with Session(engine) as session:
-        session.add(Message(**input.model_dump()))
-        session.commit()
+        return session.scalar(query) or 0
+
+
+def record_failed_attempt(session: Session, outbox_id: int):
+    session.execute(
+        update(OutboxMessage)
+        .where(OutboxMessage.id == outbox_id)
+        .values(attempts=OutboxMessage.attempts + 1)
+    )
+
+
+def dequeue_message(session: Session, outbox_id: int):
+    session.execute(
+        delete(OutboxMessage).where(OutboxMessage.id == outbox_id)
+    )
+
+
+def prune_keys(
+        session: Session,
+        max_fernet_keys: int | None,
+        max_fernet_key_age: timedelta | None,
+        prune_matched_keys: bool = False,
+    ) -> PruneReport:
+    """
+    Remove fernet keys and received exchange keys that are no longer needed.
+
+    Fernet keys are removed once they are beyond the newest max_fernet_keys
+    of their contact and older than max_fernet_key_age. Either may be None
+    to rely on the other alone, and the newest key of each contact is always
+    kept. Received keys that have been responded to are only removed if
+    requested. Once removed, keys fetched again are recognised by their
+    fetch cursor instead. The contact cache must be invalidated after commit
+    if any fernet keys were removed.
+    """
+    removed_fernet_keys = 0
+    removed_matched_keys = 0
+    if max_fernet_keys is not None or max_fernet_key_age is not None:
+        rank = func.row_number().over(
+            partition_by=FernetKey.contact_id,
+            order_by=(FernetKey.timestamp.desc(), FernetKey.id.desc()),
+        )
+        ranked = (
+            select(FernetKey.id, FernetKey.timestamp, rank.label('rank'))
+            .subquery()
+        )
+        expired = (
+            select(ranked.c.id)
+            .where(ranked.c.rank > (max_fernet_keys or 1))
+        )
+        if max_fernet_key_age is not None:
+            cutoff = datetime.now(timezone.utc) - max_fernet_key_age
+            expired = expired.where(ranked.c.timestamp < cutoff)
+        removed_fernet_keys = session.execute(
+            delete(FernetKey).where(FernetKey.id.in_(expired))
+        ).rowcount
+    if prune_matched_keys:
+        removed_matched_keys = session.execute(
+            delete(ReceivedExchangeKey)
+            .where(ReceivedExchangeKey.matched == True)
+        ).rowcount
+    return PruneReport(removed_fernet_keys, removed_matched_keys)
@@ -0,0 +1,119 @@
+"""
+Lightweight read models for frequently repeated local database queries.
+
+Rows read by the interface and the polling tasks come from the local
+database, which is already trusted, so they are selected column by column
+and unpacked straight into slotted dataclasses rather than loaded as ORM
+objects and validated by pydantic. Keys are held in their encoded form and
+only decoded when accessed.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PublicKey
+
+from database.models import (
+    Contact,
+    Message,
+    MessageType,
+    OutboxMessage,
+    ReceivedExchangeKey,
+)
+from schema_components.validators import validate_key_output
+
+@dataclass(frozen=True, slots=True)
+class ContactRecord:
+    id: int
+    name: str
+    encoded_verification_key: str
+
+    @property
+    def verification_key(self) -> Ed25519PublicKey:
+        return validate_key_output(
+            self.encoded_verification_key,
+            Ed25519PublicKey,
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class MessageRecord:
+    id: int
+    text: str
+    timestamp: datetime
+    message_type: MessageType
+
+
+type MessageKey = tuple[datetime, int]
+
+
+@dataclass(frozen=True, slots=True)
+class MessageSearchResult:
+    id: int
+    contact_id: int
+    contact_name: str
+    text: str
+    timestamp: datetime
+    message_type: MessageType
+
+
+@dataclass(frozen=True, slots=True)
+class OutboxMessageRecord:
+    id: int
+    contact_id: int
+    text: str
+    timestamp: datetime
+    attempts: int
+
+
+@dataclass(frozen=True, slots=True)
+class PruneReport:
+    """Counts of the rows removed by a round of key pruning."""
+    fernet_keys: int = 0
+    matched_keys: int = 0
+
+
+@dataclass(frozen=True, slots=True)
+class ReceivedKeyRecord:
+    id: int
+    encoded_bytes: str
+    contact: ContactRecord
+
+    @property
+    def public_key(self) -> X25519PublicKey:
+        return validate_key_output(self.encoded_bytes, X25519PublicKey)
+
+
+# The columns to select for each record, in the order of its fields.
+CONTACT_COLUMNS = (Contact.id, Contact.name, Contact.verification_key)
+
+MESSAGE_COLUMNS = (
+    Message.id,
+    Message.text,
+    Message.timestamp,
+    Message.message_type,
+)
+
+MESSAGE_SEARCH_RESULT_COLUMNS = (
+    Message.id,
+    Message.contact_id,
+    Contact.name,
+    Message.text,
+    Message.timestamp,
+    Message.message_type,
+)
+
+OUTBOX_MESSAGE_COLUMNS = (
+    OutboxMessage.id,
+    OutboxMessage.contact_id,
+    OutboxMessage.text,
+    OutboxMessage.timestamp,
+    OutboxMessage.attempts,
+)
+
+RECEIVED_KEY_COLUMNS = (
+    ReceivedExchangeKey.id,
+    ReceivedExchangeKey.encoded_bytes,
+    *CONTACT_COLUMNS,
+)
@@ -14,6 +14,11 @@ class MessageInputSchema(BaseModel):
     nonce: str
     contact_id: int
 
+class OutboxMessageInputSchema(BaseModel):
+    text: str
+    timestamp: Timestamp
+    contact_id: int
+
 class ReceivedKeyInputSchema(BaseModel):
     encoded_bytes: Base64Key
     contact_id: int
@@ -4,6 +4,7 @@ from pydantic import AliasChoices, BaseModel, ConfigDict, Field
 
 from database.models import MessageType
 from schema_components.types import (
+    Base64Key,
     FernetKey,
     PrivateExchangeKey,
     PublicExchangeKey,
@@ -19,6 +20,7 @@ class FernetKeyOutputSchema(BaseModel):
     key: FernetKey = Field(
         validation_alias=AliasChoices('key', 'encoded_bytes'),
     )
+    encoded_bytes: Base64Key
 
 
 class BaseContactOutputSchema(BaseModel):
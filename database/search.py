@@ -0,0 +1,129 @@
+"""
+Full-text search over message plaintext, backed by an SQLite FTS5 index.
+
+The index is an external-content FTS5 table over the messages table, kept in
+sync by triggers, so every write path stays covered without changes. Where
+FTS5 is unavailable, including on databases other than SQLite, searches fall
+back to a much slower LIKE query.
+"""
+
+from functools import lru_cache
+
+from sqlalchemy import Connection, Engine, inspect, select, text
+from sqlalchemy.orm import Session
+
+from database.models import Contact, Message
+from database.records import (
+    MESSAGE_SEARCH_RESULT_COLUMNS,
+    MessageSearchResult,
+)
+
+_INDEX_NAME = 'messages_fts'
+
+_CREATE_STATEMENTS = (
+    f'''
+    CREATE VIRTUAL TABLE {_INDEX_NAME} USING fts5(
+        text,
+        content='messages',
+        content_rowid='id'
+    )
+    ''',
+    f'''
+    CREATE TRIGGER {_INDEX_NAME}_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO {_INDEX_NAME}(rowid, text) VALUES (new.id, new.text);
+    END
+    ''',
+    f'''
+    CREATE TRIGGER {_INDEX_NAME}_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO {_INDEX_NAME}({_INDEX_NAME}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    ''',
+    f'''
+    CREATE TRIGGER {_INDEX_NAME}_update AFTER UPDATE OF text ON messages
+    BEGIN
+        INSERT INTO {_INDEX_NAME}({_INDEX_NAME}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO {_INDEX_NAME}(rowid, text) VALUES (new.id, new.text);
+    END
+    ''',
+    # Index any messages stored before the index existed.
+    f"INSERT INTO {_INDEX_NAME}({_INDEX_NAME}) VALUES ('rebuild')",
+)
+
+
+def create_search_index(connection: Connection) -> bool:
+    """
+    Create the search index and its triggers if they do not yet exist.
+
+    Returns whether the index is available afterwards.
+    """
+    if connection.dialect.name != 'sqlite':
+        return False
+    elif inspect(connection).has_table(_INDEX_NAME):
+        return True
+    compile_options = connection.exec_driver_sql(
+        'PRAGMA compile_options',
+    ).scalars()
+    if 'ENABLE_FTS5' not in compile_options:
+        return False
+    for statement in _CREATE_STATEMENTS:
+        connection.exec_driver_sql(statement)
+    return True
+
+
+@lru_cache
+def _has_search_index(engine: Engine) -> bool:
+    # The index is created before the interface starts, if at all.
+    with engine.connect() as connection:
+        return inspect(connection).has_table(_INDEX_NAME)
+
+
+def _build_match_query(query: str) -> str:
+    # Each term is quoted, so user input can never be parsed as FTS5 syntax.
+    terms = ['"' + x.replace('"', '""') + '"' for x in query.split()]
+    return ' '.join(terms)
+
+
+def search_messages(
+        engine: Engine,
+        query: str,
+        contact_id: int | None = None,
+        limit: int = 100,
+    ) -> list[MessageSearchResult]:
+    """
+    Return the newest messages containing every term in the query.
+
+    Terms are matched as whole tokens, ignoring case.
+    """
+    match_query = _build_match_query(query)
+    if not match_query:
+        return []
+    statement = (
+        select(*MESSAGE_SEARCH_RESULT_COLUMNS)
+        .join(Contact, Contact.id == Message.contact_id)
+    )
+    with Session(engine) as session:
+        if _has_search_index(engine):
+            # Matches are read newest first, straight from the index.
+            matches = (
+                select(text('rowid'))
+                .select_from(text(_INDEX_NAME))
+                .where(
+                    text(f'{_INDEX_NAME} MATCH :query')
+                    .bindparams(query=match_query)
+                )
+                .order_by(text('rowid DESC'))
+            )
+            if contact_id is None:
+                matches = matches.limit(limit)
+            statement = statement.where(
+                Message.id.in_(matches.scalar_subquery()),
+            )
+        else:
+            for term in query.split():
+                statement = statement.where(Message.text.icontains(term))
+        if contact_id is not None:
+            statement = statement.where(Message.contact_id == contact_id)
+        statement = statement.order_by(Message.id.desc()).limit(limit)
+        return [MessageSearchResult(*x) for x in session.execute(statement)]
@@ -0,0 +1,487 @@
+"""
+The interface through which the client reads and writes its local data.
+
+Reads return as soon as their results are available. Writes are queued and
+return a future, which resolves once the write is durable in the backend,
+so that callers on the event loop or the interface thread never block on
+other writes unless they choose to wait.
+"""
+
+import abc
+
+from collections.abc import Iterable
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Any
+
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+from sqlalchemy import Engine
+
+from database import operations
+from database.records import (
+    ContactRecord,
+    MessageKey,
+    MessageRecord,
+    MessageSearchResult,
+    OutboxMessageRecord,
+    PruneReport,
+    ReceivedKeyRecord,
+)
+from database.schemas.inputs import ContactInputSchema
+from database.schemas.outputs import ContactOutputSchema, SentKeyOutputSchema
+from database.search import search_messages
+from database.writer import DatabaseWriter
+from server.schemas.responses import PostMessageResponseSchema
+
+class Storage(metaclass=abc.ABCMeta):
+    def start(self) -> None:
+        """Start any background work the storage needs before use."""
+
+    def stop(self) -> None:
+        """Finish any queued writes and stop background work."""
+
+    # Contacts
+
+    @abc.abstractmethod
+    def add_contact(
+            self,
+            contact: ContactInputSchema,
+        ) -> Future[ContactRecord]:
+        """
+        Add a new contact. The contact cache must be invalidated once the
+        write has completed.
+        """
+
+    @abc.abstractmethod
+    def get_contacts(self) -> list[ContactRecord]:
+        """Return every contact, ordered by name."""
+
+    @abc.abstractmethod
+    def get_contacts_without_keys(self) -> list[ContactRecord]:
+        """Return contacts with neither fernet keys nor sent keys."""
+
+    @abc.abstractmethod
+    def get_contact_keys(self) -> list[str]:
+        """Return the encoded verification key of every contact."""
+
+    @abc.abstractmethod
+    def get_contact(
+            self,
+            verification_key: str,
+        ) -> ContactOutputSchema | None:
+        """Return a contact along with its fernet keys, newest first."""
+
+    @abc.abstractmethod
+    def get_contact_by_id(
+            self,
+            contact_id: int,
+        ) -> ContactOutputSchema | None:
+        """Return a contact along with its fernet keys, newest first."""
+
+    # Key exchange
+
+    @abc.abstractmethod
+    def get_sent_key(
+            self,
+            encoded_public_bytes: str,
+        ) -> SentKeyOutputSchema | None:
+        pass
+
+    @abc.abstractmethod
+    def get_unmatched_keys(self) -> list[ReceivedKeyRecord]:
+        """Return all received keys that have not yet been responded to."""
+
+    @abc.abstractmethod
+    def store_posted_exchange_key(
+            self,
+            contact_id: int,
+            private_exchange_key: X25519PrivateKey,
+        ) -> Future[None]:
+        pass
+
+    @abc.abstractmethod
+    def store_key_response(
+            self,
+            received_key_id: int,
+            contact_id: int,
+            shared_secret: bytes,
+            timestamp: datetime,
+        ) -> Future[None]:
+        """
+        Mark a received key as matched and store the resulting fernet key.
+        The contact cache must be invalidated once the write has completed.
+        """
+
+    @abc.abstractmethod
+    def prune_keys(
+            self,
+            max_fernet_keys: int | None,
+            max_fernet_key_age: timedelta | None,
+            prune_matched_keys: bool = False,
+        ) -> Future[PruneReport]:
+        """
+        Remove fernet keys beyond the newest max_fernet_keys of their contact
+        and older than max_fernet_key_age, and optionally matched received
+        keys. Either limit may be None, and the newest fernet key of each
+        contact is always kept.
+        """
+
+    # Fetching
+
+    @abc.abstractmethod
+    def get_fetch_cursors(self) -> dict[str, datetime]:
+        """Return the timestamp of the latest fetched element per contact."""
+
+    @abc.abstractmethod
+    def get_existing_exchange_keys(
+            self,
+            encoded_keys: Iterable[str],
+        ) -> set[str]:
+        """Return the subset of the given keys already received."""
+
+    @abc.abstractmethod
+    def get_existing_nonces(self, nonces: Iterable[str]) -> set[str]:
+        """Return the subset of the given nonces already stored."""
+
+    @abc.abstractmethod
+    def store_exchange_keys(
+            self,
+            received_keys: list[dict[str, Any]],
+            fernet_keys: list[dict[str, Any]],
+            consumed_key_ids: set[int],
+        ) -> Future[None]:
+        """
+        Insert fetched exchange keys and the fernet keys derived from them,
+        removing the sent keys they consumed.
+        """
+
+    @abc.abstractmethod
+    def store_messages(
+            self,
+            messages: list[dict[str, Any]],
+            cursors: dict[int, datetime],
+        ) -> Future[None]:
+        """Insert fetched messages and advance the fetch cursors."""
+
+    # Messages
+
+    @abc.abstractmethod
+    def get_message(
+            self,
+            contact_id: int,
+            message_id: int,
+        ) -> MessageRecord | None:
+        pass
+
+    @abc.abstractmethod
+    def get_message_page(
+            self,
+            contact_id: int,
+            key: MessageKey | None,
+            older: bool,
+            limit: int,
+        ) -> list[MessageRecord]:
+        """
+        Return a page of messages from one side of a (timestamp, id) key,
+        starting next to the key, or the newest messages without one.
+        """
+
+    @abc.abstractmethod
+    def get_messages_after(
+            self,
+            contact_id: int,
+            message_id: int,
+        ) -> list[MessageRecord]:
+        """
+        Return every message stored after the one with the given id, in
+        timestamp order.
+        """
+
+    @abc.abstractmethod
+    def get_last_message_id(self, contact_id: int) -> int:
+        """Return the id of the latest message stored for a contact, or 0."""
+
+    @abc.abstractmethod
+    def search_messages(
+            self,
+            query: str,
+            contact_id: int | None = None,
+            limit: int = 100,
+        ) -> list[MessageSearchResult]:
+        """Return the newest messages containing every term in the query."""
+
+    # Outbox
+
+    @abc.abstractmethod
+    def queue_message(
+            self,
+            plaintext: str,
+            contact_id: int,
+        ) -> Future[int]:
+        """Add a message to the outbox, resolving to its outbox id."""
+
+    @abc.abstractmethod
+    def get_queued_messages(
+            self,
+            contact_id: int | None = None,
+        ) -> list[OutboxMessageRecord]:
+        """Return all messages in the outbox, in the order they were queued."""
+
+    @abc.abstractmethod
+    def store_posted_message(
+            self,
+            plaintext: str,
+            contact_id: int,
+            response: PostMessageResponseSchema,
+            outbox_id: int | None = None,
+        ) -> Future[None]:
+        """
+        Store a message that has been posted to the server, removing it from
+        the outbox in the same write if it was sent from there.
+        """
+
+    @abc.abstractmethod
+    def record_failed_attempt(self, outbox_id: int) -> Future[None]:
+        pass
+
+    @abc.abstractmethod
+    def dequeue_message(self, outbox_id: int) -> Future[None]:
+        """Remove a message from the outbox without storing it as sent."""
+
+
+class SqlStorage(Storage):
+    """
+    Storage in a database accessed through SQLAlchemy.
+
+    Reads use pooled connections from the engine, while all writes are run
+    by a database writer, which commits writes queued together as a single
+    transaction.
+    """
+    def __init__(
+            self,
+            engine: Engine,
+            max_batch_size: int = 64,
+            batch_delay: float = 0.0,
+        ) -> None:
+        self.engine = engine
+        self.writer = DatabaseWriter(engine, max_batch_size, batch_delay)
+
+    def start(self) -> None:
+        self.writer.start()
+
+    def stop(self) -> None:
+        self.writer.stop()
+
+    def add_contact(
+            self,
+            contact: ContactInputSchema,
+        ) -> Future[ContactRecord]:
+        return self.writer.submit(
+            partial(operations.add_contact, contact=contact),
+        )
+
+    def get_contacts(self) -> list[ContactRecord]:
+        return operations.get_contacts(self.engine)
+
+    def get_contacts_without_keys(self) -> list[ContactRecord]:
+        return operations.get_contacts_without_keys(self.engine)
+
+    def get_contact_keys(self) -> list[str]:
+        return operations.get_contact_keys(self.engine)
+
+    def get_contact(
+            self,
+            verification_key: str,
+        ) -> ContactOutputSchema | None:
+        return operations.get_contact(self.engine, verification_key)
+
+    def get_contact_by_id(
+            self,
+            contact_id: int,
+        ) -> ContactOutputSchema | None:
+        return operations.get_contact_by_id(self.engine, contact_id)
+
+    def get_sent_key(
+            self,
+            encoded_public_bytes: str,
+        ) -> SentKeyOutputSchema | None:
+        return operations.get_sent_key(self.engine, encoded_public_bytes)
+
+    def get_unmatched_keys(self) -> list[ReceivedKeyRecord]:
+        return operations.get_unmatched_keys(self.engine)
+
+    def store_posted_exchange_key(
+            self,
+            contact_id: int,
+            private_exchange_key: X25519PrivateKey,
+        ) -> Future[None]:
+        return self.writer.submit(
+            partial(
+                operations.store_posted_exchange_key,
+                contact_id=contact_id,
+                private_exchange_key=private_exchange_key,
+            ),
+        )
+
+    def store_key_response(
+            self,
+            received_key_id: int,
+            contact_id: int,
+            shared_secret: bytes,
+            timestamp: datetime,
+        ) -> Future[None]:
+        return self.writer.submit(
+            partial(
+                operations.store_key_response,
+                received_key_id=received_key_id,
+                contact_id=contact_id,
+                shared_secret=shared_secret,
+                timestamp=timestamp,
+            ),
+        )
+
+    def prune_keys(
+            self,
+            max_fernet_keys: int | None,
+            max_fernet_key_age: timedelta | None,
+            prune_matched_keys: bool = False,
+        ) -> Future[PruneReport]:
+        return self.writer.submit(
+            partial(
+                operations.prune_keys,
+                max_fernet_keys=max_fernet_keys,
+                max_fernet_key_age=max_fernet_key_age,
+                prune_matched_keys=prune_matched_keys,
+            ),
+        )
+
+    def get_fetch_cursors(self) -> dict[str, datetime]:
+        return operations.get_fetch_cursors(self.engine)
+
+    def get_existing_exchange_keys(
+            self,
+            encoded_keys: Iterable[str],
+        ) -> set[str]:
+        return operations.get_existing_exchange_keys(self.engine, encoded_keys)
+
+    def get_existing_nonces(self, nonces: Iterable[str]) -> set[str]:
+        return operations.get_existing_nonces(self.engine, nonces)
+
+    def store_exchange_keys(
+            self,
+            received_keys: list[dict[str, Any]],
+            fernet_keys: list[dict[str, Any]],
+            consumed_key_ids: set[int],
+        ) -> Future[None]:
+        return self.writer.submit(
+            partial(
+                operations.store_exchange_keys,
+                received_keys=received_keys,
+                fernet_keys=fernet_keys,
+                consumed_key_ids=consumed_key_ids,
+            ),
+        )
+
+    def store_messages(
+            self,
+            messages: list[dict[str, Any]],
+            cursors: dict[int, datetime],
+        ) -> Future[None]:
+        return self.writer.submit(
+            partial(
+                operations.store_messages,
+                messages=messages,
+                cursors=cursors,
+            ),
+        )
+
+    def get_message(
+            self,
+            contact_id: int,
+            message_id: int,
+        ) -> MessageRecord | None:
+        return operations.get_message(self.engine, contact_id, message_id)
+
+    def get_message_page(
+            self,
+            contact_id: int,
+            key: MessageKey | None,
+            older: bool,
+            limit: int,
+        ) -> list[MessageRecord]:
+        return operations.get_message_page(
+            self.engine,
+            contact_id,
+            key,
+            older,
+            limit,
+        )
+
+    def get_messages_after(
+            self,
+            contact_id: int,
+            message_id: int,
+        ) -> list[MessageRecord]:
+        return operations.get_messages_after(
+            self.engine,
+            contact_id,
+            message_id,
+        )
+
+    def get_last_message_id(self, contact_id: int) -> int:
+        return operations.get_last_message_id(self.engine, contact_id)
+
+    def search_messages(
+            self,
+            query: str,
+            contact_id: int | None = None,
+            limit: int = 100,
+        ) -> list[MessageSearchResult]:
+        return search_messages(self.engine, query, contact_id, limit)
+
+    def queue_message(
+            self,
+            plaintext: str,
+            contact_id: int,
+        ) -> Future[int]:
+        return self.writer.submit(
+            partial(
+                operations.queue_message,
+                plaintext=plaintext,
+                contact_id=contact_id,
+            ),
+        )
+
+    def get_queued_messages(
+            self,
+            contact_id: int | None = None,
+        ) -> list[OutboxMessageRecord]:
+        return operations.get_queued_messages(self.engine, contact_id)
+
+    def store_posted_message(
+            self,
+            plaintext: str,
+            contact_id: int,
+            response: PostMessageResponseSchema,
+            outbox_id: int | None = None,
+        ) -> Future[None]:
+        return self.writer.submit(
+            partial(
+                operations.store_posted_message,
+                plaintext=plaintext,
+                contact_id=contact_id,
+                response=response,
+                outbox_id=outbox_id,
+            ),
+        )
+
+    def record_failed_attempt(self, outbox_id: int) -> Future[None]:
+        return self.writer.submit(
+            partial(operations.record_failed_attempt, outbox_id=outbox_id),
+        )
+
+    def dequeue_message(self, outbox_id: int) -> Future[None]:
+        return self.writer.submit(
+            partial(operations.dequeue_message, outbox_id=outbox_id),
+        )
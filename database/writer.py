@@ -0,0 +1,151 @@
+import time
+
+from collections.abc import Callable
+from concurrent.futures import Future
+from queue import Empty, Queue
+from threading import Thread
+from typing import Any
+
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session
+
+type WriteOperation[T] = Callable[[Session], T]
+
+type _QueuedWrite = tuple[WriteOperation[Any], Future[Any]]
+
+# Seconds to wait before reconnecting after the connection fails.
+_RECONNECT_DELAY = 1.0
+
+class DatabaseWriter:
+    """
+    Runs every write to the local database on a single background thread.
+
+    Other threads pass write operations to the writer through a thread-safe
+    queue using submit, and receive a future for the result of each. The
+    writer holds its own connection, and writes that are queued together are
+    run in a single session and committed as one transaction, so that a
+    burst of writes costs one commit. Futures are only resolved once their
+    transaction has been committed.
+
+    If any write in a batch fails, the batch is rolled back and each of its
+    writes is retried in a transaction of its own, so that one failing write
+    never takes others down with it. Write operations must therefore leave
+    no effects outside the session, and may be run more than once.
+
+    If the connection itself fails, every write in progress or queued at the
+    time fails with the same exception, and the writer reconnects for those
+    submitted afterwards, so no future is left unresolved.
+    """
+    def __init__(
+            self,
+            engine: Engine,
+            max_batch_size: int = 64,
+            batch_delay: float = 0.0,
+        ) -> None:
+        self.engine = engine
+        self.max_batch_size = max_batch_size
+        self.batch_delay = batch_delay
+        self._writes: Queue[_QueuedWrite | None] = Queue()
+        self._thread: Thread | None = None
+        self._stopping = False
+
+    def start(self) -> None:
+        self._thread = Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Commit any queued writes, then stop the writer thread."""
+        if self._thread is not None:
+            self._writes.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def submit[T](self, operation: WriteOperation[T]) -> Future[T]:
+        """Queue a write operation. Safe to call from any thread."""
+        future: Future[T] = Future()
+        self._writes.put((operation, future))
+        return future
+
+    def write[T](self, operation: WriteOperation[T]) -> T:
+        """Queue a write operation and block until it has been committed."""
+        return self.submit(operation).result()
+
+    def _collect_batch(self, first: _QueuedWrite) -> list[_QueuedWrite]:
+        batch = [first]
+        deadline = time.monotonic() + self.batch_delay
+        while len(batch) < self.max_batch_size:
+            try:
+                timeout = deadline - time.monotonic()
+                if timeout > 0:
+                    item = self._writes.get(timeout=timeout)
+                else:
+                    item = self._writes.get_nowait()
+            except Empty:
+                break
+            if item is None:
+                self._stopping = True
+                break
+            batch.append(item)
+        # Writes cancelled while queued are dropped.
+        return [x for x in batch if x[1].set_running_or_notify_cancel()]
+
+    def _commit(self, session: Session, batch: list[_QueuedWrite]) -> None:
+        results = [operation(session) for operation, _ in batch]
+        session.commit()
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def _commit_batch(
+            self,
+            session: Session,
+            batch: list[_QueuedWrite],
+        ) -> None:
+        try:
+            self._commit(session, batch)
+        except Exception as e:
+            session.rollback()
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+            else:
+                for write in batch:
+                    self._commit_batch(session, [write])
+
+    def _fail_writes(
+            self,
+            batch: list[_QueuedWrite],
+            exception: Exception,
+        ) -> None:
+        """Fails the unresolved writes of a batch and all queued writes."""
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(exception)
+        while True:
+            try:
+                item = self._writes.get_nowait()
+            except Empty:
+                break
+            if item is None:
+                self._stopping = True
+            elif item[1].set_running_or_notify_cancel():
+                item[1].set_exception(exception)
+
+    def _run(self) -> None:
+        self._stopping = False
+        while not self._stopping:
+            batch: list[_QueuedWrite] = list()
+            try:
+                with self.engine.connect() as connection:
+                    while not self._stopping:
+                        first = self._writes.get()
+                        if first is None:
+                            self._stopping = True
+                            break
+                        batch = self._collect_batch(first)
+                        if batch:
+                            with Session(connection) as session:
+                                self._commit_batch(session, batch)
+            except Exception as e:
+                self._fail_writes(batch, e)
+                if not self._stopping:
+                    time.sleep(_RECONNECT_DELAY)
@@ -0,0 +1,170 @@
+"""
+Bounded intern cache for key objects decoded from their encodings.
+
+The same few verification and fernet keys are decoded for every contact
+listing, every fernet key attached to a contact and every element of a
+fetch response. Key objects are immutable, so each encoding, whether Base64
+text or the raw bytes of a binary body, is decoded once and the resulting
+object shared until it is evicted.
+
+Private keys are held apart from all others, in a much smaller cache whose
+entries expire a fixed number of seconds after they were decoded, however
+often they are used, so that secrets are never kept around longer than
+needed. Expired private keys are purged whenever the cache is used, and by
+a timer while any are held, so they do not outlive their expiry even if
+the cache is left idle.
+"""
+
+import time
+
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+from functools import cache
+from threading import Lock, Timer
+from typing import Any
+
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+
+type _CacheKey = tuple[type, str | bytes]
+
+@cache
+def _is_private_key_type(key_type: type) -> bool:
+    return issubclass(key_type, (Ed25519PrivateKey, X25519PrivateKey))
+
+
+@dataclass(frozen=True, slots=True)
+class KeyCacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class KeyCache:
+    """
+    Least recently used cache of decoded keys, keyed by type and encoding.
+
+    Decoding happens outside the lock, so two threads missing on the same
+    key at once may both decode it, with the first result being kept.
+    Failed decodings are never cached.
+    """
+    def __init__(
+            self,
+            maxsize: int = 4096,
+            private_maxsize: int = 16,
+            private_ttl: float = 30.0,
+        ) -> None:
+        self._lock = Lock()
+        self._keys: OrderedDict[_CacheKey, Any] = OrderedDict()
+        # Private keys are held in decoding order along with their expiry,
+        # so expired entries are always at the front.
+        self._private_keys: OrderedDict[_CacheKey, tuple[float, Any]] = (
+            OrderedDict()
+        )
+        self.maxsize = maxsize
+        self.private_maxsize = private_maxsize
+        self.private_ttl = private_ttl
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expiry_timer: Timer | None = None
+
+    def _expire_private_keys(self) -> None:
+        now = time.monotonic()
+        while self._private_keys:
+            expiry, _ = next(iter(self._private_keys.values()))
+            if expiry > now:
+                break
+            self._private_keys.popitem(last=False)
+            self._evictions += 1
+
+    def _schedule_expiry(self) -> None:
+        # A single timer is kept, set for the oldest private key.
+        if self._expiry_timer is not None or not self._private_keys:
+            return
+        expiry, _ = next(iter(self._private_keys.values()))
+        delay = max(expiry - time.monotonic(), 0.0)
+        self._expiry_timer = Timer(delay, self._on_expiry_timer)
+        self._expiry_timer.daemon = True
+        self._expiry_timer.start()
+
+    def _on_expiry_timer(self) -> None:
+        with self._lock:
+            self._expiry_timer = None
+            self._expire_private_keys()
+            self._schedule_expiry()
+
+    def _lookup(self, cache_key: _CacheKey, private: bool) -> Any | None:
+        if private:
+            entry = self._private_keys.get(cache_key)
+            return entry[1] if entry is not None else None
+        obj = self._keys.get(cache_key)
+        if obj is not None:
+            self._keys.move_to_end(cache_key)
+        return obj
+
+    def _store(self, cache_key: _CacheKey, obj: Any, private: bool) -> Any:
+        if private:
+            self._expire_private_keys()
+            if cache_key not in self._private_keys:
+                expiry = time.monotonic() + self.private_ttl
+                self._private_keys[cache_key] = (expiry, obj)
+            while len(self._private_keys) > self.private_maxsize:
+                self._private_keys.popitem(last=False)
+                self._evictions += 1
+            self._schedule_expiry()
+            return self._private_keys[cache_key][1]
+        obj = self._keys.setdefault(cache_key, obj)
+        while len(self._keys) > self.maxsize:
+            self._keys.popitem(last=False)
+            self._evictions += 1
+        return obj
+
+    def get[T](
+            self,
+            key_type: type[T],
+            value: str | bytes,
+            decode: Callable[[str | bytes], T],
+        ) -> T:
+        """Return the cached key for an encoding, decoding it on a miss."""
+        cache_key = (key_type, value)
+        private = _is_private_key_type(key_type)
+        with self._lock:
+            self._expire_private_keys()
+            obj = self._lookup(cache_key, private)
+            if obj is not None:
+                self._hits += 1
+                return obj
+            self._misses += 1
+        obj = decode(value)
+        with self._lock:
+            return self._store(cache_key, obj, private)
+
+    def stats(self) -> KeyCacheStats:
+        with self._lock:
+            self._expire_private_keys()
+            return KeyCacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                size=len(self._keys) + len(self._private_keys),
+            )
+
+    def clear(self) -> None:
+        """Remove every entry, leaving the statistics untouched."""
+        with self._lock:
+            self._keys.clear()
+            self._private_keys.clear()
+            if self._expiry_timer is not None:
+                self._expiry_timer.cancel()
+                self._expiry_timer = None
+
+
+key_cache = KeyCache()
@@ -0,0 +1,21 @@
+from base64 import urlsafe_b64decode
+from typing import Any
+
+from pydantic import SerializationInfo
+
+# Serialization context for dumps destined for a binary body.
+BINARY_CONTEXT: dict[str, Any] = {'binary': True}
+
+
+def serialize_base64(value: str, info: SerializationInfo) -> str | bytes:
+    """Dumps Base64 text as is, or as raw bytes for a binary body."""
+    if info.context is not None and info.context.get('binary'):
+        return urlsafe_b64decode(value)
+    return value
+
+
+def serialize_base64_list(
+        value: list[str],
+        info: SerializationInfo,
+    ) -> list[str] | list[bytes]:
+    return [serialize_base64(x, info) for x in value]
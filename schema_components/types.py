@@ -7,13 +7,24 @@ from cryptography.hazmat.primitives.asymmetric.x25519 import (
     X25519PrivateKey,
     X25519PublicKey,
 )
-from pydantic import AfterValidator, BeforeValidator, Field
+from pydantic import (
+    AfterValidator,
+    BeforeValidator,
+    Field,
+    PlainSerializer,
+    PlainValidator,
+)
 
+from schema_components.serializers import (
+    serialize_base64,
+    serialize_base64_list,
+)
 from schema_components.validators import (
     validate_key_input,
     validate_key_list_input,
     validate_signature_input,
     validate_timestamp_input,
+    validate_token_input,
     validate_key_output,
     validate_signature_output,
 )
@@ -27,6 +38,7 @@ type Base64Key = Annotated[
         min_length=44,
     ),
     BeforeValidator(validate_key_input),
+    PlainSerializer(serialize_base64),
 ]
 
 
@@ -38,6 +50,7 @@ type Base64KeyList = Annotated[
         description='A list of Base64 representations of 32-byte values.',
     ),
     BeforeValidator(validate_key_list_input),
+    PlainSerializer(serialize_base64_list),
 ]
 
 
@@ -50,30 +63,42 @@ type Base64Signature = Annotated[
         min_length=88,
     ),
     BeforeValidator(validate_signature_input),
+    PlainSerializer(serialize_base64),
+]
+
+
+type Base64Token = Annotated[
+    str,
+    Field(
+        title='Base64-Encoded Token',
+        description='A Fernet token, which is itself Base64-encoded.',
+    ),
+    BeforeValidator(validate_token_input),
+    PlainSerializer(serialize_base64),
 ]
 
 
 type FernetKey = Annotated[
     Fernet,
-    BeforeValidator(lambda x: validate_key_output(x, Fernet)),
+    PlainValidator(lambda x: validate_key_output(x, Fernet)),
 ]
 
 
 type PrivateExchangeKey = Annotated[
     X25519PrivateKey,
-    BeforeValidator(lambda x: validate_key_output(x, X25519PrivateKey)),
+    PlainValidator(lambda x: validate_key_output(x, X25519PrivateKey)),
 ]
 
 
 type PublicExchangeKey = Annotated[
     X25519PublicKey,
-    BeforeValidator(lambda x: validate_key_output(x, X25519PublicKey)),
+    PlainValidator(lambda x: validate_key_output(x, X25519PublicKey)),
 ]
 
 
 type VerificationKey = Annotated[
     Ed25519PublicKey,
-    BeforeValidator(lambda x: validate_key_output(x, Ed25519PublicKey)),
+    PlainValidator(lambda x: validate_key_output(x, Ed25519PublicKey)),
 ]
 
 
@@ -1,6 +1,8 @@
 from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections.abc import Callable
 from datetime import datetime, timezone
-from typing import cast
+from functools import cache
+from typing import Any
 
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives.asymmetric.ed25519 import (
@@ -12,6 +14,8 @@ from cryptography.hazmat.primitives.asymmetric.x25519 import (
     X25519PublicKey,
 )
 
+from schema_components.cache import key_cache
+
 type _BytesLike = bytes | bytearray | memoryview
 type _PrivateKey = Ed25519PrivateKey | X25519PrivateKey
 type _PublicKey = Ed25519PublicKey | X25519PublicKey
@@ -40,6 +44,13 @@ def validate_key_list_input(value: list[_KeyInputType]) -> list[str]:
     return [validate_key_input(x) for x in value]
 
 
+def validate_token_input(value: str | _BytesLike) -> str:
+    """Accepts a Fernet token as text or, from binary bodies, as raw bytes."""
+    if isinstance(value, str):
+        return value
+    return urlsafe_b64encode(value).decode()
+
+
 def validate_signature_input(value: str | _BytesLike) -> str:
     if isinstance(value, str):
         value = urlsafe_b64decode(value)
@@ -52,27 +63,44 @@ def validate_timestamp_input(value: datetime) -> datetime:
     return value.replace(tzinfo=timezone.utc)
 
 
-def validate_key_output[T: _PrivateKey | _PublicKey | Fernet](
-        value: str,
-        key_type: type[T],
-    ) -> T:
-    raw_bytes = urlsafe_b64decode(value)
+@cache
+def _get_key_decoder(key_type: type, raw: bool) -> Callable[[Any], Any]:
+    # Subclass checks against the abstract key types are slow, so they are
+    # made once per type rather than once per key.
     if issubclass(key_type, (Ed25519PrivateKey, X25519PrivateKey)):
-        return cast(T, key_type.from_private_bytes(raw_bytes))
+        from_raw_bytes = key_type.from_private_bytes
     elif issubclass(key_type, (Ed25519PublicKey, X25519PublicKey)):
-        return cast(T, key_type.from_public_bytes(raw_bytes))
+        from_raw_bytes = key_type.from_public_bytes
     else:
-        return key_type(urlsafe_b64encode(raw_bytes))
+        from_raw_bytes = lambda x: key_type(urlsafe_b64encode(x))
+    if raw:
+        return from_raw_bytes
+    return lambda value: from_raw_bytes(urlsafe_b64decode(value))
 
 
+def validate_key_output[T: _PrivateKey | _PublicKey | Fernet](
+        value: str | bytes,
+        key_type: type[T],
+    ) -> T:
+    """
+    Decodes a key from its Base64 encoding or, from binary bodies, its raw
+    bytes, reusing the object from any earlier decoding.
+    """
+    raw = isinstance(value, bytes)
+    return key_cache.get(key_type, value, _get_key_decoder(key_type, raw))
+
 
 
 
 
 
 
-def validate_signature_output(value: str) -> bytes:
-    raw_bytes = urlsafe_b64decode(value)
+
+def validate_signature_output(value: str | bytes) -> bytes:
+    if isinstance(value, bytes):
+        raw_bytes = value
+    else:
+        raw_bytes = urlsafe_b64decode(value)
     if len(raw_bytes) != 64:
         raise ValueError('Value must have an unencoded length of 64 bytes.')
     return raw_bytes
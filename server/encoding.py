@@ -0,0 +1,80 @@
+"""
+Encoding and decoding of request and response bodies.
+
+JSON is always supported. MessagePack is supported when the optional msgpack
+package is installed, and carries keys, signatures and Fernet tokens as raw
+bytes rather than Base64 text, and timestamps as MessagePack timestamps.
+Which encoding is used is negotiated through the Content-Type and Accept
+headers, with JSON as the fallback whenever either side lacks MessagePack.
+"""
+
+import json
+
+from typing import Any
+
+from pydantic import BaseModel
+
+from schema_components.serializers import BINARY_CONTEXT
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_CONTENT_TYPE = 'application/json'
+MSGPACK_CONTENT_TYPE = 'application/msgpack'
+
+def msgpack_available() -> bool:
+    return msgpack is not None
+
+
+def parse_media_type(header: str | None) -> str:
+    """Strips the parameters from a Content-Type header value."""
+    if not header:
+        return JSON_CONTENT_TYPE
+    return header.partition(';')[0].strip().lower()
+
+
+def accepts_msgpack(header: str | None) -> bool:
+    """Whether an Accept header value allows a MessagePack body."""
+    if not header or not msgpack_available():
+        return False
+    for media_range in header.split(','):
+        media_type, *parameters = media_range.split(';')
+        if media_type.strip().lower() != MSGPACK_CONTENT_TYPE:
+            continue
+        for parameter in parameters:
+            name, _, value = parameter.partition('=')
+            if name.strip() == 'q' and float(value) == 0.0:
+                return False
+        return True
+    return False
+
+
+def encode_data(data: Any, content_type: str) -> bytes:
+    """Encodes plain data, which must already use raw bytes for MessagePack."""
+    if content_type == MSGPACK_CONTENT_TYPE:
+        assert msgpack is not None
+        return msgpack.packb(data, datetime=True)
+    return json.dumps(data).encode()
+
+
+def encode_model(model: BaseModel, content_type: str) -> bytes:
+    if content_type == MSGPACK_CONTENT_TYPE:
+        data = model.model_dump(context=BINARY_CONTEXT)
+        return encode_data(data, content_type)
+    return model.model_dump_json().encode()
+
+
+def decode_model[T: BaseModel](
+        model: type[T],
+        content: bytes | str,
+        content_type: str = JSON_CONTENT_TYPE,
+    ) -> T:
+    """Validates a body straight from its encoding."""
+    if content_type == MSGPACK_CONTENT_TYPE:
+        if msgpack is None:
+            raise ValueError('MessagePack bodies require msgpack.')
+        data = msgpack.unpackb(content, timestamp=3, strict_map_key=False)
+        return model.model_validate(data)
+    return model.model_validate_json(content)
@@ -0,0 +1,117 @@
+import asyncio
+
+from collections.abc import Awaitable, Callable
+from queue import Empty, Queue
+from threading import Thread
+from typing import Any
+
+import httpx
+
+type ServerOperation = Callable[[httpx.AsyncClient], Awaitable[Any]]
+
+class ServerEngine:
+    """
+    Runs server operations on an asyncio event loop in a background thread.
+
+    Other threads pass operations to the engine through a thread-safe queue
+    using submit, and each operation is run as a separate task so that a slow
+    request never holds up the others. Requests awaited through limit share a
+    bounded number of slots, capping the number in flight at any one time.
+
+    Stopping the engine runs any operations still queued, then waits for
+    every operation to finish before closing the client, cancelling any
+    still running after the request timeout.
+    """
+    def __init__(
+            self,
+            max_concurrent_requests: int,
+            request_timeout: float,
+            error_handler: Callable[[BaseException], None],
+        ) -> None:
+        self.max_concurrent_requests = max_concurrent_requests
+        self.request_timeout = request_timeout
+        self.error_handler = error_handler
+        self._requests: Queue[ServerOperation | None] = Queue()
+        self._thread: Thread | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._tasks: set[asyncio.Task[Any]] = set()
+
+    def start(self, main: ServerOperation) -> None:
+        """Start the engine, running main alongside submitted operations."""
+        self._thread = Thread(target=asyncio.run, args=(self._run(main),))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the engine once its operations have finished, and wait for its
+        thread to exit. The main operation should be asked to stop first.
+        """
+        if self._thread is not None:
+            self._put(None)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, operation: ServerOperation) -> None:
+        """Queue an operation to run on the engine. Safe from any thread."""
+        self._put(operation)
+
+    def _put(self, operation: ServerOperation | None) -> None:
+        self._requests.put(operation)
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def limit[T](self, request: Awaitable[T]) -> T:
+        """Await a request once one of the bounded request slots is free."""
+        assert self._semaphore is not None
+        async with self._semaphore:
+            return await request
+
+    def _spawn(self, coroutine: Awaitable[Any]) -> None:
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._on_task_done)
+
+    def _on_task_done(self, task: asyncio.Task[Any]) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled():
+            exception = task.exception()
+            if exception is not None:
+                self.error_handler(exception)
+
+    async def _consume(self, client: httpx.AsyncClient) -> None:
+        """Runs queued operations until the engine is stopped."""
+        assert self._wakeup is not None
+        while True:
+            while True:
+                try:
+                    operation = self._requests.get_nowait()
+                except Empty:
+                    break
+                if operation is None:
+                    return
+                self._spawn(operation(client))
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+    async def _drain(self) -> None:
+        if not self._tasks:
+            return
+        _, pending = await asyncio.wait(
+            set(self._tasks),
+            timeout=self.request_timeout,
+        )
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _run(self, main: ServerOperation) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+        async with httpx.AsyncClient(timeout=self.request_timeout) as client:
+            self._spawn(main(client))
+            await self._consume(client)
+            await self._drain()
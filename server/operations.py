@@ -1,3 +1,6 @@
+from collections.abc import AsyncIterator, Callable
+from datetime import datetime
+from functools import partial
 from typing import Any
 
 import httpx
@@ -7,63 +10,293 @@ from cryptography.hazmat.primitives.asymmetric.ed25519 import (
     Ed25519PublicKey,
 )
 from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PublicKey
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 
+from server.encoding import (
+    decode_model,
+    encode_model,
+    JSON_CONTENT_TYPE,
+    msgpack_available,
+    MSGPACK_CONTENT_TYPE,
+    parse_media_type,
+)
 from server.schemas.requests import (
     FetchRequestSchema,
+    LongPollRequestSchema,
     PostExchangeKeyRequestSchema,
     PostMessageRequestSchema,
 )
 from server.schemas.responses import (
+    CompatibleFetchResponseExchangeKey,
+    CompatibleFetchResponseMessage,
+    CompatibleFetchResponseSchema,
+    FetchResponseData,
+    FetchResponseExchangeKey,
+    FetchResponseMessage,
     FetchResponseSchema,
     PostExchangeKeyResponseSchema,
     PostMessageResponseSchema,
 )
+from server.streaming import FetchResponseScanner
 from settings import settings
 
-def _process_request[T: BaseModel, U: BaseModel](
-        client: httpx.Client,
+# Servers found to need the compatible fetch response schema, by base URL.
+_compatible_servers: set[str] = set()
+
+# Servers found not to accept MessagePack bodies, by base URL.
+_json_servers: set[str] = set()
+
+# The canonical and compatible schemas of the elements of each list.
+_ELEMENT_SCHEMAS: dict[str, tuple[type[BaseModel], type[BaseModel]]] = {
+    'exchange_keys': (
+        FetchResponseExchangeKey,
+        CompatibleFetchResponseExchangeKey,
+    ),
+    'messages': (FetchResponseMessage, CompatibleFetchResponseMessage),
+}
+
+def _validate_with_schema[T: BaseModel](
+        canonical: type[T],
+        compatible: type[T],
+        validate: Callable[[type[T]], T],
+    ) -> T:
+    """
+    Validate part of a fetch response with the schema chosen by the setting.
+
+    In auto mode, the canonical schema is used until a response fails to
+    validate with it but validates with the compatible schema, after which
+    the compatible schema is used for the configured server.
+    """
+    setting = settings.server.response_schema
+    if setting == 'canonical':
+        return validate(canonical)
+    base_url = settings.server.url.base_url
+    if setting == 'compatible' or base_url in _compatible_servers:
+        return validate(compatible)
+    try:
+        return validate(canonical)
+    except ValidationError:
+        result = validate(compatible)
+        _compatible_servers.add(base_url)
+        return result
+
+def _parse_fetch_response(
+        content: bytes | str,
+        content_type: str = JSON_CONTENT_TYPE,
+    ) -> FetchResponseSchema:
+    """Validate a fetch response straight from its body."""
+    return _validate_with_schema(
+        canonical=FetchResponseSchema,
+        compatible=CompatibleFetchResponseSchema,
+        validate=lambda x: decode_model(x, content, content_type),
+    )
+
+def _get_request_content_type() -> str:
+    if settings.server.wire_encoding == 'json' or not msgpack_available():
+        return JSON_CONTENT_TYPE
+    elif settings.server.url.base_url in _json_servers:
+        return JSON_CONTENT_TYPE
+    return MSGPACK_CONTENT_TYPE
+
+def _get_request_headers(content_type: str) -> dict[str, str]:
+    if content_type == MSGPACK_CONTENT_TYPE:
+        accept = f'{MSGPACK_CONTENT_TYPE}, {JSON_CONTENT_TYPE};q=0.5'
+    else:
+        accept = JSON_CONTENT_TYPE
+    return {'Content-Type': content_type, 'Accept': accept}
+
+async def _process_request[T: BaseModel, U: BaseModel](
+        client: httpx.AsyncClient,
         method: str,
         url: str,
         request_model: type[T],
-        response_model: type[U],
+        parse_response: Callable[[bytes, str], U],
+        timeout: float | None = None,
         **kwargs: Any,
     ) -> U:
     request = request_model.model_validate(kwargs)
-    response = client.request(method, url, json=request.model_dump())
+    options: dict[str, Any] = dict()
+    if timeout is not None:
+        options['timeout'] = timeout
+    content_type = _get_request_content_type()
+    response = await client.request(
+        method,
+        url,
+        content=encode_model(request, content_type),
+        headers=_get_request_headers(content_type),
+        **options,
+    )
+    # Servers without MessagePack support reject it, so JSON is used for
+    # them from then on.
+    if (content_type == MSGPACK_CONTENT_TYPE
+            and response.status_code == httpx.codes.UNSUPPORTED_MEDIA_TYPE):
+        _json_servers.add(settings.server.url.base_url)
+        response = await client.request(
+            method,
+            url,
+            content=encode_model(request, JSON_CONTENT_TYPE),
+            headers=_get_request_headers(JSON_CONTENT_TYPE),
+            **options,
+        )
     response.raise_for_status()
-    return response_model.model_validate(response.json())
+    return parse_response(
+        response.content,
+        parse_media_type(response.headers.get('Content-Type')),
+    )
 
-def fetch_data(
-        client: httpx.Client,
+async def fetch_data(
+        client: httpx.AsyncClient,
         signature_key: Ed25519PrivateKey,
         contact_keys: list[str],
+        cursors: dict[str, datetime] | None = None,
     ) -> FetchResponseSchema:
-    """Fetch all data stored on the server that is addressed to the user."""
-    return _process_request(
+    """
+    Fetch all data stored on the server that is addressed to the user.
+
+    If cursors are provided, they map contact keys to the timestamp of the
+    latest element already stored for that contact, and the server is asked
+    to only return elements from that point onwards.
+    """
+    return await _process_request(
         client=client,
         method='POST',
         url=settings.server.url.fetch_data_url,
         request_model=FetchRequestSchema,
-        response_model=FetchResponseSchema,
+        parse_response=_parse_fetch_response,
         public_key=signature_key.public_key(),
         sender_keys=contact_keys,
+        since=cursors,
     )
 
-def post_exchange_key(
-        client: httpx.Client,
+async def stream_fetch_data(
+        client: httpx.AsyncClient,
+        signature_key: Ed25519PrivateKey,
+        contact_keys: list[str],
+        cursors: dict[str, datetime] | None = None,
+        chunk_size: int | None = None,
+    ) -> AsyncIterator[FetchResponseData]:
+    """
+    Fetch all data addressed to the user, reading the response as it arrives.
+
+    Elements are validated one at a time as soon as they have been received,
+    and yielded in chunks of at most the given number of elements. Only the
+    current chunk is held in memory, however large the response. Chunks
+    yielded before an error is raised are valid, but the response they came
+    from is incomplete.
+    """
+    if chunk_size is None:
+        chunk_size = settings.server.fetch_chunk_size
+    request = FetchRequestSchema.model_validate({
+        'public_key': signature_key.public_key(),
+        'sender_keys': contact_keys,
+        'since': cursors,
+    })
+    scanner = FetchResponseScanner()
+    chunk = FetchResponseData(exchange_keys=[], messages=[])
+    size = 0
+    # The body is scanned as it arrives, which is only possible with JSON.
+    async with client.stream(
+        method='POST',
+        url=settings.server.url.fetch_data_url,
+        json=request.model_dump(mode='json'),
+        headers={'Accept': JSON_CONTENT_TYPE},
+    ) as response:
+        response.raise_for_status()
+        async for text in response.aiter_text():
+            for list_name, value in scanner.feed(text):
+                canonical, compatible = _ELEMENT_SCHEMAS[list_name]
+                element = _validate_with_schema(
+                    canonical=canonical,
+                    compatible=compatible,
+                    validate=lambda x: x.model_validate(value),
+                )
+                getattr(chunk, list_name).append(element)
+                size += 1
+                if size == chunk_size:
+                    yield chunk
+                    chunk = FetchResponseData(exchange_keys=[], messages=[])
+                    size = 0
+    scanner.close()
+    if size:
+        yield chunk
+
+async def long_poll_data(
+        client: httpx.AsyncClient,
+        signature_key: Ed25519PrivateKey,
+        contact_keys: list[str],
+        cursors: dict[str, datetime] | None = None,
+        wait: float | None = None,
+    ) -> FetchResponseSchema:
+    """
+    Fetch data addressed to the user, waiting for new data if there is none.
+
+    The server holds the request open for up to the given number of seconds
+    until an element newer than the cursors arrives, then responds as for a
+    standard fetch. An empty response means that nothing arrived in time.
+    """
+    if wait is None:
+        wait = settings.server.push_timeout
+    return await _process_request(
+        client=client,
+        method='POST',
+        url=settings.server.url.long_poll_url,
+        request_model=LongPollRequestSchema,
+        parse_response=_parse_fetch_response,
+        timeout=wait + settings.server.request_timeout,
+        public_key=signature_key.public_key(),
+        sender_keys=contact_keys,
+        since=cursors,
+        wait=wait,
+    )
+
+async def stream_data(
+        client: httpx.AsyncClient,
+        signature_key: Ed25519PrivateKey,
+        contact_keys: list[str],
+        cursors: dict[str, datetime] | None = None,
+    ) -> AsyncIterator[FetchResponseSchema]:
+    """
+    Receive data addressed to the user as server-sent events.
+
+    Each event holds a fetch response, beginning with everything after the
+    cursors and followed by new elements as they are posted. The stream
+    stays open until it is closed by either side.
+    """
+    request = FetchRequestSchema.model_validate({
+        'public_key': signature_key.public_key(),
+        'sender_keys': contact_keys,
+        'since': cursors,
+    })
+    async with client.stream(
+        method='POST',
+        url=settings.server.url.events_url,
+        json=request.model_dump(mode='json'),
+        headers={'Accept': 'text/event-stream'},
+        timeout=httpx.Timeout(settings.server.request_timeout, read=None),
+    ) as response:
+        response.raise_for_status()
+        data_lines: list[str] = list()
+        async for line in response.aiter_lines():
+            if line.startswith('data:'):
+                data_lines.append(line.removeprefix('data:').lstrip(' '))
+            elif not line and data_lines:
+                yield _parse_fetch_response('\n'.join(data_lines))
+                data_lines.clear()
+
+async def post_exchange_key(
+        client: httpx.AsyncClient,
         signature_key: Ed25519PrivateKey,
         recipient_public_key: Ed25519PublicKey,
         exchange_key: X25519PublicKey,
         initial_exchange_key: X25519PublicKey | None = None,
     ) -> PostExchangeKeyResponseSchema:
     """Post a single exchange key to the server."""
-    return _process_request(
+    return await _process_request(
         client=client,
         method='POST',
         url=settings.server.url.post_exchange_key_url,
         request_model=PostExchangeKeyRequestSchema,
-        response_model=PostExchangeKeyResponseSchema,
+        parse_response=partial(decode_model, PostExchangeKeyResponseSchema),
         public_key=signature_key.public_key(),
         recipient_public_key=recipient_public_key,
         transmitted_exchange_key=exchange_key,
@@ -71,21 +304,21 @@ def post_exchange_key(
         initial_exchange_key=initial_exchange_key,
     )
 
-def post_message(
-        client: httpx.Client,
+async def post_message(
+        client: httpx.AsyncClient,
         signature_key: Ed25519PrivateKey,
         recipient_public_key: Ed25519PublicKey,
         encrypted_text: bytes,
     ) -> PostMessageResponseSchema:
     """Post a single message to the server."""
-    return _process_request(
+    return await _process_request(
         client=client,
         method='POST',
         url=settings.server.url.post_message_url,
         request_model=PostMessageRequestSchema,
-        response_model=PostMessageResponseSchema,
+        parse_response=partial(decode_model, PostMessageResponseSchema),
         public_key=signature_key.public_key(),
         recipient_public_key=recipient_public_key,
-        encrypted_text=encrypted_text,
+        encrypted_text=encrypted_text.decode(),
         signature=signature_key.sign(encrypted_text),
     )
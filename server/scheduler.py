@@ -0,0 +1,166 @@
+import asyncio
+
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+import httpx
+
+type ScheduledOperation = Callable[[httpx.AsyncClient], Awaitable[Any]]
+
+class AdaptiveInterval:
+    """
+    An interval that lengthens while a task finds nothing to do.
+
+    Each call to back_off multiplies the interval by the given factor, up to
+    the maximum, and reset returns it to the minimum after any activity.
+    """
+    def __init__(
+            self,
+            minimum: float,
+            maximum: float,
+            factor: float,
+        ) -> None:
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.factor = factor
+        self.current = minimum
+
+    def __call__(self) -> float:
+        return self.current
+
+    def back_off(self) -> None:
+        self.current = min(self.current * self.factor, self.maximum)
+
+    def reset(self) -> None:
+        self.current = self.minimum
+
+
+@dataclass
+class _ScheduledTask:
+    operation: ScheduledOperation
+    interval: float | Callable[[], float]
+    interruptible: bool = False
+    wakeup: asyncio.Event = field(default_factory=asyncio.Event)
+    due: bool = False
+    runner: asyncio.Task[None] | None = None
+
+    def get_interval(self) -> float:
+        if callable(self.interval):
+            return self.interval()
+        return self.interval
+
+
+class Scheduler:
+    """
+    Runs periodic server operations, each on its own interval.
+
+    Intervals are read again after every run and every wakeup, so adaptive
+    intervals take effect without waiting for the previous one to elapse.
+    Exceptions raised by an operation are passed to the error handler, and
+    the operation is run again after its next interval.
+
+    Once stopped, operations are only run if they were triggered, and run
+    returns when those in progress have finished. Operations added as
+    interruptible, such as requests held open for pushed data, are cancelled
+    instead.
+    """
+    def __init__(
+            self,
+            error_handler: Callable[[BaseException], None],
+        ) -> None:
+        self.error_handler = error_handler
+        self._tasks: dict[str, _ScheduledTask] = dict()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._stopping = False
+
+    def add(
+            self,
+            name: str,
+            operation: ScheduledOperation,
+            interval: float | Callable[[], float],
+            interruptible: bool = False,
+        ) -> None:
+        self._tasks[name] = _ScheduledTask(operation, interval, interruptible)
+
+    def wake(self, name: str) -> None:
+        """
+        Have a task recheck its interval. Safe to call from any thread.
+
+        The task runs at once if its interval has now elapsed, and otherwise
+        continues waiting for whatever remains of it.
+        """
+        self._notify(self._tasks[name], due=False)
+
+    def trigger(self, name: str) -> None:
+        """Have a task run at once. Safe to call from any thread."""
+        self._notify(self._tasks[name], due=True)
+
+    def stop(self) -> None:
+        """Stop running operations. Safe to call from any thread."""
+        def _stop() -> None:
+            self._stopping = True
+            for task in self._tasks.values():
+                if task.interruptible and task.runner is not None:
+                    task.runner.cancel()
+                task.wakeup.set()
+        if self._loop is None:
+            self._stopping = True
+        else:
+            self._call_soon(_stop)
+
+    def _notify(self, task: _ScheduledTask, due: bool) -> None:
+        def _set() -> None:
+            task.due = task.due or due
+            task.wakeup.set()
+        if self._loop is not None:
+            self._call_soon(_set)
+
+    def _call_soon(self, callback: Callable[[], None]) -> None:
+        assert self._loop is not None
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self._loop:
+            callback()
+        else:
+            self._loop.call_soon_threadsafe(callback)
+
+    async def _run_task(
+            self,
+            task: _ScheduledTask,
+            client: httpx.AsyncClient,
+        ) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            task.due = False
+            try:
+                await task.operation(client)
+            except Exception as e:
+                self.error_handler(e)
+            finished = loop.time()
+            while not task.due and not self._stopping:
+                remaining = finished + task.get_interval() - loop.time()
+                if remaining <= 0:
+                    break
+                task.wakeup.clear()
+                try:
+                    await asyncio.wait_for(task.wakeup.wait(), remaining)
+                except TimeoutError:
+                    pass
+            # Operations triggered before stopping are still run once.
+            if self._stopping and not task.due:
+                return
+
+    async def run(self, client: httpx.AsyncClient) -> None:
+        self._loop = asyncio.get_running_loop()
+        if self._stopping:
+            return
+        for task in self._tasks.values():
+            task.runner = asyncio.create_task(self._run_task(task, client))
+        # Interrupted operations are only cancelled, so the others continue.
+        await asyncio.gather(
+            *(x.runner for x in self._tasks.values() if x.runner is not None),
+            return_exceptions=True,
+        )
@@ -1,9 +1,11 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from schema_components.types import (
     Base64Key,
     Base64KeyList,
     Base64Signature,
+    Base64Token,
+    Timestamp,
 )
 
 class _BaseRequestSchema(BaseModel):
@@ -18,7 +20,11 @@ class PostExchangeKeyRequestSchema(_BasePostRequestSchema):
     initial_exchange_key: Base64Key | None = None
 
 class PostMessageRequestSchema(_BasePostRequestSchema):
-    encrypted_text: str
+    encrypted_text: Base64Token
 
 class FetchRequestSchema(_BaseRequestSchema):
     sender_keys: Base64KeyList
+    since: dict[Base64Key, Timestamp] | None = None
+
+class LongPollRequestSchema(FetchRequestSchema):
+    wait: float = Field(gt=0.0)
@@ -2,10 +2,12 @@ import abc
 
 from base64 import urlsafe_b64encode
 from functools import cached_property
+from hashlib import sha256
 
 from pydantic import AliasChoices, BaseModel, ConfigDict, Field
 
 from schema_components.types import (
+    Base64Token,
     PublicExchangeKey,
     RawSignature,
     Timestamp,
@@ -42,17 +44,14 @@ class PostKeyResponseSchema(_BaseResponseSchema):
 
 
 class _FetchResponseElement(BaseModel, _TimestampMixin, metaclass=abc.ABCMeta):
+    # Unknown fields are rejected, so that elements using the field names
+    # of older servers fail to validate rather than losing those fields.
     model_config = ConfigDict(
         arbitrary_types_allowed=True,
+        extra='forbid',
     )
 
-    sender_key: VerificationKey = Field(
-        validation_alias=AliasChoices(
-            'sender_key',
-            'sender_public_key',
-            'sender_verification_key',
-        ),
-    )
+    sender_key: VerificationKey
     signature: RawSignature
 
     @cached_property
@@ -60,6 +59,18 @@ class _FetchResponseElement(BaseModel, _TimestampMixin, metaclass=abc.ABCMeta):
         raw_bytes = self.sender_key.public_bytes_raw()
         return urlsafe_b64encode(raw_bytes).decode()
 
+    @property
+    def signed_data(self) -> bytes:
+        return self._get_data()
+
+    @cached_property
+    def signature_digest(self) -> bytes:
+        """A digest identifying the sender, signature and signed data."""
+        digest = sha256(self.sender_key.public_bytes_raw())
+        digest.update(self.signature)
+        digest.update(self._get_data())
+        return digest.digest()
+
     @abc.abstractmethod
     def _get_data(self) -> bytes:
         pass
@@ -74,26 +85,8 @@ class _FetchResponseElement(BaseModel, _TimestampMixin, metaclass=abc.ABCMeta):
 
 
 class FetchResponseExchangeKey(_FetchResponseElement):
-    exchange_key: PublicExchangeKey = Field(
-        validation_alias=AliasChoices(
-            'sent_key',
-            'received_exchange_key',
-            'sent_exchange_key',
-            'key',
-            'exchange_key',
-            'sent_exchange_key',
-            'transmitted_key',
-            'transmitted_exchange_key',
-        ),
-    )
-    initial_key: PublicExchangeKey | None = Field(
-        default=None,
-        validation_alias=AliasChoices(
-            'initial_key',
-            'initial_exchange_key',
-            'response_to',
-        ),
-    )
+    exchange_key: PublicExchangeKey
+    initial_key: PublicExchangeKey | None = None
 
     @cached_property
     def exchange_key_b64(self) -> str:
@@ -113,19 +106,83 @@ class FetchResponseExchangeKey(_FetchResponseElement):
 
 
 class FetchResponseMessage(_FetchResponseElement, _NonceMixin):
-    encrypted_text: str
+    encrypted_text: Base64Token
 
     def _get_data(self) -> bytes:
         return self.encrypted_text.encode()
 
 
-class _FetchResponseData(BaseModel):
+class FetchResponseData(BaseModel):
+    """The elements of a fetch response, or of one chunk of a streamed one."""
     exchange_keys: list[FetchResponseExchangeKey]
     messages: list[FetchResponseMessage]
 
 
 class FetchResponseSchema(_BaseResponseSchema):
-    data: _FetchResponseData
+    """
+    A fetch response using the canonical field names of the stand-in server.
+
+    Elements are validated without resolving any aliases, which makes this
+    much faster than the compatible schema for large responses.
+    """
+    data: FetchResponseData
+
+
+class _CompatibleSenderMixin:
+    sender_key: VerificationKey = Field(
+        validation_alias=AliasChoices(
+            'sender_key',
+            'sender_public_key',
+            'sender_verification_key',
+        ),
+    )
+
+
+class CompatibleFetchResponseExchangeKey(
+        _CompatibleSenderMixin,
+        FetchResponseExchangeKey,
+    ):
+    model_config = ConfigDict(extra='ignore')
+
+    exchange_key: PublicExchangeKey = Field(
+        validation_alias=AliasChoices(
+            'sent_key',
+            'received_exchange_key',
+            'sent_exchange_key',
+            'key',
+            'exchange_key',
+            'transmitted_key',
+            'transmitted_exchange_key',
+        ),
+    )
+    initial_key: PublicExchangeKey | None = Field(
+        default=None,
+        validation_alias=AliasChoices(
+            'initial_key',
+            'initial_exchange_key',
+            'response_to',
+        ),
+    )
+
+
+class CompatibleFetchResponseMessage(
+        _CompatibleSenderMixin,
+        FetchResponseMessage,
+    ):
+    model_config = ConfigDict(extra='ignore')
+
+
+class _CompatibleFetchResponseData(FetchResponseData):
+    exchange_keys: list[CompatibleFetchResponseExchangeKey]
+    messages: list[CompatibleFetchResponseMessage]
+
+
+class CompatibleFetchResponseSchema(FetchResponseSchema):
+    """
+    A fetch response accepting every field name used by known server versions.
+    """
+    data: _CompatibleFetchResponseData
+
 
 class _PostExchangeKeyResponseData(BaseModel):
     timestamp: Timestamp
@@ -0,0 +1,376 @@
+"""
+A minimal in-memory stand-in for the Cryptcord API, for offline testing.
+
+Run it from the repository root with ```python -m server.standin```, then
+point the client at it by setting the server url in settings.yaml to use the
+http scheme, second-level domain 127.0.0, top-level domain 1 and the chosen
+port. Two client instances using separate local databases can then exchange
+keys and messages through it without any network access.
+
+Besides the standard endpoints, the stand-in supports both push delivery
+modes: long-polling through the long-poll path, and server-sent events
+through the events path. If msgpack is installed, it also accepts and sends
+MessagePack bodies to clients that ask for them.
+"""
+
+import json
+import secrets
+
+from argparse import ArgumentParser
+from base64 import urlsafe_b64decode
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Condition, Lock, Thread
+from typing import Any
+
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+from pydantic import BaseModel
+
+from server.encoding import (
+    accepts_msgpack,
+    decode_model,
+    encode_data,
+    JSON_CONTENT_TYPE,
+    msgpack_available,
+    MSGPACK_CONTENT_TYPE,
+    parse_media_type,
+)
+from server.schemas.requests import (
+    FetchRequestSchema,
+    LongPollRequestSchema,
+    PostExchangeKeyRequestSchema,
+    PostMessageRequestSchema,
+)
+from settings import settings
+
+# Fields held as Base64 text, which MessagePack bodies carry as raw bytes.
+_BINARY_FIELDS = frozenset({
+    'sender_key',
+    'signature',
+    'exchange_key',
+    'initial_key',
+    'encrypted_text',
+})
+
+@dataclass
+class _StoredElement:
+    sender_key: str
+    recipient_key: str
+    timestamp: datetime
+    data: dict[str, Any]
+
+
+@dataclass
+class StandinStore:
+    """Thread-safe storage for all elements posted to the stand-in server."""
+    exchange_keys: list[_StoredElement] = field(default_factory=list)
+    messages: list[_StoredElement] = field(default_factory=list)
+    lock: Lock = field(default_factory=Lock)
+    changed: Condition = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.changed = Condition(self.lock)
+
+    def add_exchange_key(
+            self,
+            request: PostExchangeKeyRequestSchema,
+        ) -> datetime:
+        timestamp = datetime.now(timezone.utc)
+        element = _StoredElement(
+            sender_key=request.public_key,
+            recipient_key=request.recipient_public_key,
+            timestamp=timestamp,
+            data={
+                'timestamp': timestamp.isoformat(),
+                'sender_key': request.public_key,
+                'signature': request.signature,
+                'exchange_key': request.transmitted_exchange_key,
+                'initial_key': request.initial_exchange_key,
+            },
+        )
+        with self.changed:
+            self.exchange_keys.append(element)
+            self.changed.notify_all()
+        return timestamp
+
+    def add_message(
+            self,
+            request: PostMessageRequestSchema,
+        ) -> tuple[datetime, str]:
+        timestamp = datetime.now(timezone.utc)
+        nonce = secrets.token_hex(16)
+        element = _StoredElement(
+            sender_key=request.public_key,
+            recipient_key=request.recipient_public_key,
+            timestamp=timestamp,
+            data={
+                'timestamp': timestamp.isoformat(),
+                'sender_key': request.public_key,
+                'signature': request.signature,
+                'nonce': nonce,
+                'encrypted_text': request.encrypted_text,
+            },
+        )
+        with self.changed:
+            self.messages.append(element)
+            self.changed.notify_all()
+        return timestamp, nonce
+
+    def _select(
+            self,
+            request: FetchRequestSchema,
+            strict: bool = False,
+        ) -> dict[str, Any]:
+        since = request.since or dict()
+        sender_keys = set(request.sender_keys)
+        def _is_requested(element: _StoredElement) -> bool:
+            if element.recipient_key != request.public_key:
+                return False
+            elif element.sender_key not in sender_keys:
+                return False
+            cursor = since.get(element.sender_key)
+            if cursor is None:
+                return True
+            elif strict:
+                return element.timestamp > cursor
+            return element.timestamp >= cursor
+        return {
+            'exchange_keys': [
+                x.data for x in self.exchange_keys if _is_requested(x)
+            ],
+            'messages': [
+                x.data for x in self.messages if _is_requested(x)
+            ],
+        }
+
+    def fetch(self, request: FetchRequestSchema) -> dict[str, Any]:
+        """
+        Return all elements addressed to the requester by the given senders.
+
+        Cursors are treated as inclusive, so the latest element already held
+        by the client is returned again. The client is expected to discard it.
+        """
+        with self.lock:
+            return self._select(request)
+
+    def wait_for_new(
+            self,
+            request: FetchRequestSchema,
+            timeout: float,
+            strict: bool = False,
+        ) -> dict[str, Any] | None:
+        """
+        Wait for an element newer than the cursors, then fetch as normal.
+
+        Returns None if nothing new arrived before the timeout. If strict is
+        set, elements at the cursors themselves are not returned again.
+        """
+        def _has_new() -> bool:
+            data = self._select(request, strict=True)
+            return bool(data['exchange_keys'] or data['messages'])
+        with self.changed:
+            if not self.changed.wait_for(_has_new, timeout):
+                return None
+            return self._select(request, strict)
+
+
+def _to_binary(data: Any) -> Any:
+    """Converts response data to the form carried by MessagePack bodies."""
+    if isinstance(data, list):
+        return [_to_binary(x) for x in data]
+    elif not isinstance(data, dict):
+        return data
+    result: dict[str, Any] = dict()
+    for key, value in data.items():
+        if key in _BINARY_FIELDS and isinstance(value, str):
+            result[key] = urlsafe_b64decode(value)
+        elif key == 'timestamp':
+            result[key] = datetime.fromisoformat(value)
+        else:
+            result[key] = _to_binary(value)
+    return result
+
+
+def _verify(public_key: str, signature: str, data: bytes) -> bool:
+    try:
+        key = Ed25519PublicKey.from_public_bytes(urlsafe_b64decode(public_key))
+        key.verify(urlsafe_b64decode(signature), data)
+        return True
+    except Exception:
+        return False
+
+
+class _StandinRequestHandler(BaseHTTPRequestHandler):
+    server: 'StandinServer'
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, message: str, data: Any = None):
+        if accepts_msgpack(self.headers.get('Accept')):
+            content_type = MSGPACK_CONTENT_TYPE
+            data = _to_binary(data)
+        else:
+            content_type = JSON_CONTENT_TYPE
+        body = encode_data(
+            data={
+                'status': 'success' if status < 400 else 'error',
+                'message': message,
+                'data': data,
+            },
+            content_type=content_type,
+        )
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_request[T: BaseModel](self, model: type[T]) -> T | None:
+        length = int(self.headers.get('Content-Length', 0))
+        content = self.rfile.read(length)
+        content_type = parse_media_type(self.headers.get('Content-Type'))
+        if content_type == MSGPACK_CONTENT_TYPE and not msgpack_available():
+            self._send(415, 'MessagePack is not supported.')
+            return None
+        try:
+            return decode_model(model, content, content_type)
+        except ValueError as e:
+            self._send(422, str(e))
+            return None
+
+    def _stream_events(self, request: FetchRequestSchema) -> None:
+        # Elements are sent as they arrive, with comments as keep-alives.
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        since = dict(request.since or dict())
+        data: dict[str, Any] | None = self.server.store.fetch(request)
+        try:
+            while True:
+                if data is None:
+                    self.wfile.write(b': keep-alive\n\n')
+                else:
+                    body = json.dumps({
+                        'status': 'success',
+                        'message': 'Data fetched.',
+                        'data': data,
+                    })
+                    self.wfile.write(f'data: {body}\n\n'.encode())
+                    for element in data['exchange_keys'] + data['messages']:
+                        timestamp = datetime.fromisoformat(
+                            element['timestamp'],
+                        )
+                        cursor = since.get(element['sender_key'])
+                        if cursor is None or timestamp > cursor:
+                            since[element['sender_key']] = timestamp
+                self.wfile.flush()
+                data = self.server.store.wait_for_new(
+                    request=request.model_copy(update={'since': since}),
+                    timeout=self.server.keep_alive_interval,
+                    strict=True,
+                )
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def do_GET(self):
+        if self.path == settings.server.url.ping_path:
+            self._send(200, 'pong')
+        else:
+            self._send(404, 'Not found.')
+
+    def do_POST(self):
+        url = settings.server.url
+        store = self.server.store
+        if self.path == url.fetch_data_path:
+            fetch_request = self._read_request(FetchRequestSchema)
+            if fetch_request is not None:
+                data = store.fetch(fetch_request)
+                self._send(200, 'Data fetched.', data)
+        elif self.path == url.long_poll_path:
+            poll_request = self._read_request(LongPollRequestSchema)
+            if poll_request is not None:
+                data = store.wait_for_new(
+                    request=poll_request,
+                    timeout=min(poll_request.wait, self.server.max_wait),
+                )
+                if data is None:
+                    data = {'exchange_keys': [], 'messages': []}
+                self._send(200, 'Data fetched.', data)
+        elif self.path == url.events_path:
+            stream_request = self._read_request(FetchRequestSchema)
+            if stream_request is not None:
+                self._stream_events(stream_request)
+        elif self.path == url.post_exchange_key_path:
+            key_request = self._read_request(PostExchangeKeyRequestSchema)
+            if key_request is None:
+                return
+            exchange_key = urlsafe_b64decode(
+                key_request.transmitted_exchange_key,
+            )
+            if not _verify(
+                key_request.public_key,
+                key_request.signature,
+                exchange_key,
+            ):
+                self._send(400, 'Invalid signature.')
+                return
+            timestamp = store.add_exchange_key(key_request)
+            data = {'timestamp': timestamp.isoformat()}
+            self._send(201, 'Exchange key posted.', data)
+        elif self.path == url.post_message_path:
+            message_request = self._read_request(PostMessageRequestSchema)
+            if message_request is None:
+                return
+            if not _verify(
+                message_request.public_key,
+                message_request.signature,
+                message_request.encrypted_text.encode(),
+            ):
+                self._send(400, 'Invalid signature.')
+                return
+            timestamp, nonce = store.add_message(message_request)
+            data = {'timestamp': timestamp.isoformat(), 'nonce': nonce}
+            self._send(201, 'Message posted.', data)
+        else:
+            self._send(404, 'Not found.')
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+            self,
+            host: str = '127.0.0.1',
+            port: int = 8000,
+            verbose: bool = False,
+            max_wait: float = 60.0,
+            keep_alive_interval: float = 15.0,
+        ) -> None:
+        super().__init__((host, port), _StandinRequestHandler)
+        self.store = StandinStore()
+        self.verbose = verbose
+        self.max_wait = max_wait
+        self.keep_alive_interval = keep_alive_interval
+
+    def start(self) -> Thread:
+        """Serve requests on a background thread, for use within tests."""
+        thread = Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Run a stand-in Cryptcord server.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+    server = StandinServer(args.host, args.port, verbose=True)
+    print(f'Serving on http://{args.host}:{args.port}...')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
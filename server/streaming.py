@@ -0,0 +1,188 @@
+"""
+Incremental scanning of fetch response bodies as they are downloaded.
+
+A fetch response holds every element addressed to the user, so a large
+backlog makes for a large body. Rather than holding the whole body and the
+objects decoded from it at once, the scanner takes the body in pieces and
+emits the elements of its exchange key and message lists one at a time as
+soon as each is complete, keeping only the text of the element in progress.
+"""
+
+import json
+
+from collections.abc import Iterator
+from enum import auto, Enum
+from typing import Any
+
+_ELEMENT_LISTS = ('exchange_keys', 'messages')
+
+_WHITESPACE = ' \t\n\r'
+
+_decoder = json.JSONDecoder()
+
+class _State(Enum):
+    START = auto()
+    RESPONSE = auto()
+    DATA = auto()
+    ELEMENTS = auto()
+    END = auto()
+
+
+class FetchResponseScanner:
+    """
+    Scans a fetch response body given in pieces of any size.
+
+    Each call to feed yields the (list name, element) pairs completed by the
+    new text, in the order they appear in the body. The other fields of the
+    response are collected in the fields attribute, and those of its data
+    object are skipped. Call close once the body is complete, to check that
+    nothing is missing.
+    """
+    def __init__(self) -> None:
+        self.fields: dict[str, Any] = dict()
+        self._buffer = ''
+        self._position = 0
+        self._state = _State.START
+        # The key of the object member whose value is expected next.
+        self._key: str | None = None
+        self._list_name: str | None = None
+        # Whether the next member or element is the first of its container.
+        self._first = True
+
+    def _skip_whitespace(self) -> bool:
+        """Moves past whitespace, returning whether any text remains."""
+        while self._position < len(self._buffer):
+            if self._buffer[self._position] not in _WHITESPACE:
+                return True
+            self._position += 1
+        return False
+
+    def _take(self, characters: str) -> str | None:
+        """Consumes the next character if it is one of those given."""
+        if not self._skip_whitespace():
+            return None
+        character = self._buffer[self._position]
+        if character not in characters:
+            raise ValueError(
+                f'Unexpected {character!r} in fetch response at offset '
+                f'{self._position}.'
+            )
+        self._position += 1
+        return character
+
+    def _decode_value(self) -> tuple[Any] | None:
+        """
+        Decodes the next complete value, wrapped in a tuple to distinguish a
+        decoded null from an incomplete value.
+        """
+        if not self._skip_whitespace():
+            return None
+        try:
+            value, end = _decoder.raw_decode(self._buffer, self._position)
+        except json.JSONDecodeError:
+            return None
+        # A number at the very end may continue in the next piece.
+        if end == len(self._buffer):
+            return None
+        self._position = end
+        return (value,)
+
+    def _read_key(self) -> bool | None:
+        """
+        Reads the key of the next member of an object, returning False at
+        the end of the object or None if more text is needed.
+        """
+        if self._key is not None:
+            return True
+        start = self._position
+        separator = self._take('"}' if self._first else ',}')
+        if separator is None:
+            return None
+        elif separator == '}':
+            return False
+        elif separator == '"':
+            self._position -= 1
+        key = self._decode_value()
+        if key is None or self._take(':') is None:
+            self._position = start
+            return None
+        self._key = key[0]
+        return True
+
+    def _scan(self) -> Iterator[tuple[str, Any]]:
+        while True:
+            start = self._position
+            match self._state:
+                case _State.START:
+                    if self._take('{') is None:
+                        return
+                    self._state = _State.RESPONSE
+                    self._first = True
+                case _State.RESPONSE | _State.DATA:
+                    member = self._read_key()
+                    if member is None:
+                        return
+                    elif not member:
+                        if self._state == _State.RESPONSE:
+                            self._state = _State.END
+                        else:
+                            self._state = _State.RESPONSE
+                        self._first = False
+                        continue
+                    if self._state == _State.RESPONSE and self._key == 'data':
+                        if self._take('{') is None:
+                            return
+                        self._state = _State.DATA
+                        self._first = True
+                        self._key = None
+                        continue
+                    elif (self._state == _State.DATA
+                            and self._key in _ELEMENT_LISTS):
+                        if self._take('[') is None:
+                            return
+                        self._state = _State.ELEMENTS
+                        self._list_name = self._key
+                        self._first = True
+                        self._key = None
+                        continue
+                    value = self._decode_value()
+                    if value is None:
+                        return
+                    if self._state == _State.RESPONSE:
+                        self.fields[self._key] = value[0]
+                    self._key = None
+                    self._first = False
+                case _State.ELEMENTS:
+                    assert self._list_name is not None
+                    separator = self._take('{]' if self._first else ',]')
+                    if separator is None:
+                        return
+                    elif separator == ']':
+                        self._state = _State.DATA
+                        self._first = False
+                        continue
+                    elif separator == '{':
+                        self._position -= 1
+                    element = self._decode_value()
+                    if element is None:
+                        self._position = start
+                        return
+                    self._first = False
+                    yield self._list_name, element[0]
+                case _State.END:
+                    if self._skip_whitespace():
+                        raise ValueError('Unexpected text after response.')
+                    return
+
+    def feed(self, text: str) -> Iterator[tuple[str, Any]]:
+        self._buffer = self._buffer[self._position:] + text
+        self._position = 0
+        yield from self._scan()
+
+    def close(self) -> None:
+        """Checks that the body ended with a complete response."""
+        # Trailing whitespace lets a final number be decoded.
+        for _ in self.feed(' '):
+            pass
+        if self._state != _State.END:
+            raise ValueError('Fetch response ended unexpectedly.')
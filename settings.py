@@ -2,12 +2,112 @@ import curses
 import os
 
 from functools import cached_property
-from typing import Annotated
+from typing import Annotated, Literal
 
 from pydantic import BaseModel, BeforeValidator, Field
 from yaml import safe_dump, safe_load
 
+class _SqlitePragmaSettingsModel(BaseModel):
+    enabled: bool = Field(
+        default=True,
+        title='Apply SQLite Pragmas',
+        description=(
+            'Whether the pragmas below should be applied to each new '
+            'connection. Ignored for databases other than SQLite.'
+        ),
+    )
+    journal_mode: Literal['DELETE', 'TRUNCATE', 'PERSIST', 'WAL'] = Field(
+        default='WAL',
+        title='Journal Mode',
+        description=(
+            'WAL allows the interface to read while the background thread '
+            'writes, and avoids rewriting the journal on every commit.'
+        ),
+    )
+    synchronous: Literal['OFF', 'NORMAL', 'FULL', 'EXTRA'] = Field(
+        default='NORMAL',
+        title='Synchronous',
+        description=(
+            'With WAL, NORMAL only syncs at checkpoints. A power loss may '
+            'roll back the latest commits, but cannot corrupt the database.'
+        ),
+    )
+    mmap_size: int = Field(
+        default=268435456,
+        ge=0,
+        title='Memory Map Size',
+        description='The maximum number of bytes of the file to memory-map.',
+    )
+    cache_size: int = Field(
+        default=-65536,
+        title='Cache Size',
+        description=(
+            'The page cache size of each connection. Negative values are in '
+            'KiB and positive values are in pages.'
+        ),
+    )
+    temp_store: Literal['DEFAULT', 'FILE', 'MEMORY'] = 'MEMORY'
+    busy_timeout: int = Field(
+        default=5000,
+        ge=0,
+        title='Busy Timeout',
+        description=(
+            'The number of milliseconds a connection waits for a lock held by '
+            'another connection before failing.'
+        ),
+    )
+
+class _KeyRetentionSettingsModel(BaseModel):
+    max_fernet_keys: int | None = Field(
+        default=None,
+        ge=1,
+        title='Maximum Fernet Keys',
+        description=(
+            'The number of fernet keys kept for each contact, newest first. '
+            'Older keys are only kept if within the maximum age below. Null '
+            'keeps every key within the maximum age, and nothing is removed '
+            'if both are null.'
+        ),
+    )
+    max_fernet_key_age: float | None = Field(
+        default=None,
+        gt=0.0,
+        title='Maximum Fernet Key Age',
+        description=(
+            'The number of days after which fernet keys beyond the maximum '
+            'count are removed. Null removes them regardless of age. The '
+            'newest key of each contact is always kept. Messages encrypted '
+            'with a removed key can no longer be decrypted if fetched later.'
+        ),
+    )
+    prune_matched_keys: bool = Field(
+        default=False,
+        title='Prune Matched Exchange Keys',
+        description=(
+            'Whether received exchange keys that have been responded to '
+            'should be removed. Keys fetched again are recognised by being '
+            'at or before the fetch cursor of their sender, so removed keys '
+            'are never responded to a second time.'
+        ),
+    )
+    interval: float = Field(
+        default=3600.0,
+        gt=0.0,
+        title='Maintenance Interval',
+        description='The number of seconds between each round of pruning.',
+    )
+
 class _DatabaseSettingsModel(BaseModel):
+    storage: Literal['sqlalchemy', 'memory'] = Field(
+        default='sqlalchemy',
+        title='Storage Backend',
+        description=(
+            'Where contacts, keys and messages are stored. The sqlalchemy '
+            'backend uses the database at the local database URL, while the '
+            'memory backend keeps everything in memory and discards it on '
+            'exit, leaving nothing on disk.'
+        ),
+    )
     url: str = Field(
         default='sqlite:///database.db',
         title='Local Database URL',
@@ -18,6 +118,42 @@ class _DatabaseSettingsModel(BaseModel):
             'SQLite file or a locally hosted PostgreSQL database.'
         ),
     )
+    pool_size: int = Field(
+        default=5,
+        ge=1,
+        title='Pool Size',
+        description='The number of connections kept open by the engine.',
+    )
+    max_overflow: int = Field(
+        default=10,
+        ge=0,
+        title='Maximum Overflow',
+        description=(
+            'The number of connections that may be opened beyond the pool '
+            'size when all pooled connections are in use.'
+        ),
+    )
+    max_write_batch_size: int = Field(
+        default=64,
+        ge=1,
+        title='Maximum Write Batch Size',
+        description=(
+            'The maximum number of queued writes committed together in a '
+            'single transaction by the database writer thread.'
+        ),
+    )
+    write_batch_delay: float = Field(
+        default=0.0,
+        ge=0.0,
+        title='Write Batch Delay',
+        description=(
+            'The number of seconds the writer waits for further writes '
+            'before committing a batch. Writes queued while the previous '
+            'batch was committing are always grouped, even with no delay.'
+        ),
+    )
+    key_retention: _KeyRetentionSettingsModel = _KeyRetentionSettingsModel()
+    sqlite_pragmas: _SqlitePragmaSettingsModel = _SqlitePragmaSettingsModel()
 
 class _DisplaySettingsModel(BaseModel):
     max_page_height: int = Field(
@@ -29,6 +165,24 @@ class _DisplaySettingsModel(BaseModel):
             'each page. Applies only to components that use pagination.'
         ),
     )
+    message_page_size: int = Field(
+        ge=1,
+        default=100,
+        title='Message Page Size',
+        description=(
+            'The number of messages loaded at once when scrolling through '
+            'the history of a contact.'
+        ),
+    )
+    max_loaded_pages: int = Field(
+        ge=2,
+        default=5,
+        title='Maximum Loaded Pages',
+        description=(
+            'The number of pages of message history kept in memory. Pages '
+            'furthest from the view are evicted beyond this.'
+        ),
+    )
     await_inputs: bool = Field(
         default=True,
         title='Await Inputs',
@@ -117,6 +271,8 @@ class _UrlSettingsModel(BaseModel):
     fetch_data_path: str = '/data/fetch'
     post_exchange_key_path: str = '/data/post/exchange-key'
     post_message_path: str = '/data/post/message'
+    long_poll_path: str = '/data/long-poll'
+    events_path: str = '/data/events'
 
     @property
     def base_url(self) -> str:
@@ -144,12 +300,154 @@ class _UrlSettingsModel(BaseModel):
     def post_message_url(self):
         return self.base_url + self.post_message_path
 
+    @property
+    def long_poll_url(self):
+        return self.base_url + self.long_poll_path
+
+    @property
+    def events_url(self):
+        return self.base_url + self.events_path
+
 class _ServerSettingsModel(BaseModel):
     url: _UrlSettingsModel = _UrlSettingsModel()
     ping_timeout: float = Field(default=1.0, gt=0.0)
     request_timeout: float = Field(default=5.0, gt=0.0)
-    fetch_interval: float = Field(default=1.0, gt=0.0)
+    fetch_interval: float = Field(
+        default=1.0,
+        gt=0.0,
+        title='Fetch Interval',
+        description=(
+            'The shortest time in seconds between fetch requests, used while '
+            'new data is arriving or after sending a message.'
+        ),
+    )
+    max_fetch_interval: float = Field(
+        default=30.0,
+        gt=0.0,
+        title='Maximum Fetch Interval',
+        description=(
+            'The longest time in seconds between fetch requests. The interval '
+            'grows towards this while fetches return no new data.'
+        ),
+    )
+    fetch_backoff_factor: float = Field(
+        default=1.5,
+        ge=1.0,
+        title='Fetch Backoff Factor',
+        description=(
+            'The factor the fetch interval is multiplied by after each fetch '
+            'that returns no new data. A value of 1 disables backoff.'
+        ),
+    )
+    ping_interval: float = Field(default=1.0, gt=0.0)
+    max_concurrent_requests: int = Field(
+        default=4,
+        ge=1,
+        title='Maximum Concurrent Requests',
+        description=(
+            'The maximum number of requests that may be awaiting a response '
+            'from the server at any one time.'
+        ),
+    )
     key_response_interval: float = Field(default=5.0, gt=0.0)
+    new_contact_interval: float = Field(default=5.0, gt=0.0)
+    outbox_retry_interval: float = Field(
+        default=5.0,
+        gt=0.0,
+        title='Outbox Retry Interval',
+        description=(
+            'The time in seconds between attempts to send messages that '
+            'remain in the outbox after a failed post.'
+        ),
+    )
+    response_schema: Literal['auto', 'canonical', 'compatible'] = Field(
+        default='auto',
+        title='Response Schema',
+        description=(
+            'The field names expected in fetch responses. The canonical '
+            'schema only accepts the names used by current servers and is '
+            'fastest to parse, while the compatible schema also accepts the '
+            'names used by older servers. With auto, the canonical schema is '
+            'tried first, and the compatible schema is used from then on if '
+            'it fails where the compatible schema succeeds.'
+        ),
+    )
+    wire_encoding: Literal['json', 'msgpack'] = Field(
+        default='json',
+        title='Wire Encoding',
+        description=(
+            'The encoding of request and response bodies. The msgpack '
+            'encoding sends keys, signatures and encrypted text as raw bytes '
+            'and is more compact, but requires the optional msgpack package. '
+            'JSON is used instead if it is not installed or the server does '
+            'not support it.'
+        ),
+    )
+    delivery_mode: Literal['poll', 'long_poll', 'sse'] = Field(
+        default='poll',
+        title='Delivery Mode',
+        description=(
+            'How new data is received from the server. With long_poll or sse, '
+            'a single open connection delivers data as soon as it is posted, '
+            'and regular fetch requests are only used if the server does not '
+            'support the chosen mode.'
+        ),
+    )
+    push_timeout: float = Field(
+        default=30.0,
+        gt=0.0,
+        title='Push Timeout',
+        description=(
+            'The time in seconds a long-poll request or event stream is held '
+            'open before being renewed.'
+        ),
+    )
+    push_retry_interval: float = Field(
+        default=300.0,
+        gt=0.0,
+        title='Push Retry Interval',
+        description=(
+            'The time in seconds to wait before trying the chosen delivery '
+            'mode again after the server did not support it.'
+        ),
+    )
+    incremental_fetch: bool = Field(
+        default=True,
+        title='Incremental Fetch',
+        description=(
+            'Whether fetch requests should include the timestamp of the '
+            'latest element stored for each contact, allowing the server to '
+            'omit elements that have already been downloaded.'
+        ),
+    )
+    stream_fetch: bool = Field(
+        default=False,
+        title='Stream Fetch',
+        description=(
+            'Whether fetch responses should be read as they are downloaded, '
+            'storing their elements in chunks rather than waiting for the '
+            'whole response, so that memory use does not grow with its size.'
+        ),
+    )
+    fetch_chunk_size: int = Field(
+        default=500,
+        ge=1,
+        title='Fetch Chunk Size',
+        description=(
+            'The maximum number of elements of a streamed fetch response '
+            'held in memory and stored together.'
+        ),
+    )
+    crypto_workers: int = Field(
+        default=1,
+        ge=1,
+        title='Crypto Workers',
+        description=(
+            'The number of worker processes used to verify and decrypt large '
+            'batches of fetched data. A value of 1 keeps all work on the '
+            'background thread.'
+        ),
+    )
 
 class _SettingsModel(BaseModel):
     display: _DisplaySettingsModel = _DisplaySettingsModel()
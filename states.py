@@ -9,6 +9,7 @@ class State(Enum):
     PROMPT_SUBMITTED = auto()
     PROMPT_CANCELLED = auto()
     ADD_CONTACT = auto()
+    SEARCH_MESSAGES = auto()
     SELECT_CONTACT = auto()
     SEND_EXCHANGE_KEY = auto()
     SEND_MESSAGE = auto()
@@ -0,0 +1,52 @@
+"""
+Fixtures shared by the tests that exchange data through the stand-in server.
+"""
+
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+from database.cache import contact_cache
+from database.engine import create_database_engine, upgrade_schema
+from database.memory import MemoryStorage
+from database.storage import SqlStorage, Storage
+from server import operations
+from server.standin import StandinServer
+from settings import settings
+
+@pytest.fixture
+def standin(monkeypatch: pytest.MonkeyPatch) -> Iterator[StandinServer]:
+    """A stand-in server on a free port, which the client settings use."""
+    server = StandinServer(port=0, keep_alive_interval=0.1)
+    url = settings.server.url
+    monkeypatch.setattr(url, 'scheme', 'http')
+    monkeypatch.setattr(url, 'subdomain', None)
+    monkeypatch.setattr(url, 'second_level_domain', '127.0.0')
+    monkeypatch.setattr(url, 'top_level_domain', '1')
+    monkeypatch.setattr(url, 'port', server.server_address[1])
+    monkeypatch.setattr(operations, '_compatible_servers', set())
+    monkeypatch.setattr(operations, '_json_servers', set())
+    server.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(params=['memory', 'sql'])
+def storage(
+        request: pytest.FixtureRequest,
+        tmp_path: Path,
+    ) -> Iterator[Storage]:
+    """Started storage of each kind, with the contact cache emptied."""
+    if request.param == 'memory':
+        storage: Storage = MemoryStorage()
+    else:
+        engine = create_database_engine(f'sqlite:///{tmp_path}/client.db')
+        upgrade_schema(engine)
+        storage = SqlStorage(engine)
+    contact_cache.invalidate()
+    storage.start()
+    yield storage
+    storage.stop()
+    contact_cache.invalidate()
@@ -0,0 +1,167 @@
+"""
+Checks that fetches through the stand-in server give the same data in each
+wire encoding, and that the client falls back to JSON when the server
+rejects MessagePack.
+"""
+
+import asyncio
+import json
+
+from base64 import urlsafe_b64encode
+
+import httpx
+import pytest
+
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+from server import operations
+from server.encoding import (
+    accepts_msgpack,
+    decode_model,
+    encode_data,
+    JSON_CONTENT_TYPE,
+    msgpack_available,
+    MSGPACK_CONTENT_TYPE,
+)
+from server.operations import fetch_data, post_message
+from server.schemas.requests import FetchRequestSchema
+from server.schemas.responses import FetchResponseSchema
+from server.standin import _to_binary, StandinServer
+from settings import settings
+
+requires_msgpack = pytest.mark.skipif(
+    not msgpack_available(),
+    reason='msgpack is not installed.',
+)
+
+# The request content type, status and response content type of a request.
+type _Exchange = tuple[str, int, str]
+
+def _exchange(
+        wire_encoding: str,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> tuple[list[FetchResponseSchema], list[_Exchange]]:
+    """Posts a message, then fetches it twice in the given encoding."""
+    monkeypatch.setattr(settings.server, 'wire_encoding', wire_encoding)
+    sender = Ed25519PrivateKey.generate()
+    recipient = Ed25519PrivateKey.generate()
+    sender_key = sender.public_key().public_bytes_raw()
+    exchanges: list[_Exchange] = list()
+    async def _record(response: httpx.Response) -> None:
+        exchanges.append((
+            response.request.headers['Content-Type'],
+            response.status_code,
+            response.headers['Content-Type'],
+        ))
+    async def _run() -> list[FetchResponseSchema]:
+        hooks = {'response': [_record]}
+        async with httpx.AsyncClient(event_hooks=hooks) as client:
+            await post_message(
+                client=client,
+                signature_key=sender,
+                recipient_public_key=recipient.public_key(),
+                encrypted_text=Fernet(Fernet.generate_key()).encrypt(b'Hi'),
+            )
+            return [
+                await fetch_data(
+                    client=client,
+                    signature_key=recipient,
+                    contact_keys=[urlsafe_b64encode(sender_key).decode()],
+                )
+                for _ in range(2)
+            ]
+    return asyncio.run(_run()), exchanges
+
+
+def _check_data(responses: list[FetchResponseSchema]) -> None:
+    for response in responses:
+        assert len(response.data.messages) == 1
+        assert response.data.messages[0].is_valid
+    assert responses[0] == responses[1]
+
+
+def test_accepts_msgpack():
+    assert not accepts_msgpack(None)
+    assert not accepts_msgpack(JSON_CONTENT_TYPE)
+    assert not accepts_msgpack(f'{MSGPACK_CONTENT_TYPE};q=0')
+    assert accepts_msgpack(
+        f'{MSGPACK_CONTENT_TYPE}, {JSON_CONTENT_TYPE};q=0.5',
+    ) == msgpack_available()
+
+
+def test_json_fetch(standin: StandinServer, monkeypatch: pytest.MonkeyPatch):
+    responses, exchanges = _exchange('json', monkeypatch)
+    _check_data(responses)
+    assert set(exchanges) == {
+        (JSON_CONTENT_TYPE, 201, JSON_CONTENT_TYPE),
+        (JSON_CONTENT_TYPE, 200, JSON_CONTENT_TYPE),
+    }
+
+
+@requires_msgpack
+def test_msgpack_fetch(
+        standin: StandinServer,
+        monkeypatch: pytest.MonkeyPatch,
+    ):
+    responses, exchanges = _exchange('msgpack', monkeypatch)
+    _check_data(responses)
+    assert set(exchanges) == {
+        (MSGPACK_CONTENT_TYPE, 201, MSGPACK_CONTENT_TYPE),
+        (MSGPACK_CONTENT_TYPE, 200, MSGPACK_CONTENT_TYPE),
+    }
+
+
+@requires_msgpack
+def test_encodings_decode_alike(standin: StandinServer):
+    sender = Ed25519PrivateKey.generate()
+    recipient = Ed25519PrivateKey.generate()
+    sender_key = sender.public_key().public_bytes_raw()
+    request = FetchRequestSchema.model_validate({
+        'public_key': recipient.public_key(),
+        'sender_keys': [urlsafe_b64encode(sender_key).decode()],
+    })
+    async def _run() -> bytes:
+        async with httpx.AsyncClient() as client:
+            await post_message(
+                client=client,
+                signature_key=sender,
+                recipient_public_key=recipient.public_key(),
+                encrypted_text=Fernet(Fernet.generate_key()).encrypt(b'Hi'),
+            )
+            response = await client.post(
+                settings.server.url.fetch_data_url,
+                json=request.model_dump(mode='json'),
+            )
+            return response.content
+    json_body = asyncio.run(_run())
+    msgpack_body = encode_data(
+        data=_to_binary(json.loads(json_body)),
+        content_type=MSGPACK_CONTENT_TYPE,
+    )
+    response = decode_model(FetchResponseSchema, json_body)
+    assert len(response.data.messages) == 1
+    assert response == decode_model(
+        FetchResponseSchema,
+        msgpack_body,
+        MSGPACK_CONTENT_TYPE,
+    )
+
+
+@requires_msgpack
+def test_msgpack_falls_back_to_json(
+        standin: StandinServer,
+        monkeypatch: pytest.MonkeyPatch,
+    ):
+    # The server rejects MessagePack bodies as if it lacked msgpack.
+    monkeypatch.setattr(
+        'server.standin.msgpack_available',
+        lambda: False,
+    )
+    responses, exchanges = _exchange('msgpack', monkeypatch)
+    _check_data(responses)
+    # Only the first request is rejected, and JSON is used from then on.
+    assert exchanges[0][:2] == (MSGPACK_CONTENT_TYPE, 415)
+    assert [x[0] for x in exchanges[1:]] == [JSON_CONTENT_TYPE] * 3
+    base_url = settings.server.url.base_url
+    assert base_url in operations._json_servers
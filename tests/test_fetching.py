@@ -0,0 +1,213 @@
+"""
+Checks how fetched elements are stored and how far the fetch cursors move,
+with data exchanged through the stand-in server.
+"""
+
+import asyncio
+
+from datetime import datetime, timezone
+
+import httpx
+
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+
+from database.cache import contact_cache
+from database.fetching import FetchReport, FetchStream, store_fetched_data
+from database.records import ContactRecord
+from database.schemas.inputs import ContactInputSchema
+from database.storage import Storage
+from server.operations import fetch_data, post_exchange_key, post_message
+from server.schemas.responses import FetchResponseData, FetchResponseSchema
+from server.standin import StandinServer
+
+def _add_contact(storage: Storage, key: Ed25519PrivateKey) -> ContactRecord:
+    contact = ContactInputSchema.model_validate({
+        'name': 'Sender',
+        'verification_key': key.public_key(),
+    })
+    return storage.add_contact(contact).result()
+
+
+def _add_fernet_key(storage: Storage, contact_id: int, key: bytes) -> None:
+    storage.store_exchange_keys(
+        received_keys=[],
+        fernet_keys=[{
+            'contact_id': contact_id,
+            'encoded_bytes': key.decode(),
+            'timestamp': datetime.now(timezone.utc),
+        }],
+        consumed_key_ids=set(),
+    ).result()
+    contact_cache.invalidate()
+
+
+def _post(
+        sender: Ed25519PrivateKey,
+        recipient: Ed25519PrivateKey,
+        fernet_key: bytes,
+        text: str,
+    ) -> datetime:
+    async def _run() -> datetime:
+        async with httpx.AsyncClient() as client:
+            response = await post_message(
+                client=client,
+                signature_key=sender,
+                recipient_public_key=recipient.public_key(),
+                encrypted_text=Fernet(fernet_key).encrypt(text.encode()),
+            )
+        return response.data.timestamp
+    return asyncio.run(_run())
+
+
+def _post_response_key(
+        sender: Ed25519PrivateKey,
+        recipient: Ed25519PrivateKey,
+        initial_key: X25519PrivateKey,
+    ) -> datetime:
+    async def _run() -> datetime:
+        async with httpx.AsyncClient() as client:
+            response = await post_exchange_key(
+                client=client,
+                signature_key=sender,
+                recipient_public_key=recipient.public_key(),
+                exchange_key=X25519PrivateKey.generate().public_key(),
+                initial_exchange_key=initial_key.public_key(),
+            )
+        return response.data.timestamp
+    return asyncio.run(_run())
+
+
+def _request_data(
+        storage: Storage,
+        recipient: Ed25519PrivateKey,
+    ) -> FetchResponseSchema:
+    async def _run() -> FetchResponseSchema:
+        async with httpx.AsyncClient() as client:
+            return await fetch_data(
+                client=client,
+                signature_key=recipient,
+                contact_keys=storage.get_contact_keys(),
+                cursors=storage.get_fetch_cursors(),
+            )
+    return asyncio.run(_run())
+
+
+def _fetch(storage: Storage, recipient: Ed25519PrivateKey) -> FetchReport:
+    return store_fetched_data(storage, _request_data(storage, recipient))
+
+
+def _get_texts(storage: Storage, contact: ContactRecord) -> list[str]:
+    return [x.text for x in storage.get_messages_after(contact.id, 0)]
+
+
+def test_cursor_advances(standin: StandinServer, storage: Storage):
+    sender = Ed25519PrivateKey.generate()
+    recipient = Ed25519PrivateKey.generate()
+    contact = _add_contact(storage, sender)
+    fernet_key = Fernet.generate_key()
+    _add_fernet_key(storage, contact.id, fernet_key)
+    _post(sender, recipient, fernet_key, 'first')
+    timestamp = _post(sender, recipient, fernet_key, 'second')
+    assert _fetch(storage, recipient).verified == 2
+    cursor = storage.get_fetch_cursors()[contact.encoded_verification_key]
+    assert cursor == timestamp
+    # Only the element at the inclusive cursor is returned again.
+    report = _fetch(storage, recipient)
+    assert (report.verified, report.skipped) == (0, 1)
+    assert _get_texts(storage, contact) == ['first', 'second']
+
+
+def test_cursor_held_behind_undecryptable_message(
+        standin: StandinServer,
+        storage: Storage,
+    ):
+    sender = Ed25519PrivateKey.generate()
+    recipient = Ed25519PrivateKey.generate()
+    contact = _add_contact(storage, sender)
+    known_key = Fernet.generate_key()
+    missing_key = Fernet.generate_key()
+    _add_fernet_key(storage, contact.id, known_key)
+    timestamp = _post(sender, recipient, missing_key, 'first')
+    _post(sender, recipient, known_key, 'second')
+    _fetch(storage, recipient)
+    assert _get_texts(storage, contact) == ['second']
+    cursor = storage.get_fetch_cursors()[contact.encoded_verification_key]
+    assert cursor < timestamp
+    # Once its key arrives, the earlier message is fetched again and stored.
+    _add_fernet_key(storage, contact.id, missing_key)
+    _fetch(storage, recipient)
+    assert _get_texts(storage, contact) == ['first', 'second']
+
+
+def test_response_key_fetched_again_until_initial_key_stored(
+        standin: StandinServer,
+        storage: Storage,
+    ):
+    sender = Ed25519PrivateKey.generate()
+    recipient = Ed25519PrivateKey.generate()
+    contact = _add_contact(storage, sender)
+    fernet_key = Fernet.generate_key()
+    _add_fernet_key(storage, contact.id, fernet_key)
+    # The response arrives before the initial key it answers is stored.
+    initial_key = X25519PrivateKey.generate()
+    timestamp = _post_response_key(sender, recipient, initial_key)
+    _post(sender, recipient, fernet_key, 'later')
+    _fetch(storage, recipient)
+    assert _get_texts(storage, contact) == ['later']
+    cursor = storage.get_fetch_cursors()[contact.encoded_verification_key]
+    assert cursor < timestamp
+    storage.store_posted_exchange_key(contact.id, initial_key).result()
+    _fetch(storage, recipient)
+    sender_key = contact.encoded_verification_key
+    fernet_keys = contact_cache.get_fernet_keys(
+        contact_cache.get(storage, sender_key),
+    )
+    assert len(fernet_keys) == 2
+    assert not storage.get_unmatched_keys()
+
+
+def test_events_keep_cursor_behind_earlier_events(
+        standin: StandinServer,
+        storage: Storage,
+    ):
+    sender = Ed25519PrivateKey.generate()
+    recipient = Ed25519PrivateKey.generate()
+    contact = _add_contact(storage, sender)
+    known_key = Fernet.generate_key()
+    _add_fernet_key(storage, contact.id, known_key)
+    timestamp = _post(sender, recipient, Fernet.generate_key(), 'first')
+    _post(sender, recipient, known_key, 'second')
+    # Each message arrives in an event of its own, as server-sent events
+    # after the first only carry new elements.
+    messages = _request_data(storage, recipient).data.messages
+    stream = FetchStream(storage, advance_each_chunk=True)
+    for message in messages:
+        stream.store(FetchResponseData(exchange_keys=[], messages=[message]))
+    assert _get_texts(storage, contact) == ['second']
+    cursor = storage.get_fetch_cursors()[contact.encoded_verification_key]
+    assert cursor < timestamp
+
+
+def test_incremental_fetch_returns_elements_from_cursor(
+        standin: StandinServer,
+        storage: Storage,
+    ):
+    sender = Ed25519PrivateKey.generate()
+    recipient = Ed25519PrivateKey.generate()
+    contact = _add_contact(storage, sender)
+    fernet_key = Fernet.generate_key()
+    _add_fernet_key(storage, contact.id, fernet_key)
+    for text in ('first', 'second'):
+        _post(sender, recipient, fernet_key, text)
+    _fetch(storage, recipient)
+    _post(sender, recipient, fernet_key, 'third')
+    messages = _request_data(storage, recipient).data.messages
+    timestamps = [x.timestamp for x in messages]
+    cursor = storage.get_fetch_cursors()[contact.encoded_verification_key]
+    assert len(messages) == 2
+    assert min(timestamps) == cursor
+    report = _fetch(storage, recipient)
+    assert (report.verified, report.skipped) == (1, 1)
+    assert _get_texts(storage, contact) == ['first', 'second', 'third']
@@ -0,0 +1,117 @@
+"""
+Checks long-poll and server-sent event delivery through the stand-in server.
+"""
+
+import asyncio
+import time
+
+from base64 import urlsafe_b64encode
+from datetime import datetime
+
+import httpx
+
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+from server.operations import long_poll_data, post_message, stream_data
+from server.standin import StandinServer
+
+def _encode_key(key: Ed25519PrivateKey) -> str:
+    return urlsafe_b64encode(key.public_key().public_bytes_raw()).decode()
+
+
+async def _post(
+        client: httpx.AsyncClient,
+        sender: Ed25519PrivateKey,
+        recipient: Ed25519PrivateKey,
+        text: str,
+    ) -> datetime:
+    response = await post_message(
+        client=client,
+        signature_key=sender,
+        recipient_public_key=recipient.public_key(),
+        encrypted_text=Fernet(Fernet.generate_key()).encrypt(text.encode()),
+    )
+    return response.data.timestamp
+
+
+async def _post_later(
+        client: httpx.AsyncClient,
+        sender: Ed25519PrivateKey,
+        recipient: Ed25519PrivateKey,
+        delay: float,
+    ) -> datetime:
+    await asyncio.sleep(delay)
+    return await _post(client, sender, recipient, 'later')
+
+
+def test_long_poll_returns_when_element_posted(standin: StandinServer):
+    sender = Ed25519PrivateKey.generate()
+    recipient = Ed25519PrivateKey.generate()
+    async def _run():
+        async with httpx.AsyncClient() as client:
+            cursor = await _post(client, sender, recipient, 'earlier')
+            start = time.monotonic()
+            response, timestamp = await asyncio.gather(
+                long_poll_data(
+                    client=client,
+                    signature_key=recipient,
+                    contact_keys=[_encode_key(sender)],
+                    cursors={_encode_key(sender): cursor},
+                    wait=5.0,
+                ),
+                _post_later(client, sender, recipient, 0.2),
+            )
+            duration = time.monotonic() - start
+            return response, [cursor, timestamp], duration
+    response, timestamps, duration = asyncio.run(_run())
+    # The element at the inclusive cursor is returned along with the new one.
+    assert [x.timestamp for x in response.data.messages] == timestamps
+    assert duration < 5.0
+
+
+def test_long_poll_times_out_empty(standin: StandinServer):
+    sender = Ed25519PrivateKey.generate()
+    recipient = Ed25519PrivateKey.generate()
+    async def _run():
+        async with httpx.AsyncClient() as client:
+            cursor = await _post(client, sender, recipient, 'earlier')
+            return await long_poll_data(
+                client=client,
+                signature_key=recipient,
+                contact_keys=[_encode_key(sender)],
+                cursors={_encode_key(sender): cursor},
+                wait=0.2,
+            )
+    response = asyncio.run(_run())
+    assert not response.data.exchange_keys
+    assert not response.data.messages
+
+
+def test_events_deliver_backlog_then_new_elements(standin: StandinServer):
+    sender = Ed25519PrivateKey.generate()
+    recipient = Ed25519PrivateKey.generate()
+    async def _run():
+        timestamps: list[datetime] = list()
+        events: list[list[datetime]] = list()
+        async with httpx.AsyncClient() as client:
+            for text in ('first', 'second'):
+                timestamps.append(await _post(client, sender, recipient, text))
+            async with asyncio.timeout(5.0):
+                async for response in stream_data(
+                    client=client,
+                    signature_key=recipient,
+                    contact_keys=[_encode_key(sender)],
+                ):
+                    events.append(
+                        [x.timestamp for x in response.data.messages],
+                    )
+                    if len(events) == 2:
+                        break
+                    timestamps.append(
+                        await _post(client, sender, recipient, 'third'),
+                    )
+        return timestamps, events
+    timestamps, events = asyncio.run(_run())
+    # Events after the first only carry elements posted since.
+    assert events == [timestamps[:2], timestamps[2:]]
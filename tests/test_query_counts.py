@@ -0,0 +1,122 @@
+"""
+Checks that the hot contact queries issue a constant number of statements,
+however many key rows each contact has.
+"""
+
+from base64 import urlsafe_b64encode
+from collections.abc import Iterator
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+from sqlalchemy import Engine, event, insert, select
+
+from database import operations
+from database.cache import ContactCache
+from database.engine import create_database_engine, upgrade_schema
+from database.models import Contact, FernetKey, SentExchangeKey
+from database.storage import SqlStorage
+
+_CONTACTS = 20
+_KEYS_PER_CONTACT = 3
+
+def _encode(raw_bytes: bytes) -> str:
+    return urlsafe_b64encode(raw_bytes).decode()
+
+
+def _select_first(engine: Engine, column) -> str:
+    with engine.connect() as connection:
+        return connection.scalar(select(column).order_by(column).limit(1))
+
+
+@pytest.fixture
+def engine(tmp_path: Path) -> Iterator[Engine]:
+    engine = create_database_engine(f'sqlite:///{tmp_path}/query_counts.db')
+    upgrade_schema(engine)
+    now = datetime.now(timezone.utc)
+    sent_keys = [X25519PrivateKey.generate() for _ in range(_CONTACTS)]
+    with engine.begin() as connection:
+        connection.execute(insert(Contact), [
+            {
+                'name': f'Contact {index}',
+                'verification_key': _encode(
+                    Ed25519PrivateKey.generate().public_key()
+                    .public_bytes_raw(),
+                ),
+            }
+            for index in range(_CONTACTS)
+        ])
+        connection.execute(insert(FernetKey), [
+            {
+                'contact_id': contact_id,
+                'encoded_bytes': _encode(
+                    X25519PrivateKey.generate().private_bytes_raw(),
+                ),
+                'timestamp': now,
+            }
+            for contact_id in range(1, _CONTACTS + 1)
+            for _ in range(_KEYS_PER_CONTACT)
+        ])
+        connection.execute(insert(SentExchangeKey), [
+            {
+                'contact_id': contact_id,
+                'encoded_private_bytes': _encode(key.private_bytes_raw()),
+                'encoded_public_bytes': _encode(
+                    key.public_key().public_bytes_raw(),
+                ),
+            }
+            for contact_id, key in enumerate(sent_keys, start=1)
+        ])
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def statements(engine: Engine) -> Iterator[list[str]]:
+    executed: list[str] = list()
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+    event.listen(engine, 'before_cursor_execute', _record)
+    yield executed
+    event.remove(engine, 'before_cursor_execute', _record)
+
+
+def test_get_contacts(engine: Engine, statements: list[str]):
+    contacts = operations.get_contacts(engine)
+    assert len(contacts) == _CONTACTS
+    assert len(statements) == 1
+
+
+def test_get_contacts_without_keys(engine: Engine, statements: list[str]):
+    assert operations.get_contacts_without_keys(engine) == []
+    assert len(statements) == 1
+
+
+def test_contact_cache_refresh(engine: Engine, statements: list[str]):
+    storage = SqlStorage(engine)
+    cache = ContactCache()
+    verification_key = _select_first(engine, Contact.verification_key)
+    statements.clear()
+    contact = cache.get(storage, verification_key)
+    assert contact is not None
+    assert len(contact.fernet_keys) == _KEYS_PER_CONTACT
+    # The contact, then all of its fernet keys at once.
+    assert len(statements) == 2
+    cache.get(storage, verification_key)
+    assert len(statements) == 2
+
+
+def test_get_sent_key(engine: Engine, statements: list[str]):
+    encoded_public_bytes = _select_first(
+        engine,
+        SentExchangeKey.encoded_public_bytes,
+    )
+    statements.clear()
+    sent_key = operations.get_sent_key(engine, encoded_public_bytes)
+    assert sent_key is not None
+    assert sent_key.contact.name.startswith('Contact')
+    # The sent key is joined with its contact in a single statement.
+    assert len(statements) == 1
@@ -0,0 +1,89 @@
+"""
+Checks that fetch responses using the field names of older servers are
+parsed with the compatible schema in auto mode.
+"""
+
+import asyncio
+import json
+
+from base64 import urlsafe_b64encode
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+
+from server import operations
+from server.operations import _parse_fetch_response, stream_fetch_data
+from server.schemas.responses import FetchResponseExchangeKey
+from settings import settings
+
+def _encode(raw_bytes: bytes) -> str:
+    return urlsafe_b64encode(raw_bytes).decode()
+
+
+def _make_aliased_body() -> bytes:
+    """
+    A response key whose initial key has the field name of an older server,
+    while its other fields have their canonical names.
+    """
+    sender = Ed25519PrivateKey.generate()
+    exchange_key = X25519PrivateKey.generate().public_key().public_bytes_raw()
+    initial_key = X25519PrivateKey.generate().public_key().public_bytes_raw()
+    return json.dumps({
+        'status': 'success',
+        'message': 'Data fetched.',
+        'data': {
+            'exchange_keys': [{
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'sender_key': _encode(
+                    sender.public_key().public_bytes_raw(),
+                ),
+                'signature': _encode(sender.sign(exchange_key)),
+                'exchange_key': _encode(exchange_key),
+                'initial_exchange_key': _encode(initial_key),
+            }],
+            'messages': [],
+        },
+    }).encode()
+
+
+@pytest.fixture(autouse=True)
+def auto_schema(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings.server, 'response_schema', 'auto')
+    monkeypatch.setattr(operations, '_compatible_servers', set())
+
+
+def _check_response_key(element: FetchResponseExchangeKey) -> None:
+    assert element.initial_key is not None
+    assert element.is_valid
+
+
+def test_aliased_response_parsed_in_auto_mode():
+    response = _parse_fetch_response(_make_aliased_body())
+    _check_response_key(response.data.exchange_keys[0])
+    base_url = settings.server.url.base_url
+    assert base_url in operations._compatible_servers
+
+
+def test_aliased_response_streamed_in_auto_mode():
+    body = _make_aliased_body()
+    def _handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=body)
+    async def _run() -> list[FetchResponseExchangeKey]:
+        transport = httpx.MockTransport(_handler)
+        async with httpx.AsyncClient(transport=transport) as client:
+            return [
+                element
+                async for chunk in stream_fetch_data(
+                    client=client,
+                    signature_key=Ed25519PrivateKey.generate(),
+                    contact_keys=[],
+                )
+                for element in chunk.exchange_keys
+            ]
+    elements = asyncio.run(_run())
+    assert len(elements) == 1
+    _check_response_key(elements[0])
@@ -0,0 +1,181 @@
+"""
+Checks that fetch responses are scanned and stored correctly when they are
+streamed in pieces, including when the stream is interrupted.
+"""
+
+import asyncio
+import json
+
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+from database.cache import contact_cache
+from database.fetching import FetchStream
+from database.records import ContactRecord
+from database.schemas.inputs import ContactInputSchema
+from database.storage import Storage
+from server.operations import post_message, stream_fetch_data
+from server.standin import StandinServer
+from server.streaming import FetchResponseScanner
+
+_BODY = json.dumps({
+    'status': 'success',
+    'message': 'Data fetched.',
+    'data': {
+        'exchange_keys': [{'key': 1}, {'key': [2, {'nested': '}]'}]}],
+        'extra': {'ignored': [1, 2]},
+        'messages': [{'text': 'a, b'}, {'text': '"quoted"'}, {'number': 3}],
+    },
+}, indent=1)
+
+def _scan(body: str, piece_size: int) -> list[tuple[str, object]]:
+    scanner = FetchResponseScanner()
+    elements = list()
+    for start in range(0, len(body), piece_size):
+        elements += scanner.feed(body[start:start + piece_size])
+    scanner.close()
+    assert scanner.fields == {'status': 'success', 'message': 'Data fetched.'}
+    return elements
+
+
+@pytest.mark.parametrize('piece_size', [1, 2, 7, 64, len(_BODY)])
+def test_scanner_emits_every_element(piece_size: int):
+    data = json.loads(_BODY)['data']
+    assert _scan(_BODY, piece_size) == [
+        (name, element)
+        for name in ('exchange_keys', 'messages')
+        for element in data[name]
+    ]
+
+
+def test_scanner_rejects_truncated_body():
+    with pytest.raises(ValueError):
+        _scan(_BODY[:len(_BODY) // 2], 16)
+
+
+def _setup_sender(
+        storage: Storage,
+    ) -> tuple[ContactRecord, Ed25519PrivateKey, Fernet]:
+    sender = Ed25519PrivateKey.generate()
+    contact = storage.add_contact(
+        ContactInputSchema.model_validate({
+            'name': 'Sender',
+            'verification_key': sender.public_key(),
+        }),
+    ).result()
+    fernet_key = Fernet.generate_key()
+    storage.store_exchange_keys(
+        received_keys=[],
+        fernet_keys=[{
+            'contact_id': contact.id,
+            'encoded_bytes': fernet_key.decode(),
+            'timestamp': datetime.now(timezone.utc),
+        }],
+        consumed_key_ids=set(),
+    ).result()
+    contact_cache.invalidate()
+    return contact, sender, Fernet(fernet_key)
+
+
+async def _post_messages(
+        sender: Ed25519PrivateKey,
+        recipient: Ed25519PrivateKey,
+        fernet: Fernet,
+        count: int,
+    ) -> list[datetime]:
+    timestamps: list[datetime] = list()
+    async with httpx.AsyncClient() as client:
+        for index in range(count):
+            response = await post_message(
+                client=client,
+                signature_key=sender,
+                recipient_public_key=recipient.public_key(),
+                encrypted_text=fernet.encrypt(f'message {index}'.encode()),
+            )
+            timestamps.append(response.data.timestamp)
+    return timestamps
+
+
+async def _stream_into(
+        storage: Storage,
+        client: httpx.AsyncClient,
+        recipient: Ed25519PrivateKey,
+        chunk_size: int,
+    ) -> list[int]:
+    stream = FetchStream(storage)
+    sizes: list[int] = list()
+    async for chunk in stream_fetch_data(
+        client=client,
+        signature_key=recipient,
+        contact_keys=storage.get_contact_keys(),
+        cursors=storage.get_fetch_cursors(),
+        chunk_size=chunk_size,
+    ):
+        stream.store(chunk)
+        sizes.append(len(chunk.exchange_keys) + len(chunk.messages))
+    stream.finish()
+    return sizes
+
+
+async def _interrupt(request: httpx.Request) -> httpx.Response:
+    # The request is passed to the stand-in, and the connection is lost
+    # halfway through its response.
+    await request.aread()
+    async with httpx.AsyncClient() as client:
+        response = await client.post(
+            str(request.url),
+            content=request.content,
+            headers={'Content-Type': request.headers['Content-Type']},
+        )
+    body = response.content
+    async def _pieces():
+        yield body[:len(body) // 2]
+        raise httpx.ReadError('Connection lost.')
+    return httpx.Response(200, content=_pieces())
+
+
+def test_streamed_fetch_stores_chunks(
+        standin: StandinServer,
+        storage: Storage,
+    ):
+    contact, sender, fernet = _setup_sender(storage)
+    recipient = Ed25519PrivateKey.generate()
+    timestamps = asyncio.run(_post_messages(sender, recipient, fernet, 5))
+    async def _run() -> list[int]:
+        async with httpx.AsyncClient() as client:
+            return await _stream_into(storage, client, recipient, 2)
+    assert asyncio.run(_run()) == [2, 2, 1]
+    assert len(storage.get_messages_after(contact.id, 0)) == 5
+    cursor = storage.get_fetch_cursors()[contact.encoded_verification_key]
+    assert cursor == timestamps[-1]
+
+
+def test_interrupted_stream_resumes(
+        standin: StandinServer,
+        storage: Storage,
+    ):
+    contact, sender, fernet = _setup_sender(storage)
+    recipient = Ed25519PrivateKey.generate()
+    timestamps = asyncio.run(_post_messages(sender, recipient, fernet, 6))
+    async def _run_interrupted() -> None:
+        transport = httpx.MockTransport(_interrupt)
+        async with httpx.AsyncClient(transport=transport) as client:
+            await _stream_into(storage, client, recipient, 1)
+    with pytest.raises(httpx.ReadError):
+        asyncio.run(_run_interrupted())
+    # Received chunks are kept, but the cursors are left where they were.
+    stored = len(storage.get_messages_after(contact.id, 0))
+    assert 0 < stored < 6
+    assert not storage.get_fetch_cursors()
+    async def _run() -> list[int]:
+        async with httpx.AsyncClient() as client:
+            return await _stream_into(storage, client, recipient, 4)
+    assert sum(asyncio.run(_run())) == 6
+    assert len(storage.get_messages_after(contact.id, 0)) == 6
+    cursor = storage.get_fetch_cursors()[contact.encoded_verification_key]
+    assert cursor == timestamps[-1]